@@ -1,11 +1,18 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
-from pymodbus.client import ModbusTcpClient
-import struct
-import pandas as pd
+from shark270_core import Shark270, Shark270Error, LOGS, DATA_FORMATS, TRANSFER_MODES
+from shark270_export import EXPORT_FORMATS
+from shark270_polling import ScanGroup, PollingEngine
+from shark270_recorder import TimeSeriesRecorder, serie
+from shark270_consultas import consultar, guardar_resultado, ConsultaError
+from shark270_snapshot import SnapshotPlan, variables_snapshot, guardar_snapshots
+from shark270_seguimiento import SeguimientoLogs
 import os
+import time
 import subprocess
+import threading
+import queue
 
 #  ---------------------------------------------------------------------------------------------------------------------------------
 #                                                             SHARK270 MODBUS GUI
@@ -19,7 +26,8 @@ import subprocess
 
 # Este script genera una interfaz gráfica para cominucarse con medidores Shark270. La comunicación se basa en el protocolo MODBUS.
 # Los objetivos principales de la aplicación son:
-#   - Polling: leer registros e interpretarlos en diferentes formatos [TSTAMP,UINT32,SINT32,UINT16,SINT16,FLOAT,ASCII].
+#   - Polling: leer registros e interpretarlos en diferentes formatos [TSTAMP,UINT32,SINT32,UINT16,SINT16,FLOAT,ASCII], una vez
+#       ("Request Data") o de forma continua por grupos de lectura ("Add Group", "Start Polling").
 #   - Log Retrival: recuperar logs históricos 1-6.
 
 # NOTAS:
@@ -27,86 +35,110 @@ import subprocess
 #       https://www.electroind.com/products/Shark_270/pdf/manuals/Shark-270-Meter-Modbus-Protocol-Application-Guide_E159718.pdf
 #   - El protocolo utilizado es MODBUS TCP.
 #   - Para la recuperación de los logs se utiliza la función de auto-incremento.
-#   - Al recuperar un Histórico se obtiene el log completo, tarea que puede tardar varios minutos en completarse. En ocasiones puede parecer
-#       que la aplicación se ha congelado, sin embargo sigue leyendo información del medidor y la interfaz se actualizará una vez finalizada
-#       la tarea.
+#   - Al recuperar un Histórico por primera vez se obtiene el log completo, tarea que puede tardar varios minutos en completarse. La recuperación se ejecuta
+#       en un hilo de trabajo que envía el progreso a la interfaz mediante una cola, por lo que es posible seguir utilizando la aplicación
+#       (p. ej. Polling) mientras se descarga el log. El botón "Cancel" de la ventana Retrieve Log detiene la transferencia y desacopla el log.
+#   - En la ventana Retrieve Log se pueden seleccionar varios Históricos: se recuperan uno después del otro en una sola sesión de
+#       recuperación, con una barra de progreso para todos, y un archivo exportado por log.
 #   - Al acoplar un log se escribe el valor 0x000B.
+#   - Durante la recuperación se muestran la latencia, las esperas de ventana del medidor y el tiempo por fase (shark270_metricas.py).
+#       Al terminar, las mediciones se guardan en "ExportedLogs" en formato JSON y Prometheus ({SN}_{log}_metrics.json/.prom).
+#   - El estado de cada ventana se consulta con esperas crecientes, empezando por el tiempo de preparación típico del medidor
+#       (EsperaVentana en shark270_core.py). Si el medidor no prepara una ventana en 10 s la recuperación se detiene con un error.
+#   - La conexión se administra en shark270_conexion.py: si la sesión TCP se pierde durante la recuperación de un log, la aplicación
+#       se vuelve a conectar con espera creciente y continúa desde el último record recuperado.
+#   - "Follow" en la ventana Retrieve Log sigue los logs seleccionados: el bloque de estado de los logs se consulta cerca de la hora
+#       del siguiente record esperado y los records nuevos se recuperan en sesiones cortas (sólo sus ventanas), se agregan al archivo
+#       exportado y se muestran en la ventana (shark270_seguimiento.py). Sin interfaz gráfica y con publicación por TCP:
+#       python shark270_seguimiento.py --meter 192.168.0.90 --logs "Historic 1" --publish-port 7020
 #   - La aplicación considera que el medidor no cuenta con seguridad, es decir no contempla un inicio de sesión antes de acceder al medidor.
 #   - Utilizar los botones "Cancel" para cerrar ventanas, NO UTILIZAR LOS BOTONES [X] EN EL ENCABEZADO DE LAS VENTANAS (Genera error
 #       al intentar abrir la ventana nuevamente).
 #   - Los logs son exportados a la carpeta "ExportedLogs" que se crea en la misma ruta donde se encuentre este archivo de python.
+#       Los records se escriben en el archivo a medida que se recuperan (CSV o Parquet), si la sesión se interrumpe el archivo
+#       conserva los records recuperados hasta ese momento. El formato Parquet requiere el paquete pyarrow.
+#       Antes de exportarlos, los records se guardan en columnas tipadas con los timestamps como segundos epoch
+#       (shark270_records.py); un timestamp inválido del medidor se exporta como 'NaT'.
+#   - El avance de cada log (por número de serie y log) se guarda en "ExportedLogs/retrieval_state.json". Con la opción
+#       "Only new records" se recuperan sólo los records posteriores al último exportado y se agregan al mismo archivo; una descarga
+#       interrumpida continúa desde el último lote exportado.
 #   - La aplicación utiliza el archivo "Shark270-Meter-Readings-Register-Table.xlsx" para reconocer el nombre y tamaño de los
 #       registros de las mediciones del medidor. Si se obtiene un error durante la recuperación de los logs es posible que el Histórico
 #       contenga una variable que no esté documentada en la tabla de Excel.
-#   - El archivo "Shark270-Meter-Readings-Register-Table.xlsx" debe estar en la misma ruta que este archivo de python.
+#   - El archivo "Shark270-Meter-Readings-Register-Table.xlsx" debe estar en la misma ruta que este archivo de python. La tabla se
+#       guarda compilada en "register_table.json" y sólo se vuelve a leer el .xlsx (con pandas) cuando el archivo cambia. El
+#       formato de los records de cada Histórico (por número de serie y log) se guarda en "log_layouts.json": en las siguientes
+#       recuperaciones el log setup se lee en una sola solicitud y el formato se vuelve a construir sólo si cambia (medidor
+#       reprogramado) o si cambia la tabla de registros (shark270_layouts.py). Ambos archivos están en la carpeta de caché del
+#       usuario (%LOCALAPPDATA%\Shark270 en Windows, ~/.cache/shark270 en Linux) o en la variable de entorno SHARK270_CACHE_DIR.
+#   - "Snapshot" en la ventana Polling lee todas las mediciones de la tabla de registros, cada una con su formato y escala, en la
+#       menor cantidad de lecturas de 125 registros (shark270_snapshot.py), y agrega la fila a "ExportedLogs/{SN}_snapshot.csv".
+#       Para varios medidores: python shark270_cli.py --config medidores.json --logs --snapshot lecturas.csv
+#   - Con la opción "Record values" de la ventana Polling los valores leídos se registran por registro y formato
+#       (shark270_recorder.py): las últimas muestras en memoria y las anteriores en la carpeta "RecordedData/{SN}". Las muestras
+#       pendientes se escriben en disco al detener el polling, al desconectarse y al cerrar la aplicación.
+#   - "Query Logs" consulta los logs exportados sin abrirlos en Excel (shark270_consultas.py): los archivos de "ExportedLogs" se
+#       indexan en "ExportedLogs/Archive" (Parquet por mes con índice de tiempo) y se filtran por SN, log, rango de tiempo y
+#       columnas (descripción o Reg# de la tabla de registros, separadas con ';'). Con un intervalo (p. ej. 15m, 1h) se calcula
+#       el mínimo, máximo y promedio por intervalo. También desde la línea de comandos: python shark270_consultas.py query ...
+#       El archivo une todos los archivos exportados de un medidor y log (incluidas las copias _0, _1, ...) con un solo record
+#       por timestamp.
+#   - Los timestamps de cada ventana recuperada se comparan con el record anterior: una ventana con records duplicados o
+#       desordenados se vuelve a solicitar; si se repite, los records duplicados se omiten. Los saltos de tiempo (cortes de
+#       energía) sólo se cuentan. Se muestra un aviso con la cantidad de anomalías (VerificacionVentanas en shark270_core.py).
+#   - La comunicación con el medidor se encuentra en shark270_core.py. Para recuperar logs de varios medidores sin interfaz
+#       gráfica utilizar shark270_cli.py.
+#   - Para una recolección periódica sin operador utilizar shark270_colector.py (lecturas, recuperación incremental por intervalo y
+#       recuperación completa diaria de cada medidor, con el estado guardado en "ExportedLogs/collector_state.json").
+#   - Para pruebas sin medidor ejecutar "python shark270_simulator.py" y conectarse a 127.0.0.1 puerto 5020. Los benchmarks de
+#       recuperación y Polling contra el simulador se encuentran en benchmarks/bench_shark270.py.
 
 
-#  ---------------------------------------------------------------------------------------------------------------------------------
-#                                                  Lectura de la tabla de registros MODBUS
-#  ---------------------------------------------------------------------------------------------------------------------------------
-
 # Cambiar el directorio de trabajo a donde está guardado el archivo .py
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
-file_path = "Shark270-Meter-Readings-Register-Table.xlsx"
-reg_table = pd.read_excel(file_path)
 
 #  ---------------------------------------------------------------------------------------------------------------------------------
-#                                                  Funciones de comunicación con el medidor
+#                                                  Hilo de trabajo y cola de la interfaz
 #  ---------------------------------------------------------------------------------------------------------------------------------
 
-# reg2var
-# Esta función permite interpretar los registros obtenidos del medidor
-# según el formato en el que está almacenado.
+# Tkinter no es seguro entre hilos: el hilo de recuperación de logs no modifica los widgets directamente, sino que encola
+# las llamadas en ui_queue y el hilo principal las ejecuta periódicamente (procesar_ui_queue).
+ui_queue = queue.Queue()
+retlog_thread = None
+meter = None    # Medidor conectado (shark270_core.Shark270)
+polling_engine = None   # Polling continuo en curso (shark270_polling.PollingEngine)
+scan_groups = []    # Grupos de lectura agregados en la ventana de Polling
+polling_lineas = {}     # (grupo, posición en el grupo) -> línea del widget Text
+recorder = None # Valores leídos en el Polling del medidor conectado (con "Record values"), shark270_recorder.TimeSeriesRecorder
+query_thread = None
+query_resultado = None  # Resultado de la última consulta de logs (DataFrame)
+snapshot_plan = None    # Plan de lectura del snapshot (shark270_snapshot.SnapshotPlan), se calcula una sola vez
+seguimiento = None  # Seguimiento de los logs en curso (shark270_seguimiento.SeguimientoLogs)
+
+# ui_call
+# Encola una llamada a un widget para que se ejecute en el hilo principal.
 # Parámetros:
-# registers - lista de bytes para interpretar
-# data_type - formato de interpretación (TSTAMP, UINT32/16, SINT32/16, FLOAT, ASCII )
-def reg2var(registers,data_type):
-    if(data_type == "TSTAMP"):
-        tstamp_mask = 0x7f0f1f1f3f3f  
-        tstamp_bytes = struct.pack('>Q',(registers[0] << 32 | registers[1] << 16 | registers[2]))
-        tstamp = struct.unpack('>Q',tstamp_bytes)[0] & tstamp_mask
-        tstamp_str = f"{tstamp:012X}"
-        
-        year = int(tstamp_str[0:2],16)
-        month = int(tstamp_str[2:4],16)
-        day = int(tstamp_str[4:6],16)
-        hour = int(tstamp_str[6:8],16)
-        minute = int(tstamp_str[8:10],16)
-        second = int(tstamp_str[10:12],16)
-        
-        return f"{day:02}/{month:02}/20{year:02} {hour:02}:{minute:02}:{second:02}"
-    
-    elif(data_type == "UINT32"):
-        packed_bytes = struct.pack('>I', (registers[0] << 16 | registers[1]))
-        return struct.unpack('>I',packed_bytes)[0]
-    
-    elif(data_type == "SINT32"):
-        packed_bytes = struct.pack('>I', (registers[0] << 16 | registers[1]))
-        return struct.unpack('>i',packed_bytes)[0]
-
-    elif(data_type == "UINT16"):
-        packed_bytes = struct.pack('>H', registers)
-        return struct.unpack('>H',packed_bytes)[0]
-
-    elif(data_type == "SINT16"):
-        packed_bytes = struct.pack('>H', registers)
-        return struct.unpack('>h',packed_bytes)[0]
-
-    elif(data_type == "FLOAT"):
-        packed_bytes = struct.pack('<I', (registers[0] << 16 | registers[1]))
-        return struct.unpack('<f',packed_bytes)[0]
-
-    elif(data_type == "ASCII"):
-        string = ""
-        for reg in registers:
-            packed_bytes = struct.pack('>H', reg)
-            high,low = struct.unpack('>cc',packed_bytes)
-            string += high.decode('latin1') + low.decode('latin1')
-        return string
-    
-
+# fn - función a ejecutar (p. ej. status_lbl.config)
+# args, kwargs - argumentos de la función
+def ui_call(fn,*args,**kwargs):
+    ui_queue.put((fn,args,kwargs))
+
+# procesar_ui_queue
+# Ejecuta las llamadas pendientes en ui_queue y se vuelve a programar en el ciclo de eventos de Tk.
+def procesar_ui_queue():
+    try:
+        while True:
+            fn,args,kwargs = ui_queue.get_nowait()
+            fn(*args,**kwargs)
+    except queue.Empty:
+        pass
+    main_wndw.after(50,procesar_ui_queue)
 
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Funciones de comunicación con el medidor
+#  ---------------------------------------------------------------------------------------------------------------------------------
 
+# La comunicación con el medidor se encuentra en shark270_core.py, estas funciones la conectan con la interfaz.
 
 # concect_shark270
 # Esta función establece la conección con el medidor Shark270, utilizando el protocolo Modbus TCP.
@@ -117,29 +149,12 @@ def reg2var(registers,data_type):
 # ip - dirección IP del medidor
 # port - puerto de conexión, 502 por defecto
 def connect_shark270(server_address,ip,port):
+    global meter, recorder
     try:
-        # Iniciar cliente
-        global slave_address
-        slave_address = server_address
-        global client
-        client = ModbusTcpClient(host=ip,port=port)
-        client.connect()
-
-        # Secuencia de acceso
-        try:
-            # Obtener identificaciones del medidor
-            id_request = client.read_holding_registers(0,16,slave_address).registers
-            type_request = client.read_holding_registers(26,4,slave_address).registers
-        except Exception as e:
-            status_lbl.config(text=f"\n (X) No se pudo acceder al medidor.{e}")
-            connect_wndw.withdraw()
-        
-        # Interpretación de los datos recibidos
-        meter_name = reg2var(id_request[0:8],"ASCII")
-        global meter_SN
-        meter_SN   = reg2var(id_request[8:16],"ASCII")
-        meter_type = reg2var(type_request,"ASCII")
-        status_lbl.config(text=f"\n (!) Conectado\n IP:\t{ip}:{port}\n Model:\t{meter_type}\n SN:\t{meter_SN}\n Name:\t{meter_name}")
+        meter = Shark270(ip,port,server_address)
+        meter.conectar()
+        recorder = TimeSeriesRecorder(os.path.join("RecordedData",meter.meter_SN.strip()))
+        status_lbl.config(text=f"\n (!) Conectado\n IP:\t{ip}:{port}\n Model:\t{meter.meter_type}\n SN:\t{meter.meter_SN}\n Name:\t{meter.meter_name}")
         connect_btn.config(state="disabled")
         dis_cnct_btn.config(state="active")
         polling_btn.config(state="active")
@@ -147,22 +162,42 @@ def connect_shark270(server_address,ip,port):
         connect_wndw.withdraw()     
 
     except Exception as e:
-        status_lbl.config(text="\n(X) Conexión fallida {e}")
+        status_lbl.config(text=f"\n(X) Conexión fallida {e}")
         connect_wndw.withdraw()
 
 # disconnect_shark270
 # Esta función termina la conexión con el medidor.       
 def disconnect_shark270():
+    # Detener una recuperación, un polling o un seguimiento en curso. Cada hilo termina su solicitud actual y la recuperación
+    # desacopla el log (0xC34F) y libera la sesión (0xC34B); el cliente se cierra después de que terminan, sin bloquear la interfaz.
+    hilos = [h for h in (retlog_thread,polling_engine and polling_engine.hilo,seguimiento and seguimiento.hilo)
+             if h is not None and h.is_alive()]
+    medidor = meter
+    medidor.cancel.set()
+    detener_polling()
+    detener_seguimiento()
     connect_btn.configure(state="active")
     polling_btn.config(state="disabled")    
     ret_log_btn.config(state="disabled")
     dis_cnct_btn.config(state="disabled")
     status_lbl.config(text="\n(!) Desconectado")
-    client.close()
+    if hilos:
+        threading.Thread(target=cerrar_al_terminar,args=(medidor,hilos),daemon=True).start()
+    else:
+        medidor.cerrar()
+
+# cerrar_al_terminar
+# Cierra el cliente de un medidor cuando terminan los hilos que lo utilizan.
+# Parámetros:
+# medidor - Shark270 desconectado
+# hilos - hilos de trabajo en curso
+def cerrar_al_terminar(medidor,hilos):
+    for hilo in hilos:
+        hilo.join()
+    medidor.cerrar()
 
 # leer_shark270
-# Esta es la función que permite leer registros del medidor, integra la función reg2var
-# para interpretar directamente los registros.
+# Esta es la función que permite leer registros del medidor y mostrarlos interpretados en la ventana de Polling.
 # Parámetros:
 # start_adress - registro donde inicia la lectura
 # address_count - cantidad de registros a leer
@@ -170,287 +205,307 @@ def disconnect_shark270():
 def leer_shark270(start_address, address_count, format):
 
     try:
-        # Obtener los registros solicitados.
-        true_value = ""
-        data_request = client.read_holding_registers(start_address-1,address_count,slave_address).registers
         data_str = f"\n#Reg\tData [Hex]\t\t{format}"        
+        filas = meter.leer(start_address,address_count,format)
+        if record_selection.get():
+            recorder.registrar_filas(time.time(),filas,format)
+        for reg,bytes_value,true_value in filas:
+            data_str += f"\n{reg}\t{bytes_value}\t\t{true_value}"            
+        return_data_lbl.config(state=tk.NORMAL)
+        return_data_lbl.delete(1.0, tk.END)
+        return_data_lbl.insert(tk.END,data_str)
+        return_data_lbl.config(state=tk.DISABLED)
 
-        # Interpretación de los datos recibidos
-        for i in range(len(data_request)):
-            bytes_value = struct.pack('>H',data_request[i]).hex().upper()
-            if(format == "TSTAMP" and i%3 == 0):
-                if (i+2 < len(data_request)): true_value = reg2var(data_request[i:i+3],format)
-                else: true_value = "Incomplete data"
-            
-            elif (format == "UINT32" and i%2 == 0):
-                if (i+1 < len(data_request)): true_value = reg2var(data_request[i:i+2],format)
-                else: true_value = "Incomplete data"
-
-            elif (format == "SINT32" and i%2 == 0):
-                if (i+1 < len(data_request)): true_value = reg2var(data_request[i:i+2],format)
-                else: true_value = "Incomplete data"
-
-            elif (format == "UINT16"):
-                    true_value = reg2var(data_request[i],format)
-
-            elif (format == "SINT16"):
-                    true_value = reg2var(data_request[i],format) 
-
-            elif (format == "FLOAT" and i%2 == 0):
-                if (i+1 < len(data_request)): true_value = reg2var(data_request[i:i+2],format)
-                else: true_value = "Incomplete data"
-
-            elif (format == "ASCII" and i == 0):
-                ascii_str = reg2var(data_request,format)
-                true_value = ascii_str
+    except Exception as e:
+        status_lbl.config(text=f"\n (X) Error durante la lectura de registros. {e}")
+        polling_wndw.withdraw()
 
-            else:
-                true_value = "   ↑" # Indicador que el registro actual es parte de un registro previo 
-            
-            data_str += f"\n{start_address+i}\t{bytes_value}\t\t{true_value}"            
+# snapshot_shark270
+# Lee todas las mediciones de la tabla de registros, cada una con su formato, en la menor cantidad de solicitudes. Los valores
+# se muestran en la ventana de Polling y se agregan como una fila a "ExportedLogs/{SN}_snapshot.csv".
+def snapshot_shark270():
+    global snapshot_plan
+    try:
+        if snapshot_plan is None:
+            snapshot_plan = SnapshotPlan(variables_snapshot())
+        t,valores = snapshot_plan.leer(meter)
+        if record_selection.get():
+            recorder.registrar(t,{serie(v.reg,v.format):valor for v,valor in zip(snapshot_plan.variables,valores)
+                                  if isinstance(valor,(int,float)) and not isinstance(valor,bool)})
+        data_str = f"\n#Reg\tValue\t\tDescription ({len(valores)} values, {snapshot_plan.solicitudes} requests)"
+        for v,valor in zip(snapshot_plan.variables,valores):
+            data_str += f"\n{v.reg}\t{valor}\t\t{v.titulo}"
         return_data_lbl.config(state=tk.NORMAL)
         return_data_lbl.delete(1.0, tk.END)
         return_data_lbl.insert(tk.END,data_str)
         return_data_lbl.config(state=tk.DISABLED)
+        guardar_snapshots(os.path.join("ExportedLogs",f"{meter.meter_SN.strip()}_snapshot.csv"),snapshot_plan,
+                          [(f"{meter.host}:{meter.port}/{meter.slave_address}",meter.meter_SN.strip(),t,valores)])
 
     except Exception as e:
-        status_lbl.config(text=f"\n (X) Error durante la lectura de registros. {e}")
+        status_lbl.config(text=f"\n (X) Error durante el snapshot de lecturas. {e}")
         polling_wndw.withdraw()
 
-# close_log_session
-# Desacopla el log para permitir el acceso a otros sofwares.
-def close_log_session():
-    log_disengage = client.read_holding_registers(0xC34F,1,slave_address).registers[0] & 0xFF00
-    client.write_register(0xC34F,log_disengage,slave_address)
+# agregar_grupo
+# Agrega un grupo de lectura para el polling continuo con los datos de la ventana de Polling.
+# Parámetros:
+# start_adress - registro donde inicia el grupo
+# address_count - cantidad de registros del grupo
+# format - formato para interpretar los registros
+# interval - intervalo de lectura en segundos
+def agregar_grupo(start_address,address_count,format,interval):
+    scan_groups.append(ScanGroup(start_address,address_count,format,interval))
+    data_lbl.config(text=f"Data polling ({len(scan_groups)} groups)")
+
+# limpiar_grupos
+# Elimina los grupos de lectura agregados.
+def limpiar_grupos():
+    scan_groups.clear()
+    data_lbl.config(text="Data polling")
+
+# iniciar_polling
+# Inicia (o detiene si ya está en curso) la lectura continua de los grupos agregados, o del rango de la ventana de Polling
+# si no se ha agregado ningún grupo. Las lecturas se realizan en un hilo aparte y sólo se actualizan las líneas cuyo valor cambió.
+# Parámetros:
+# start_adress, address_count, format, interval - grupo a leer si no hay grupos agregados
+def iniciar_polling(start_address,address_count,format,interval):
+    global polling_engine
+    if polling_engine is not None:
+        detener_polling()
+        return
+    grupos = list(scan_groups) or [ScanGroup(start_address,address_count,format,interval)]
+
+    # Escribir una línea por registro que luego se actualiza en su lugar
+    polling_lineas.clear()
+    data_str = ""
+    linea = 1
+    for i,g in enumerate(grupos):
+        data_str += f"\n#Reg\tData [Hex]\t\t{g.format} ({g.interval} s)"
+        linea += 1
+        for k in range(g.count):
+            data_str += f"\n{g.start+k}"
+            linea += 1
+            polling_lineas[(i,k)] = linea
+    return_data_lbl.config(state=tk.NORMAL)
+    return_data_lbl.delete(1.0, tk.END)
+    return_data_lbl.insert(tk.END,data_str)
+    return_data_lbl.config(state=tk.DISABLED)
+
+    engine = PollingEngine(meter,grupos,
+                           on_update=lambda i,cambios: ui_call(actualizar_polling,engine,i,cambios),
+                           on_error=lambda e: ui_call(error_polling,engine,e),
+                           recorder=recorder if record_selection.get() else None)
+    polling_engine = engine
+    engine.iniciar()
+    poll_btn.config(text="Stop Polling")
+
+# actualizar_polling
+# Reemplaza las líneas de los registros que cambiaron en la ventana de Polling.
+# Parámetros:
+# engine - polling que generó la lectura (se descartan lecturas de un polling ya detenido)
+# grupo - índice del grupo leído
+# cambios - [(posición en el grupo, registro, hex, valor), ...]
+def actualizar_polling(engine,grupo,cambios):
+    if engine is not polling_engine:
+        return
+    return_data_lbl.config(state=tk.NORMAL)
+    for k,reg,bytes_value,true_value in cambios:
+        linea = polling_lineas[(grupo,k)]
+        return_data_lbl.delete(f"{linea}.0",f"{linea}.end")
+        return_data_lbl.insert(f"{linea}.0",f"{reg}\t{bytes_value}\t\t{true_value}")
+    return_data_lbl.config(state=tk.DISABLED)
+
+# error_polling
+# Detiene el polling al fallar una lectura.
+def error_polling(engine,e):
+    if engine is not polling_engine:
+        return
+    status_lbl.config(text=f"\n (X) Error durante la lectura de registros. {e}")
+    detener_polling()
+
+# detener_polling
+# Detiene el polling continuo en curso.
+def detener_polling():
+    global polling_engine
+    if polling_engine is not None:
+        polling_engine.parar()
+        polling_engine = None
+    if recorder is not None:
+        recorder.flush()
+    poll_btn.config(text="Start Polling")
 
 # retlog_shark270
-# Esta función accede a los logs y los recupera, exportando un archivo .csv en la carpeta "ExportedLogs"
-# que se encuentra en el mismo directorio que el archivo .py, si la carpeta no existe la crea.
-# La secuencia de recuperación sigue los pasos de Modbus "Shark-270-Meter-Modbus-Protocol-Application-Guide_E159718, sección 3"
+# Esta función recupera los logs seleccionados en el hilo de trabajo, en una sola sesión de recuperación, exportando un archivo
+# por log en la carpeta "ExportedLogs" que se encuentra en el mismo directorio que el archivo .py, si la carpeta no existe la crea.
 # # Parámetros:
-# log - Histórico a recuperar
-def retlog_shark270(log):
+# logs - Históricos a recuperar
+# export_format - formato del archivo exportado (CSV, Parquet)
+# incremental - recuperar sólo los records nuevos desde la última recuperación (o continuar una descarga interrumpida)
+# transfer_mode - modo de transferencia (Standard, Fast)
+def retlog_shark270(logs,export_format="CSV",incremental=True,transfer_mode="Standard"):
+    meter.metricas.reiniciar()
+    start_time = time.monotonic()
     try:
-        # Verificar que el medidor esté disponible para una lectura
-        meter_availability = client.read_holding_registers(0xC34B,1,slave_address).registers[0]
-        if(meter_availability == 0 or meter_availability == 0x0B00):            
-            client.write_register(0xC34B,0x000B,slave_address)
-            meter_availability = client.read_holding_registers(0xC34B,1,slave_address).registers[0]
-            if(meter_availability != 0x0B00): # El medidor realiza un shift automaticamente (<< 4)
-                status_lbl.config(text=f"\n /!\\ El medidor está ocupado en otra sesión.")
-            else:
-                status_lbl.config(text=f"\n (!) Sesión de recuperación iniciada.")
-
-                # Obtener estado del log
-                if (log == "Historic 1"):
-                    log_status_block_address = 0xC757
-                    log_availability_address = 0xC75C
-                    log_setup_address = 0x84CF
-                    log_number = 2
-                elif (log == "Historic 2"):
-                    log_status_block_address = 0xC767
-                    log_availability_address = 0xC76C
-                    log_setup_address = 0x858F
-                    log_number = 3
-                elif (log == "Historic 3"):
-                    log_status_block_address = 0xC777
-                    log_availability_address = 0xC77C
-                    log_setup_address = 0x864F
-                    log_number = 4
-                elif (log == "Historic 4"):
-                    log_status_block_address = 0xC787
-                    log_availability_address = 0xC78C
-                    log_setup_address = 0x870F
-                    log_number = 5
-                elif (log == "Historic 5"):
-                    log_status_block_address = 0xC797
-                    log_availability_address = 0xC79C
-                    log_setup_address = 0x87CF
-                    log_number = 6
-                elif (log == "Historic 6"):
-                    log_status_block_address = 0xC7A7
-                    log_availability_address = 0xC7AC
-                    log_setup_address = 0x888F
-                    log_number = 7
-                
-
-                log_status_block = client.read_holding_registers(log_status_block_address,16,slave_address).registers
-                log_size_rec = reg2var(log_status_block[0:2],"UINT32")
-                number_rec_used = reg2var(log_status_block[2:4],"UINT32")
-                rec_size_bytes = reg2var(log_status_block[4],"UINT16")
-                log_availability = reg2var(log_status_block[5],"UINT16")
-                first_rec_tstamp = reg2var(log_status_block[6:9],"TSTAMP")
-                last_rec_tstamp = reg2var(log_status_block[9:12],"TSTAMP")
-                # 4 registros vacios al final
-                
-                # Verificar que el log esté disponible
-                if(log_availability == 0 ):
-                    # Acoplar log
-                    enable = 1
-                    scope = 0 # Normal record
-
-                    packed_log_engage = struct.pack('>h',log_number << 8 | enable << 7 | scope)
-                    packed_log_engage = struct.unpack('>h',packed_log_engage)[0]
-                    client.write_register(0xC34F,packed_log_engage,slave_address)
-                    
-                    # Revisar que se haya acoplado correctamente
-                    log_availability = client.read_holding_registers(log_availability_address,1,slave_address).registers[0]
-                    
-                    if(log_availability == 0):
-                        status_lbl.config(text=f"\n /!\\ El log no se ha acoplado correctamente.")
-                        ret_log_wndw.withdraw()
-                    else:
-                        # Revisar log setup
-                        log_reg_per_rec = client.read_holding_registers(log_setup_address,1,slave_address).registers[0]
-                        log_reg_per_rec = (log_reg_per_rec & 0xFF00) >> 8
-                        
-                        historic_vars = client.read_holding_registers(log_setup_address+2,log_reg_per_rec,slave_address).registers
-
-                        rec_titles = ['Timestamp']
-                        rec_var_sizes = [3]
-                        rec_var_types = ['TSTAMP']
-
-                        for reg in historic_vars:
-                            table_reg_num = reg+1
-                            try:
-                                var_name = reg_table.loc[reg_table['Reg#'] == table_reg_num,'Description'].values[0]
-                                var_size = reg_table.loc[reg_table['Reg#'] == table_reg_num,'Size'].values[0]
-                                var_type = reg_table.loc[reg_table['Reg#'] == table_reg_num,'Format'].values[0]
-                                
-                                if table_reg_num in [18018,18082,18146,18210,18274,18338,18402,18465,18528,18591,18654,18717,18780,18843,18906,18969,19032,19095]:
-                                    # Caso especial armónicos y samples
-                                    rec_titles.extend([f"{var_name} ({n})" for n in range(1,var_size+1)])
-                                    rec_var_sizes.extend([1]*(var_size))
-                                    rec_var_types.extend([var_type]*var_size)
-
-                                else:
-                                    # Caso normal
-                                    rec_titles.append(var_name)
-                                    rec_var_sizes.append(var_size)
-                                    rec_var_types.append(var_type)
-                            except:
-                                status_lbl.config(text=f"\n /!\\ Número de registro [{reg+1}] no encontrado.")
-
-                        # Obtener ventana
-                        rec_per_window = 246//rec_size_bytes # División que redondea hacia abajo
-                        num_repeats = 1
-                        packed_rec_window = struct.pack('>h',rec_per_window << 8 | num_repeats)
-                        packed_rec_window = struct.unpack('>h',packed_rec_window)[0]
-                        client.write_registers(0xC350,[packed_rec_window,0,0],slave_address)
-
-                        register_count = int(rec_per_window*(rec_size_bytes/2))
-
-                        current_index = 0                        
-                        export_file = [rec_titles]
-                        cont = 0                   
-                        while((number_rec_used-current_index) > rec_per_window):
-                            logs_lbl.config(text=f"\nRecuperando records [{current_index+1}/{number_rec_used}]")
-                            progressbar["value"] = (current_index/number_rec_used)*100
-                            ret_log_wndw.update_idletasks()
-                            window_offset = client.read_holding_registers(0xC351,2,slave_address).registers
-                            current_index = reg2var(window_offset,"UINT32") & 0x00FFFFFF
-                            window_status = reg2var(window_offset[0],"UINT16") & 0xFF00
-
-                            # Esperar que el medidor prepara la ventana
-                            while(window_status == 0xFF00):
-                                window_offset = client.read_holding_registers(0xC351,1,slave_address).registers[0]
-                                window_status = reg2var(window_offset,"UINT16") & 0xFF00
-
-                            window_data = client.read_holding_registers(0XC353,register_count,slave_address).registers
-                            # Dar formato para el archivo de exportacion
-                            rec_data = []
-                            i_data = 0
-                            i_type = 0
-                            while i_data < len(window_data):
-                                i_type = i_type % len(rec_var_types) # Si una ventana contiene más de un record, reiniciar i_type
-                                format = rec_var_types[i_type]                                
-                                step = rec_var_sizes[i_type]
-
-                                # Separa cada record en una nueva linea del CSV
-                                if (i_type == 0 and i_data != 0):
-                                    export_file.append(rec_data)
-                                    rec_data = []
-                                    i_type = 0
-
-                                if step != 1:
-                                    bytes = window_data[i_data:i_data+step]
-                                else:                                    
-                                    bytes = window_data[i_data]
-
-                                try:
-                                    value = reg2var(bytes,format)          
-                                    if pd.isna(value):
-                                        value = 'NaN'
-                                    elif ('%' in rec_titles[i_type]) or ('Phase' in rec_titles[i_type]):
-                                        value = value/100
-                                        
-                                    rec_data.append(value)
-                                
-                                except:
-                                    # El registro contiene varias variables del mismo tipo
-                                    for byte in bytes:
-                                        value = reg2var(byte,format)
-                                        if pd.isna(value):
-                                            value = 'NaN'
-                                        elif '%' in rec_titles[i_type]:
-                                            value = value/100                                    
-                                        rec_data.append(value)
-                                        
-                                i_data += step
-                                i_type += 1
-                            
-                                                      
-                            export_file.append(rec_data)
-                            rec_data = []                        
-
-                            # Descomentar ciclo if para obtener cierta cantidad de records, en lugar del log completo.
-                            '''if(cont < 10):
-                                cont += 1
-                            else:
-                                break'''
-                            
-                        logs_lbl.config(text=f"\nLog recuperado.")
-
-                        close_log_session()
-
-                        # Exportar el archivo
-                        x = 0
-                        try:
-                            os.makedirs("ExportedLogs", exist_ok=True)                         
-                            pd.DataFrame(export_file).to_csv(f"ExportedLogs/{meter_SN.strip()}_{log}.csv",index=False,header=False)
-                            status_lbl.config(text=f"\n (!) El archivo fue exportado como {meter_SN.strip()}_{log}.csv")
-                        except:                            
-                            while(True):
-                                try:         
-                                    pd.DataFrame(export_file).to_csv(f"ExportedLogs/{meter_SN.strip()}_{log}_{x}.csv",index=False,header=False)
-                                    status_lbl.config(text=f"\n (!) El archivo fue exportado como {meter_SN.strip()}_{log}_{x}.csv")
-                                    break
-                                except:                                                     
-                                    x += 1
-
-
-                else:
-                    close_log_session()
-                    status_lbl.config(text=f"\n /!\\ El log seleccionado está ocupado por COM{log_availability}.")
-                    ret_log_wndw.withdraw()
-
-
+        resultados = meter.retlogs(logs,export_format,incremental,
+                                   on_status=lambda msg: ui_call(status_lbl.config,text=f"\n {msg}"),
+                                   on_progress=lambda *args: ui_call(actualizar_progreso,*args,meter.metricas.resumen()),
+                                   transfer_mode=transfer_mode)
+        records = sum(r["records"] for r in resultados.values())
+        export_names = ", ".join(os.path.basename(r["export"]) for r in resultados.values() if r["export"] is not None)
+        if any(r["cancelled"] for r in resultados.values()):
+            ui_call(logs_lbl.config,text=f"\nRecuperación cancelada [{records} records]")
+            ui_call(status_lbl.config,text=f"\n (!) Sesión de recuperación cancelada. {records} records exportados en {export_names}")
+        elif not export_names:
+            total = sum(r["total"] for r in resultados.values())
+            ui_call(logs_lbl.config,text=f"\nNo hay records nuevos [{total}/{total}]")
+            ui_call(progressbar.config,value=100)
+            ui_call(status_lbl.config,text=f"\n (!) Los logs no tienen records nuevos desde la última recuperación.")
         else:
-            status_lbl.config(text=f"\n /!\\ El medidor está ocupado.")
-            close_log_session()
+            stats = meter.estadisticas()
+            rate = records/max(time.monotonic()-start_time,1e-6)
+            requests_per_record = sum(r["requests_per_record"]*r["records"] for r in resultados.values())/max(records,1)
+            ui_call(logs_lbl.config,text=f"\n{len(resultados)} log(s) recuperado(s). {records} records nuevos\n{rate:.1f} rec/s, {requests_per_record:.2f} solicitudes/record"
+                    f"\nLatencia media {stats.get('latency_avg_ms',0):.1f} ms, {stats.get('reconnects',0)} reconexiones")
+            ui_call(progressbar.config,value=100)
+            ui_call(status_lbl.config,text=f"\n (!) Archivos exportados: {export_names}")
+
+    except Shark270Error as e:
+        ui_call(status_lbl.config,text=f"\n /!\\ {e}")
+        ui_call(ret_log_wndw.withdraw)
 
     except Exception as e:
-        close_log_session()
-        status_lbl.config(text=f"\n (X) No se pudo recuperar el log. {e}")
-        ret_log_wndw.withdraw()
+        ui_call(status_lbl.config,text=f"\n (X) No se pudo recuperar el log. {e}")
+        ui_call(ret_log_wndw.withdraw)
+
+    finally:
+        guardar_metricas(logs[0] if len(logs) == 1 else "Historics")
+        ui_call(retrieve_btn.config,state="active")
+
+# guardar_metricas
+# Guarda las mediciones de la recuperación (solicitudes, latencias, esperas de ventana, tiempo por fase) en la carpeta
+# "ExportedLogs" como {SN}_{log}_metrics.json y {SN}_{log}_metrics.prom (formato de Prometheus).
+# Parámetros:
+# log - Histórico recuperado
+def guardar_metricas(log):
+    try:
+        nombre = os.path.join("ExportedLogs",f"{(meter.meter_SN or '').strip()}_{log}_metrics")
+        etiquetas = {"meter":(meter.meter_SN or '').strip(),"log":log}
+        os.makedirs("ExportedLogs",exist_ok=True)
+        meter.metricas.guardar(f"{nombre}.json",etiquetas)
+        meter.metricas.guardar(f"{nombre}.prom",etiquetas)
+    except OSError:
+        pass
+
+# actualizar_progreso
+# Actualiza la etiqueta y la barra de progreso de la ventana ret_log_wndw (se ejecuta en el hilo principal).
+# Parámetros:
+# current_index - records recuperados
+# number_rec_used - records totales de los logs seleccionados
+# rate - velocidad de transferencia en records por segundo
+# resumen - mediciones de la sesión (latencia, esperas de ventana, tiempo por fase)
+def actualizar_progreso(current_index,number_rec_used,rate,resumen=""):
+    logs_lbl.config(text=f"\nRecuperando records [{current_index+1}/{number_rec_used}]\n{rate:.1f} rec/s\n{resumen}")
+    progressbar["value"] = (current_index/number_rec_used)*100
+
+# iniciar_retlog_shark270
+# Inicia retlog_shark270 en un hilo de trabajo para no bloquear la interfaz.
+# Parámetros:
+# logs - Históricos a recuperar
+# export_format - formato del archivo exportado (CSV, Parquet)
+# incremental - recuperar sólo los records nuevos
+# transfer_mode - modo de transferencia (Standard, Fast)
+def iniciar_retlog_shark270(logs,export_format,incremental,transfer_mode):
+    global retlog_thread
+    if retlog_thread is not None and retlog_thread.is_alive():
+        status_lbl.config(text=f"\n /!\\ Ya hay una recuperación en curso.")
+        return
+    if not logs:
+        status_lbl.config(text=f"\n /!\\ Seleccione al menos un log.")
+        return
+    meter.cancel.clear()
+    retrieve_btn.config(state="disabled")
+    progressbar["value"] = 0
+    retlog_thread = threading.Thread(target=retlog_shark270,args=(logs,export_format,incremental,transfer_mode),daemon=True)
+    retlog_thread.start()
 
 # cancel_retlog_shark270
-# Termina la sesión y cierra la ventana ret_log_wndw.
+# Termina la sesión y cierra la ventana ret_log_wndw. Si hay una recuperación en curso, se solicita
+# su cancelación y el hilo de trabajo se encarga de desacoplar el log al terminar la ventana actual.
 def cancel_retlog_shark270():
-    close_log_session()
-    status_lbl.config(text=f"\n (!) Sesión de recuperación cancelada.")
+    detener_seguimiento()
+    if retlog_thread is not None and retlog_thread.is_alive():
+        meter.cancel.set()
+        status_lbl.config(text=f"\n (!) Cancelando sesión de recuperación...")
+    else:
+        try:
+            meter.close_log_session()
+        except Exception:
+            pass # Sin conexión no hay sesión que cerrar
+        status_lbl.config(text=f"\n (!) Sesión de recuperación cancelada.")
     ret_log_wndw.withdraw()
 
+# seguir_logs
+# Inicia (o detiene si ya está en curso) el seguimiento de los logs seleccionados (shark270_seguimiento.py): los records nuevos
+# se recuperan a medida que el medidor los registra, se agregan al archivo exportado y se muestran en la ventana Retrieve Log.
+# Parámetros:
+# logs - Históricos a seguir
+# export_format - formato del archivo exportado (CSV, Parquet)
+# transfer_mode - modo de transferencia (Standard, Fast)
+def seguir_logs(logs,export_format,transfer_mode):
+    global seguimiento
+    if seguimiento is not None:
+        detener_seguimiento()
+        return
+    if retlog_thread is not None and retlog_thread.is_alive():
+        status_lbl.config(text=f"\n /!\\ Ya hay una recuperación en curso.")
+        return
+    if not logs:
+        status_lbl.config(text=f"\n /!\\ Seleccione al menos un log.")
+        return
+    meter.cancel.clear()
+    seg = SeguimientoLogs(meter,logs,export_format,transfer_mode=transfer_mode,
+                          on_status=lambda msg: ui_call(status_lbl.config,text=f"\n {msg}"),
+                          on_error=lambda e: ui_call(status_lbl.config,text=f"\n (X) Error durante el seguimiento de los logs. {e}"))
+    seg.suscribir(lambda SN,log,titulos,filas: ui_call(mostrar_seguimiento,seg,log,titulos,filas))
+    seguimiento = seg
+    seg.iniciar()
+    tail_txt.config(state=tk.NORMAL)
+    tail_txt.delete(1.0,tk.END)
+    tail_txt.config(state=tk.DISABLED)
+    logs_lbl.config(text=f"\nSiguiendo {len(logs)} log(s)...")
+    follow_btn.config(text="Stop Following")
+    retrieve_btn.config(state="disabled")
+
+# mostrar_seguimiento
+# Agrega los records nuevos al final de la ventana Retrieve Log, conservando las últimas TAIL_MAX_LINES líneas.
+# Parámetros:
+# seg - seguimiento que recuperó los records (se descartan los de un seguimiento ya detenido)
+# log - Histórico de los records
+# titulos, filas - encabezados y valores de los records
+TAIL_MAX_LINES = 200
+def mostrar_seguimiento(seg,log,titulos,filas):
+    if seg is not seguimiento:
+        return
+    tail_txt.config(state=tk.NORMAL)
+    for fila in filas:
+        tail_txt.insert(tk.END,f"{log}\t{fila[0]}\t"+"  ".join(f"{t}={v}" for t,v in zip(titulos[1:],fila[1:]))+"\n")
+    lineas = int(tail_txt.index("end-1c").split(".")[0])-1
+    if lineas > TAIL_MAX_LINES:
+        tail_txt.delete(1.0,f"{lineas-TAIL_MAX_LINES+1}.0")
+    tail_txt.see(tk.END)
+    tail_txt.config(state=tk.DISABLED)
+    logs_lbl.config(text=f"\nSiguiendo {len(seg.logs)} log(s). {seg.records} records recuperados\nÚltimo: {log} {filas[-1][0]}")
+
+# detener_seguimiento
+# Detiene el seguimiento de los logs en curso (una recuperación en curso termina de exportar los records nuevos).
+def detener_seguimiento():
+    global seguimiento
+    if seguimiento is not None:
+        seguimiento.parar()
+        seguimiento = None
+        follow_btn.config(text="Follow")
+        retrieve_btn.config(state="active")
+
 def open_log_file():
     archivo = filedialog.askopenfilename(
         title="Seleccionar archivo",
@@ -467,6 +522,65 @@ def open_log_file():
             status_lbl.config(text=f"Error al intentar abrir el archivo con Excel: {e}")
 
 
+# consultar_logs
+# Consulta los logs exportados (shark270_consultas.py) en un hilo de trabajo y muestra el resultado en la ventana Query Logs.
+# Las columnas se separan con ';' (las descripciones pueden contener comas). Sin intervalo se muestran los records.
+def consultar_logs():
+    global query_thread
+    if query_thread is not None and query_thread.is_alive():
+        return
+    columnas = [c for c in query_columns_entry.get().split(";") if c.strip()] or None
+    parametros = {"sns":[query_sn_entry.get().strip()] if query_sn_entry.get().strip() else None,
+                  "logs":None if query_log_selection.get() == "All" else [query_log_selection.get()],
+                  "t0":query_from_entry.get().strip() or None,"t1":query_to_entry.get().strip() or None,
+                  "columnas":columnas,"intervalo":query_every_entry.get().strip() or None}
+    query_lbl.config(text="Consultando...")
+    query_btn.config(state="disabled")
+    query_thread = threading.Thread(target=ejecutar_consulta,kwargs=parametros,daemon=True)
+    query_thread.start()
+
+def ejecutar_consulta(**parametros):
+    try:
+        tabla = consultar("ExportedLogs",**parametros)
+        ui_call(mostrar_consulta,tabla)
+    except ConsultaError as e:
+        ui_call(query_lbl.config,text=f"/!\\ {e}")
+    except Exception as e:
+        ui_call(query_lbl.config,text=f"(X) No se pudo realizar la consulta. {e}")
+    finally:
+        ui_call(query_btn.config,state="active")
+
+# mostrar_consulta
+# Muestra las primeras QUERY_MAX_ROWS filas del resultado en la tabla de la ventana Query Logs.
+QUERY_MAX_ROWS = 1000
+def mostrar_consulta(tabla):
+    global query_resultado
+    query_resultado = tabla
+    query_tree.delete(*query_tree.get_children())
+    columnas = list(tabla.columns)
+    query_tree.config(columns=columnas)
+    for columna in columnas:
+        query_tree.heading(columna,text=columna)
+        query_tree.column(columna,width=140 if columna == "Timestamp" else 90,stretch=False)
+    visibles = tabla.head(QUERY_MAX_ROWS).assign(Timestamp=lambda t: t["Timestamp"].dt.strftime("%d/%m/%Y %H:%M:%S"))
+    for fila in visibles.itertuples(index=False):
+        query_tree.insert("","end",values=[f"{v:.6g}" if isinstance(v,float) else v for v in fila])
+    query_lbl.config(text=f"{len(tabla)} filas" + (f" (se muestran {QUERY_MAX_ROWS})" if len(tabla) > QUERY_MAX_ROWS else ""))
+
+# guardar_consulta
+# Guarda el resultado completo de la última consulta en CSV o Parquet.
+def guardar_consulta():
+    if query_resultado is None:
+        return
+    archivo = filedialog.asksaveasfilename(title="Guardar consulta",defaultextension=".csv",initialdir="ExportedLogs",
+                                           filetypes=(("CSV","*.csv"),("Parquet","*.parquet")))
+    if archivo:
+        try:
+            guardar_resultado(query_resultado,archivo)
+            query_lbl.config(text=f"{len(query_resultado)} filas guardadas en {os.path.basename(archivo)}")
+        except Exception as e:
+            query_lbl.config(text=f"(X) No se pudo guardar el archivo. {e}")
+
 
 #  ---------------------------------------------------------------------------------------------------------------------------------
 #                                                          Ventanas de la GUI
@@ -544,19 +658,42 @@ reg_count_txt.insert(0,"8")
 
 data_type_selection = tk.StringVar(polling_wndw)
 data_type_selection.set("ASCII")
-data_type_list = tk.OptionMenu(polling_wndw,data_type_selection,*["TSTAMP","UINT32","SINT32","UINT16","SINT16","FLOAT","ASCII"])
+data_type_list = tk.OptionMenu(polling_wndw,data_type_selection,*DATA_FORMATS)
 data_type_list.grid(row=3,column=1,sticky="w")
 
+interval_lbl = tk.Label(polling_wndw, text="Interval [s]")
+interval_lbl.grid(row=4,column=0,sticky="w")
+
+interval_txt = tk.Entry(polling_wndw)
+interval_txt.insert(0,"1")
+interval_txt.grid(row=4,column=1)
+
 read_btn = tk.Button(polling_wndw, text="Request Data",command=lambda: leer_shark270(int(start_reg_txt.get()),int(reg_count_txt.get()),data_type_selection.get()))
-read_btn.grid(row=4,column=0)
+read_btn.grid(row=5,column=0)
+
+cancel_poll_btn = tk.Button(polling_wndw, text="Cancel", command=lambda: (detener_polling(),polling_wndw.withdraw()))
+cancel_poll_btn.grid(row=5,column=1)
+
+add_group_btn = tk.Button(polling_wndw, text="Add Group",command=lambda: agregar_grupo(int(start_reg_txt.get()),int(reg_count_txt.get()),data_type_selection.get(),float(interval_txt.get())))
+add_group_btn.grid(row=6,column=0)
 
-cancel_poll_btn = tk.Button(polling_wndw, text="Cancel", command=polling_wndw.withdraw)
-cancel_poll_btn.grid(row=4,column=1)
+clear_groups_btn = tk.Button(polling_wndw, text="Clear Groups",command=lambda: limpiar_grupos())
+clear_groups_btn.grid(row=6,column=1)
+
+record_selection = tk.BooleanVar(polling_wndw,value=False)
+record_chk = tk.Checkbutton(polling_wndw,text="Record values",variable=record_selection)
+record_chk.grid(row=7,column=0)
+
+poll_btn = tk.Button(polling_wndw, text="Start Polling",command=lambda: iniciar_polling(int(start_reg_txt.get()),int(reg_count_txt.get()),data_type_selection.get(),float(interval_txt.get())))
+poll_btn.grid(row=7,column=1)
+
+snapshot_btn = tk.Button(polling_wndw, text="Snapshot",command=lambda: snapshot_shark270())
+snapshot_btn.grid(row=8,column=0)
 
 return_data_lbl = tk.Text(polling_wndw, width=50)
-return_data_lbl.grid(row=5,columnspan=2,sticky="w")
+return_data_lbl.grid(row=9,columnspan=2,sticky="w")
 scrollbar = tk.Scrollbar(polling_wndw, command=return_data_lbl.yview)
-scrollbar.grid(rowspan=5,column=2)
+scrollbar.grid(rowspan=8,column=2)
 return_data_lbl.config(yscrollcommand=scrollbar.set)
 
 # -----------------------------------     Ventana ret logs     -----------------------------------
@@ -567,25 +704,105 @@ ret_log_wndw.withdraw()
 ret_log_lbl = tk.Label(ret_log_wndw,text='Log Retrival')
 ret_log_lbl.grid(row=0,columnspan=2)
 
-log_sel_lbl = tk.Label(ret_log_wndw,text='Select log')
+log_sel_lbl = tk.Label(ret_log_wndw,text='Select logs')
 log_sel_lbl.grid(row=1,column=0)
 
-log_selection = tk.StringVar(ret_log_wndw)
-log_selection.set("Historic 1")
-log_list = tk.OptionMenu(ret_log_wndw,log_selection,*["Historic 1","Historic 2","Historic 3","Historic 4","Historic 5","Historic 6"])
+log_list = tk.Listbox(ret_log_wndw,selectmode="multiple",exportselection=False,height=len(LOGS),width=12)
+for log in LOGS:
+    log_list.insert("end",log)
+log_list.selection_set(0)
 log_list.grid(row=1,column=1)
 
-read_btn = tk.Button(ret_log_wndw, text="Retrieve",command=lambda: retlog_shark270(log_selection.get()))
-read_btn.grid(row=2,column=0)
+export_sel_lbl = tk.Label(ret_log_wndw,text='Export format')
+export_sel_lbl.grid(row=2,column=0)
+
+export_selection = tk.StringVar(ret_log_wndw)
+export_selection.set("CSV")
+export_list = tk.OptionMenu(ret_log_wndw,export_selection,*EXPORT_FORMATS)
+export_list.grid(row=2,column=1)
+
+transfer_sel_lbl = tk.Label(ret_log_wndw,text='Transfer mode')
+transfer_sel_lbl.grid(row=3,column=0)
+
+transfer_selection = tk.StringVar(ret_log_wndw)
+transfer_selection.set("Standard")
+transfer_list = tk.OptionMenu(ret_log_wndw,transfer_selection,*TRANSFER_MODES)
+transfer_list.grid(row=3,column=1)
+
+incremental_selection = tk.BooleanVar(ret_log_wndw,value=True)
+incremental_chk = tk.Checkbutton(ret_log_wndw,text="Only new records",variable=incremental_selection)
+incremental_chk.grid(row=4,columnspan=2)
+
+retrieve_btn = tk.Button(ret_log_wndw, text="Retrieve",command=lambda: iniciar_retlog_shark270([log_list.get(i) for i in log_list.curselection()],export_selection.get(),incremental_selection.get(),transfer_selection.get()))
+retrieve_btn.grid(row=5,column=0)
 
 cancel_retlog_btn = tk.Button(ret_log_wndw, text="Cancel", command=lambda: cancel_retlog_shark270())
-cancel_retlog_btn.grid(row=2,column=1)
+cancel_retlog_btn.grid(row=5,column=1)
 
 logs_lbl = tk.Label(ret_log_wndw,text='\n',justify="left")
-logs_lbl.grid(row=3,columnspan=2)
+logs_lbl.grid(row=6,columnspan=2)
 
 progressbar = ttk.Progressbar(ret_log_wndw,orient='horizontal',length=200,mode='determinate')
-progressbar.grid(row=4,columnspan=2)
+progressbar.grid(row=7,columnspan=2)
+
+follow_btn = tk.Button(ret_log_wndw, text="Follow",command=lambda: seguir_logs([log_list.get(i) for i in log_list.curselection()],export_selection.get(),transfer_selection.get()))
+follow_btn.grid(row=8,column=0)
+
+tail_txt = tk.Text(ret_log_wndw,height=10,width=80,wrap="none",state=tk.DISABLED)
+tail_txt.grid(row=9,columnspan=2)
+
+
+# -----------------------------------     Ventana Query Logs     -----------------------------------
+query_wndw = tk.Tk()
+query_wndw.title("Query Logs")
+query_wndw.withdraw()
+
+query_title_lbl = tk.Label(query_wndw,text='Log Query (ExportedLogs)')
+query_title_lbl.grid(row=0,columnspan=4)
+
+tk.Label(query_wndw,text='SN').grid(row=1,column=0,sticky="e")
+query_sn_entry = tk.Entry(query_wndw)
+query_sn_entry.grid(row=1,column=1,sticky="w")
+
+tk.Label(query_wndw,text='Log').grid(row=1,column=2,sticky="e")
+query_log_selection = tk.StringVar(query_wndw)
+query_log_selection.set("All")
+query_log_list = tk.OptionMenu(query_wndw,query_log_selection,"All",*LOGS)
+query_log_list.grid(row=1,column=3,sticky="w")
+
+tk.Label(query_wndw,text='From (dd/mm/aaaa hh:mm:ss)').grid(row=2,column=0,sticky="e")
+query_from_entry = tk.Entry(query_wndw)
+query_from_entry.grid(row=2,column=1,sticky="w")
+
+tk.Label(query_wndw,text='To').grid(row=2,column=2,sticky="e")
+query_to_entry = tk.Entry(query_wndw)
+query_to_entry.grid(row=2,column=3,sticky="w")
+
+tk.Label(query_wndw,text='Columns (;)').grid(row=3,column=0,sticky="e")
+query_columns_entry = tk.Entry(query_wndw,width=60)
+query_columns_entry.grid(row=3,column=1,columnspan=3,sticky="w")
+
+tk.Label(query_wndw,text='Interval').grid(row=4,column=0,sticky="e")
+query_every_entry = tk.Entry(query_wndw)
+query_every_entry.grid(row=4,column=1,sticky="w")
+
+query_btn = tk.Button(query_wndw,text="Query",command=lambda: consultar_logs())
+query_btn.grid(row=5,column=0)
+query_save_btn = tk.Button(query_wndw,text="Save",command=lambda: guardar_consulta())
+query_save_btn.grid(row=5,column=1)
+query_cancel_btn = tk.Button(query_wndw,text="Cancel",command=query_wndw.withdraw)
+query_cancel_btn.grid(row=5,column=2)
+
+query_lbl = tk.Label(query_wndw,text='',justify="left")
+query_lbl.grid(row=6,columnspan=4,sticky="w")
+
+query_tree = ttk.Treeview(query_wndw,show="headings",height=20)
+query_tree.grid(row=7,columnspan=4,sticky="nsew")
+query_xscroll = tk.Scrollbar(query_wndw,orient="horizontal",command=query_tree.xview)
+query_xscroll.grid(row=8,columnspan=4,sticky="ew")
+query_yscroll = tk.Scrollbar(query_wndw,command=query_tree.yview)
+query_yscroll.grid(row=7,column=4,sticky="ns")
+query_tree.config(xscrollcommand=query_xscroll.set,yscrollcommand=query_yscroll.set)
 
 
 # -----------------------------------     Ventana principal (Cinta de opciones)     -----------------------------------
@@ -599,6 +816,8 @@ ret_log_btn = tk.Button(main_wndw, text="Ret Log",state="disabled", command=ret_
 ret_log_btn.grid(row=0, column=1)
 open_log_btn = tk.Button(main_wndw, text="Open Log", command=lambda: open_log_file())
 open_log_btn.grid(row=0, column=2)
+query_log_btn = tk.Button(main_wndw, text="Query Logs", command=query_wndw.deiconify)
+query_log_btn.grid(row=0, column=3)
 connect_btn = tk.Button(main_wndw, text="Connect", command=connect_wndw.deiconify)
 connect_btn.grid(row=0, column=5)
 dis_cnct_btn = tk.Button(main_wndw, text="Dis-cnct",state="disabled", command=lambda: disconnect_shark270())
@@ -607,5 +826,14 @@ polling_btn = tk.Button(main_wndw, text="Polling", state="disabled", command=pol
 polling_btn.grid(row=0, column=7)
 
 
+# cerrar_aplicacion
+# Detiene el polling y el seguimiento en curso y escribe en disco las muestras registradas pendientes antes de cerrar.
+def cerrar_aplicacion():
+    detener_polling()
+    detener_seguimiento()
+    main_wndw.destroy()
+
 # Ejecutar la aplicación
+main_wndw.protocol("WM_DELETE_WINDOW",cerrar_aplicacion)
+main_wndw.after(50,procesar_ui_queue)
 main_wndw.mainloop()
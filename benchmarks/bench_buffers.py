@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import tempfile
+import tracemalloc
+from pymodbus.register_read_message import ReadHoldingRegistersResponse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+from shark270_core import LoteBuffer
+from shark270_conexion import RespuestaRegistros
+from shark270_decoder import compilar_decoder
+from shark270_export import CsvLogWriter
+from bench_decoder import REC_TITLES, REC_VAR_SIZES, REC_VAR_TYPES
+from bench_memoria import generar_registros
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: de la respuesta Modbus al lote decodificado y al CSV
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Compara el camino de las ventanas de un log antes y después de conservar las respuestas como bytes:
+#   - lista: ReadHoldingRegistersResponse (un entero por registro), los registros válidos se copian a una lista por lote y el
+#       lote se decodifica desde la lista.
+#   - bytes: RespuestaRegistros (memoryview de la trama), los bytes válidos se copian a un LoteBuffer reutilizable y el lote
+#       se decodifica desde su memoryview.
+# Para cada camino se mide el tiempo por record y los bloques de memoria (tracemalloc) que retiene un lote de 64 ventanas antes
+# de decodificarse, por record. También se compara la escritura CSV de un lote con RecordStore.a_filas (lista de filas) y con
+# iter_filas. Antes de medir se verifica que ambos caminos generen los mismos records.
+# Uso:
+#   python benchmarks/bench_buffers.py [--records N] [--json resultado.json]
+
+VENTANAS_LOTE = 64
+
+# tramas
+# Tramas de respuesta de la función 3 (byte count + datos) de las ventanas de un log Fast: 4 bytes de estado e índice y los
+# records de la ventana (máximo 123 registros por respuesta).
+def tramas(n):
+    decoder = compilar_decoder(REC_TITLES,REC_VAR_SIZES,REC_VAR_TYPES,2*sum(REC_VAR_SIZES))
+    por_ventana = (246-4)//decoder.itemsize
+    datos = generar_registros(n).tobytes()
+    resultado = []
+    for i in range(0,n,por_ventana):
+        ventana = struct.pack(">I",i//por_ventana)+datos[i*decoder.itemsize:(i+por_ventana)*decoder.itemsize]
+        resultado.append(bytes([len(ventana)])+ventana)
+    return decoder,por_ventana,resultado
+
+# Cada camino recibe las tramas de las ventanas y agrega los records a store; al_completar se llama con cada lote completo,
+# antes de decodificarlo.
+
+# camino_lista
+# Camino anterior: registros como enteros y lote como lista.
+def camino_lista(decoder,por_ventana,frames,store,al_completar=None):
+    pendientes = []
+    validos = por_ventana*decoder.itemsize//2
+    for k,frame in enumerate(frames):
+        respuesta = ReadHoldingRegistersResponse()
+        respuesta.decode(frame)
+        pendientes.extend(respuesta.registers[2:2+validos])
+        if len(pendientes) >= VENTANAS_LOTE*validos or k == len(frames)-1:
+            if al_completar is not None:
+                al_completar()
+            decoder.decodificar_en(store,pendientes)
+            pendientes = []
+
+# camino_bytes
+# Camino actual: memoryview de la trama copiada a un LoteBuffer reutilizable.
+def camino_bytes(decoder,por_ventana,frames,store,al_completar=None):
+    validos = por_ventana*decoder.itemsize
+    lote = LoteBuffer((VENTANAS_LOTE+1)*validos)
+    for k,frame in enumerate(frames):
+        respuesta = RespuestaRegistros()
+        respuesta.decode(frame)
+        lote.agregar(respuesta.raw[4:4+validos])
+        if len(lote) >= VENTANAS_LOTE*validos or k == len(frames)-1:
+            if al_completar is not None:
+                al_completar()
+            decoder.decodificar_en(store,lote.vista())
+            lote.vaciar()
+
+# bloques_nuevos
+# Bloques de memoria vivos que no estaban en base (sin contar los de tracemalloc).
+def bloques_nuevos(base):
+    sin_tracemalloc = [tracemalloc.Filter(False,tracemalloc.__file__)]
+    diferencias = tracemalloc.take_snapshot().filter_traces(sin_tracemalloc).compare_to(base.filter_traces(sin_tracemalloc),"filename")
+    return sum(d.count_diff for d in diferencias if d.count_diff > 0)
+
+# medir_camino
+# Retorna (segundos por record, bloques retenidos por record en el primer lote completo).
+def medir_camino(camino,decoder,por_ventana,frames,n):
+    store = decoder.crear_store(capacidad=n)
+    inicio = time.perf_counter()
+    camino(decoder,por_ventana,frames,store)
+    segundos = time.perf_counter()-inicio
+    assert len(store) == n
+
+    store.vaciar()
+    bloques = []
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot()
+    camino(decoder,por_ventana,frames[:VENTANAS_LOTE],store,lambda: bloques.append(bloques_nuevos(base)))
+    tracemalloc.stop()
+    return segundos/n,bloques[0]/(VENTANAS_LOTE*por_ventana)
+
+# medir_csv
+# Escribe el store en CSV con filas en lista (a_filas) o iteradas (iter_filas) y retorna (segundos, memoria máxima en bytes).
+def medir_csv(store,titulos,iterar):
+    with tempfile.TemporaryDirectory() as carpeta:
+        writer = CsvLogWriter(os.path.join(carpeta,"log.csv"),titulos)
+        escribir = (lambda s: writer.writer.writerows(s.iter_filas())) if iterar else (lambda s: writer.writer.writerows(s.a_filas()))
+        tracemalloc.start()
+        escribir(store)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        inicio = time.perf_counter()
+        escribir(store)
+        segundos = time.perf_counter()-inicio
+        writer.cerrar()
+    return segundos,pico
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records",type=int,default=50000)
+    parser.add_argument("--json")
+    args = parser.parse_args(argv)
+
+    decoder,por_ventana,frames = tramas(args.records)
+    frames_completos = frames[:args.records//por_ventana]   # Sólo ventanas completas
+    n = len(frames_completos)*por_ventana
+
+    # Verificación: ambos caminos generan las mismas filas
+    stores = []
+    for camino in (camino_lista,camino_bytes):
+        store = decoder.crear_store(capacidad=n)
+        camino(decoder,por_ventana,frames_completos,store)
+        stores.append(store)
+    igual = lambda a,b: a == b or (a != a and b != b)
+    assert all(all(map(igual,x,y)) for x,y in zip(stores[0].iter_filas(),stores[1].iter_filas())), "Los caminos no coinciden"
+    print(f"records: {n} ({por_ventana} por ventana, {VENTANAS_LOTE} ventanas por lote), verificados")
+
+    resultado = {"records":n}
+    for nombre,camino in (("lista",camino_lista),("bytes",camino_bytes)):
+        segundos,bloques = medir_camino(camino,decoder,por_ventana,frames_completos,n)
+        resultado[nombre] = {"us_por_record":segundos*1e6,"bloques_por_record":bloques}
+        print(f"{nombre:8}{segundos*1e6:8.2f} us/record  {bloques:8.2f} bloques retenidos/record")
+
+    lote = decoder.crear_store(capacidad=VENTANAS_LOTE*por_ventana)
+    camino_bytes(decoder,por_ventana,frames_completos[:VENTANAS_LOTE],lote)
+    for nombre,iterar in (("a_filas",False),("iter_filas",True)):
+        segundos,pico = medir_csv(lote,decoder.titulos,iterar)
+        resultado[f"csv_{nombre}"] = {"us_por_record":segundos*1e6/len(lote),"pico_bytes_por_record":pico/len(lote)}
+        print(f"csv {nombre:11}{segundos*1e6/len(lote):8.2f} us/record  {pico/len(lote):10.1f} bytes máximos/record")
+
+    if args.json:
+        with open(args.json,"w",encoding="utf-8") as f:
+            json.dump(resultado,f,indent=1)
+
+if __name__ == "__main__":
+    main()
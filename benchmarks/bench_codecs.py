@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import random
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+sys.path.insert(0,os.path.join(RAIZ,"tests"))
+from shark270_decoder import reg2var
+from shark270_core import interpretar_registros
+from referencia import reg2var_original, interpretar_original
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                          Benchmark: codecs de reg2var y del Polling
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Compara la velocidad de los codecs de shark270_decoder (reg2var) y de la interpretación del Polling (interpretar_registros)
+# con la implementación original con if/elif (tests/referencia.py). La paridad de los valores se verifica en tests/test_codecs.py.
+# Uso:
+#   python benchmarks/bench_codecs.py
+
+SIZES = {"TSTAMP":3,"UINT32":2,"SINT32":2,"UINT16":1,"SINT16":1,"FLOAT":2}
+LIMITES = [0x0000,0x0001,0x7FFF,0x8000,0x8001,0x7F80,0x7FC0,0xFF80,0xFFFF]
+
+def registros_aleatorios(n):
+    return [random.choice(LIMITES) if random.random() < 0.2 else random.randrange(0x10000) for _ in range(n)]
+
+def medir(fn,repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter()-inicio)/repeticiones*1e6
+
+if __name__ == "__main__":
+    random.seed(270)
+    print(f"{'':24}{'original us':>12}{'codecs us':>12}")
+    for formato,size in SIZES.items():
+        registros = registros_aleatorios(size)
+        entrada = registros[0] if size == 1 else registros
+        original = medir(lambda: reg2var_original(entrada,formato),100000)
+        nuevo = medir(lambda: reg2var(entrada,formato),100000)
+        print(f"reg2var {formato:16}{original:12.3f}{nuevo:12.3f}")
+    registros = registros_aleatorios(8)
+    print(f"reg2var {'ASCII':16}{medir(lambda: reg2var_original(registros,'ASCII'),100000):12.3f}"
+          f"{medir(lambda: reg2var(registros,'ASCII'),100000):12.3f}")
+    for formato in ["FLOAT","UINT16","TSTAMP"]:
+        registros = registros_aleatorios(120)
+        original = medir(lambda: interpretar_original(1000,registros,formato),2000)
+        nuevo = medir(lambda: interpretar_registros(1000,registros,formato),2000)
+        print(f"Polling 120 {formato:12}{original:12.3f}{nuevo:12.3f}")
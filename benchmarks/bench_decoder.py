@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import random
+import struct
+import pandas as pd
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shark270_decoder import reg2var, compilar_decoder
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: decodificación campo por campo vs. decoder compilado
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Compara la interpretación original de las ventanas de un Histórico (reg2var por cada variable) con el decoder compilado
+# de shark270_decoder, verificando que ambos generen exactamente los mismos valores.
+# Uso:
+#   python benchmarks/bench_decoder.py [cantidad_de_records]
+
+# Formato de record de ejemplo: timestamp, mediciones FLOAT, energías SINT32, armónicos UINT16 y un bloque UINT16 de 2 registros.
+REC_TITLES = ['Timestamp'] + [f"V{n}" for n in range(12)] + [f"W, Phase {f}" for f in "ABC"] + [f"Wh {n}" for n in range(8)] \
+    + [f"Voltage THD % {n}" for n in range(2)] + [f"Phase A Current harmonic magnitudes ({n})" for n in range(1,41)] \
+    + ["Wave Scope scale factors"]
+REC_VAR_SIZES = [3] + [2]*12 + [2]*3 + [2]*8 + [1]*2 + [1]*40 + [2]
+REC_VAR_TYPES = ['TSTAMP'] + ['FLOAT']*12 + ['FLOAT']*3 + ['SINT32']*8 + ['UINT16']*2 + ['UINT16']*40 + ['UINT16']
+
+# decodificar_por_campo
+# Interpretación original de retlog_shark270: recorre la ventana llamando reg2var por cada variable.
+def decodificar_por_campo(window_data,rec_titles,rec_var_sizes,rec_var_types):
+    records = []
+    rec_data = []
+    i_data = 0
+    i_type = 0
+    while i_data < len(window_data):
+        i_type = i_type % len(rec_var_types)
+        format = rec_var_types[i_type]
+        step = rec_var_sizes[i_type]
+        if (i_type == 0 and i_data != 0):
+            records.append(rec_data)
+            rec_data = []
+        if step != 1:
+            bytes = window_data[i_data:i_data+step]
+        else:
+            bytes = window_data[i_data]
+        try:
+            value = reg2var(bytes,format)
+            if pd.isna(value):
+                value = 'NaN'
+            elif ('%' in rec_titles[i_type]) or ('Phase' in rec_titles[i_type]):
+                value = value/100
+            rec_data.append(value)
+        except:
+            for byte in bytes:
+                value = reg2var(byte,format)
+                if pd.isna(value):
+                    value = 'NaN'
+                elif '%' in rec_titles[i_type]:
+                    value = value/100
+                rec_data.append(value)
+        i_data += step
+        i_type += 1
+    records.append(rec_data)
+    return records
+
+# generar_records
+# Genera registros sintéticos para n records con el formato de ejemplo.
+def generar_records(n):
+    rng = random.Random(270)
+    regs = []
+    for i in range(n):
+        regs.extend([0x1800|rng.randint(1,12),rng.randint(1,28)<<8|rng.randint(0,23),rng.randint(0,59)<<8|rng.randint(0,59)])
+        for size,tipo in zip(REC_VAR_SIZES[1:],REC_VAR_TYPES[1:]):
+            if tipo == 'FLOAT':
+                value = struct.unpack('>I',struct.pack('>f',rng.uniform(-500,500)))[0]
+                if rng.random() < 0.01:
+                    value = 0x7FC00000 # NaN
+                regs.extend([value >> 16,value & 0xFFFF])
+            else:
+                regs.extend(rng.randint(0,0xFFFF) for _ in range(size))
+    return regs
+
+def main():
+    n_recs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rec_size_bytes = 2*sum(REC_VAR_SIZES)
+    rec_per_window = max(246//rec_size_bytes,1)
+    regs = generar_records(n_recs)
+    window_regs = rec_per_window*rec_size_bytes//2
+    windows = [regs[i:i+window_regs] for i in range(0,len(regs),window_regs)]
+
+    t0 = time.perf_counter()
+    por_campo = []
+    for window in windows:
+        por_campo.extend(decodificar_por_campo(window,REC_TITLES,REC_VAR_SIZES,REC_VAR_TYPES))
+    t_campo = time.perf_counter()-t0
+
+    t0 = time.perf_counter()
+    decoder = compilar_decoder(REC_TITLES,REC_VAR_SIZES,REC_VAR_TYPES,rec_size_bytes)
+    por_ventana = []
+    for window in windows:
+        por_ventana.extend(decoder.a_filas(decoder.decodificar(window)))
+    t_ventana = time.perf_counter()-t0
+
+    t0 = time.perf_counter()
+    en_lote = decoder.a_filas(decoder.decodificar(regs))
+    t_lote = time.perf_counter()-t0
+
+    assert por_campo == por_ventana == en_lote, "Los resultados no coinciden con reg2var"
+    print(f"records: {n_recs}  ({rec_size_bytes} bytes/record, {rec_per_window} records/ventana)")
+    print(f"reg2var por campo:      {t_campo:8.3f} s  {n_recs/t_campo:10.0f} rec/s")
+    print(f"decoder por ventana:    {t_ventana:8.3f} s  {n_recs/t_ventana:10.0f} rec/s  (x{t_campo/t_ventana:.1f})")
+    print(f"decoder en lote:        {t_lote:8.3f} s  {n_recs/t_lote:10.0f} rec/s  (x{t_campo/t_lote:.1f})")
+
+if __name__ == "__main__":
+    main()
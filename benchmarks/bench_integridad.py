@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import timedelta
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+from shark270_core import Shark270
+from shark270_simulator import Shark270Simulator, crear_contexto, _tstamp_registros
+from shark270_consultas import indexar_exportados, archivos_indexados, FORMATO_TSTAMP
+from bench_shark270 import puerto_libre
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: integridad y unión de los records recuperados
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Dos partes:
+#   - Recuperación: el simulador (en el mismo proceso) responde una fracción --stale de las ventanas con los records de la
+#       ventana anterior (el índice de la ventana es correcto, los datos no), y el log tiene un corte de --outage records a la
+#       mitad. Se verifica que el archivo exportado contenga cada record una sola vez y en orden, y se cuentan las ventanas
+#       solicitadas nuevamente y las solicitudes por record con y sin ventanas erróneas.
+#   - Archivo: --pulls recuperaciones superpuestas del mismo log exportadas en archivos separados ({SN}_{log}_{n}.csv). Después
+#       de cada una se mide la indexación incremental del archivo (LogArchive) y la unión por recorrido completo (leer todos los
+#       archivos exportados, concatenarlos y eliminar los timestamps repetidos). Se verifica que ambos resultados coincidan.
+# Uso:
+#   python benchmarks/bench_integridad.py [--records 5000] [--stale 0.05] [--pulls 12] [--json resultado.json]
+
+# recuperar
+# Recupera Historic 1 del simulador y retorna (resultado de retlog, timestamps exportados, ventanas respondidas con errores).
+def recuperar(records,stale,outage,modo):
+    import pandas as pd
+    contexto = crear_contexto(records)
+    log_sim = contexto.logs[2]
+    if outage:
+        # Corte de energía: los records desde la mitad del log se registran outage intervalos más tarde
+        tstamp = log_sim.tstamp
+        log_sim.tstamp = lambda k: tstamp(k) if k < records//2 else \
+            _tstamp_registros(log_sim.inicio+timedelta(seconds=(k+outage)*log_sim.interval))
+    preparar = contexto._preparar_ventana
+    erroneas = set()
+
+    def preparar_con_errores():
+        rec_per_window,repeticiones,indice = contexto.ventana
+        if indice >= rec_per_window and indice not in erroneas and random.random() < stale:
+            erroneas.add(indice)
+            contexto.ventana = (rec_per_window,repeticiones,indice-rec_per_window)
+            preparar()
+            contexto.ventana = (rec_per_window,repeticiones,indice)
+        else:
+            preparar()
+    contexto._preparar_ventana = preparar_con_errores
+
+    port = puerto_libre()
+    simulador = Shark270Simulator(contexto,port=port)
+    simulador.iniciar()
+    try:
+        with tempfile.TemporaryDirectory() as carpeta:
+            meter = Shark270("127.0.0.1",port)
+            meter.conectar()
+            resultado = meter.retlogs(["Historic 1"],"CSV",False,carpeta,transfer_mode=modo)["Historic 1"]
+            meter.cerrar()
+            t = pd.to_datetime(pd.read_csv(resultado["export"],usecols=[0]).iloc[:,0],format=FORMATO_TSTAMP)
+    finally:
+        simulador.parar()
+    return resultado,t.to_numpy(),len(erroneas)
+
+# exportar_pull
+# Escribe los records [inicio, fin) de un log sintético (intervalo de 60 s) con el formato de exportación CSV.
+def exportar_pull(pd,ruta,inicio,fin):
+    k = np.arange(inicio,fin)
+    tabla = pd.DataFrame({"Timestamp":(pd.Timestamp("2024-01-01")+pd.to_timedelta(k*60,unit="s")).strftime(FORMATO_TSTAMP),
+                          "Volts A-N":230+np.sin(k/50),"Watts, 3-Ph total":1000+(k%97).astype(np.float64),
+                          "Energy":k.astype(np.int64)})
+    tabla.to_csv(ruta,index=False,na_rep="NaN")
+
+# union_completa
+# Une todos los archivos exportados leyéndolos completos (referencia sin índice).
+def union_completa(pd,rutas):
+    tabla = pd.concat([pd.read_csv(ruta,na_values=["NaN"],keep_default_na=False) for ruta in rutas],ignore_index=True)
+    tabla.insert(0,"t",pd.to_datetime(tabla.pop("Timestamp"),format=FORMATO_TSTAMP).to_numpy().astype("datetime64[s]")
+                 .astype(np.int64))
+    return tabla.drop_duplicates("t").sort_values("t",ignore_index=True)
+
+# medir_archivo
+# Exporta las recuperaciones superpuestas y retorna (records del archivo, segundos de indexación y de unión completa por pull).
+def medir_archivo(pulls,por_pull,avance):
+    import pandas as pd
+    indexado,completo = [],[]
+    with tempfile.TemporaryDirectory() as carpeta:
+        rutas = []
+        for n in range(pulls):
+            rutas.append(os.path.join(carpeta,f"SIM0000001_Historic 1_{n}.csv"))
+            exportar_pull(pd,rutas[-1],n*avance,n*avance+por_pull)
+            inicio = time.perf_counter()
+            indexar_exportados(carpeta)
+            indexado.append(time.perf_counter()-inicio)
+            inicio = time.perf_counter()
+            referencia = union_completa(pd,rutas)
+            completo.append(time.perf_counter()-inicio)
+        tabla = archivos_indexados(carpeta)[("SIM0000001","Historic 1")].leer()
+    t = tabla["t"].to_numpy()
+    assert np.all(t[1:] > t[:-1]),"timestamps repetidos o desordenados en el archivo"
+    assert np.array_equal(t,referencia["t"].to_numpy()),"el archivo no coincide con la unión completa"
+    assert np.array_equal(tabla["Energy"].to_numpy(),referencia["Energy"].to_numpy())
+    return len(tabla),indexado,completo
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records",type=int,default=5000)
+    parser.add_argument("--stale",type=float,default=0.05,help="fracción de ventanas respondidas con datos anteriores")
+    parser.add_argument("--outage",type=int,default=30,help="intervalos sin records a la mitad del log")
+    parser.add_argument("--pulls",type=int,default=12)
+    parser.add_argument("--pull-records",type=int,default=20000,help="records de cada recuperación")
+    parser.add_argument("--overlap",type=float,default=0.5,help="fracción de cada recuperación ya contenida en la anterior")
+    parser.add_argument("--seed",type=int,default=1)
+    parser.add_argument("--json")
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    resultado = {"records":args.records,"stale":args.stale}
+    for modo in ("Standard","Fast"):
+        base,_,_ = recuperar(args.records,0,args.outage,modo)
+        obtenido,t,erroneas = recuperar(args.records,args.stale,args.outage,modo)
+        assert len(t) == args.records and np.all(t[1:] > t[:-1]),"records faltantes, repetidos o desordenados"
+        verificacion = obtenido["verificacion"]
+        resultado[modo] = {"ventanas_erroneas":erroneas,**verificacion,
+                           "solicitudes_por_record":obtenido["requests_per_record"],
+                           "solicitudes_por_record_sin_errores":base["requests_per_record"]}
+        print(f"{modo:9}{erroneas:5} ventanas erróneas, {verificacion['ventanas_repetidas']:5} solicitadas nuevamente, "
+              f"{verificacion['saltos']} saltos | solicitudes/record {obtenido['requests_per_record']:.3f} "
+              f"(sin errores {base['requests_per_record']:.3f}) | {len(t)} records únicos y ordenados")
+
+    avance = max(int(args.pull_records*(1-args.overlap)),1)
+    filas,indexado,completo = medir_archivo(args.pulls,args.pull_records,avance)
+    exportados = args.pulls*args.pull_records
+    resultado["archivo"] = {"pulls":args.pulls,"records_exportados":exportados,"records_unicos":filas,
+                            "indexado_s":indexado,"union_completa_s":completo}
+    print(f"\narchivo: {args.pulls} recuperaciones, {exportados} records exportados, {filas} únicos (verificados)")
+    print(f"{'pull':>6}{'indexado (s)':>15}{'unión completa (s)':>21}")
+    for n in range(args.pulls):
+        print(f"{n:6}{indexado[n]:15.3f}{completo[n]:21.3f}")
+    print(f"{'total':>6}{sum(indexado):15.3f}{sum(completo):21.3f}")
+
+    if args.json:
+        with open(args.json,"w",encoding="utf-8") as f:
+            json.dump(resultado,f,indent=1)
+
+if __name__ == "__main__":
+    main()
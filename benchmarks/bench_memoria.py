@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+from shark270_decoder import compilar_decoder
+from bench_decoder import REC_TITLES, REC_VAR_SIZES, REC_VAR_TYPES
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: memoria de los records decodificados
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Compara la memoria máxima (RSS) que ocupa un log completo decodificado:
+#   - filas: listas de Python con los valores de reg2var (TSTAMP como texto), la representación anterior a RecordStore.
+#   - store: RecordStore con columnas tipadas y timestamps epoch int64.
+# Cada representación se mide en un proceso aparte, descontando la memoria de los registros recibidos (iguales en ambos).
+# Antes de medir se verifica que RecordStore genere exactamente las mismas filas que RecordDecoder.a_filas.
+# Uso:
+#   python benchmarks/bench_memoria.py [cantidad_de_records] [--json resultado.json]
+
+# generar_registros
+# Registros sintéticos (arreglo uint16 big-endian) de n records con el formato de ejemplo de bench_decoder.
+def generar_registros(n,semilla=270):
+    rng = np.random.default_rng(semilla)
+    regs = rng.integers(0,0x10000,size=(n,sum(REC_VAR_SIZES)),dtype=np.uint16)
+    inicio = np.datetime64("2024-01-01T00:00:00")+np.arange(n)*np.timedelta64(60,"s")
+    meses = inicio.astype("datetime64[M]")
+    dias = (inicio.astype("datetime64[D]")-meses.astype("datetime64[D]")).astype(int)+1
+    segundos = (inicio-inicio.astype("datetime64[D]")).astype(int)
+    regs[:,0] = 24 << 8 | (meses.astype(int)%12+1)
+    regs[:,1] = dias << 8 | segundos//3600
+    regs[:,2] = (segundos//60%60) << 8 | segundos%60
+    offset = 3
+    for size,tipo in zip(REC_VAR_SIZES[1:],REC_VAR_TYPES[1:]):
+        if tipo == 'FLOAT':
+            valores = rng.uniform(-500,500,n).astype('>f4')
+            valores[rng.random(n) < 0.01] = np.nan
+            regs[:,offset:offset+2] = valores.view('>u2').reshape(n,2)
+        offset += size
+    return regs.astype('>u2')
+
+def rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# medir
+# Decodifica n records por lotes de 64 ventanas con la representación indicada y retorna la memoria y el tiempo.
+def medir(representacion,n):
+    regs = generar_registros(n)
+    decoder = compilar_decoder(REC_TITLES,REC_VAR_SIZES,REC_VAR_TYPES,2*sum(REC_VAR_SIZES))
+    lote = 64*max(246//decoder.itemsize,1)
+    base = rss_kb()
+    inicio = time.perf_counter()
+    if representacion == "filas":
+        log = []
+        for i in range(0,n,lote):
+            log.extend(decoder.a_filas(decoder.decodificar(regs[i:i+lote].tobytes())))
+    else:
+        log = decoder.crear_store()
+        for i in range(0,n,lote):
+            decoder.decodificar_en(log,regs[i:i+lote].tobytes())
+    segundos = time.perf_counter()-inicio
+    assert len(log) == n
+    return {"records":n,"valores":n*len(decoder.titulos),"rss_max_kb":rss_kb()-base,"segundos":segundos}
+
+# verificar_paridad
+# RecordStore.a_filas debe generar los mismos valores que RecordDecoder.a_filas.
+def verificar_paridad(n=5000):
+    regs = generar_registros(n,semilla=1).tobytes()
+    decoder = compilar_decoder(REC_TITLES,REC_VAR_SIZES,REC_VAR_TYPES,2*sum(REC_VAR_SIZES))
+    store = decoder.crear_store(capacidad=16)
+    decoder.decodificar_en(store,regs)
+    assert [list(fila) for fila in store.a_filas()] == decoder.a_filas(decoder.decodificar(regs)), "RecordStore no coincide"
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "--medir":
+        print(json.dumps(medir(argv[1],int(argv[2]))))
+        return
+    n = int(argv[0]) if argv and not argv[0].startswith("--") else 100000
+    verificar_paridad()
+    resultados = {}
+    for representacion in ["filas","store"]:
+        salida = subprocess.run([sys.executable,os.path.abspath(__file__),"--medir",representacion,str(n)],
+                                capture_output=True,text=True,check=True).stdout
+        resultados[representacion] = json.loads(salida)
+    print(f"records: {n}, {len(REC_TITLES)} columnas (armónicos expandidos)")
+    for representacion,r in resultados.items():
+        print(f"{representacion:8}{r['rss_max_kb']/1024:10.1f} MB RSS  {r['rss_max_kb']*1024/r['valores']:8.1f} bytes/valor"
+              f"  {r['segundos']:8.2f} s")
+    print(f"reducción: x{resultados['filas']['rss_max_kb']/max(resultados['store']['rss_max_kb'],1):.1f}")
+    if "--json" in argv:
+        with open(argv[argv.index("--json")+1],"w",encoding="utf-8") as f:
+            json.dump(resultados,f,indent=1)
+
+if __name__ == "__main__":
+    main()
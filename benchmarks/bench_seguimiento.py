@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+from shark270_core import Shark270
+from shark270_simulator import Shark270Simulator, crear_contexto
+from shark270_seguimiento import SeguimientoLogs
+from bench_shark270 import puerto_libre
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: seguimiento de los logs en vivo
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Ejecuta el simulador en el mismo proceso y agrega un record a cada Histórico cada --interval segundos (hora local de cada
+# record guardada), mientras SeguimientoLogs sigue los logs. Mide por record:
+#   - Retraso: desde que el record se agrega al log hasta que el suscriptor lo recibe.
+#   - Solicitudes Modbus: consultas del estado y solicitudes totales (sesión y ventanas incluidas).
+# Los primeros --warmup records no se cuentan (estimación del intervalo y del desfase). Se verifica que el archivo exportado
+# contenga todos los records del log, sin repetir ninguno.
+# Uso:
+#   python benchmarks/bench_seguimiento.py [--interval 3] [--records 20] [--latency s] [--json resultado.json]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interval",type=int,default=3,help="segundos entre records del simulador")
+    parser.add_argument("--records",type=int,default=20,help="records nuevos medidos")
+    parser.add_argument("--warmup",type=int,default=5,help="records iniciales sin medir")
+    parser.add_argument("--latency",type=float,default=0.0,help="retardo de cada solicitud del simulador (s)")
+    parser.add_argument("--margin",type=float,default=1.0)
+    parser.add_argument("--json")
+    args = parser.parse_args(argv)
+
+    port = puerto_libre()
+    contexto = crear_contexto(100,args.latency,interval=args.interval)
+    simulador = Shark270Simulator(contexto,port=port)
+    simulador.iniciar()
+    log_sim = contexto.logs[2]
+    agregados = {}  # índice absoluto del record -> hora local en que se agregó
+    recibidos = {}  # índice absoluto del record -> hora local en que lo recibió el suscriptor
+    detener = threading.Event()
+
+    def registrar():
+        while not detener.wait(args.interval):
+            with contexto.lock:
+                log_sim.agregar(1)
+                agregados[log_sim.total-1] = time.time()
+
+    def recibir(SN,log,titulos,filas):
+        ahora = time.time()
+        # El índice absoluto del record se obtiene de su timestamp (intervalo fijo desde el inicio del log)
+        for fila in filas:
+            indice = int((time.mktime(time.strptime(fila[0],"%d/%m/%Y %H:%M:%S"))-time.mktime(log_sim.inicio.timetuple()))
+                         // args.interval)
+            assert indice not in recibidos,f"record {indice} repetido"
+            recibidos[indice] = ahora
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        meter = Shark270("127.0.0.1",port)
+        meter.conectar()
+        seguimiento = SeguimientoLogs(meter,["Historic 1"],carpeta=carpeta,intervalo=4*args.interval,margen=args.margin)
+        seguimiento.suscribir(recibir)
+        seguimiento.iniciar()
+        hilo = threading.Thread(target=registrar,daemon=True)
+        hilo.start()
+        while len(agregados) < args.warmup:
+            time.sleep(0.1)
+        consultas,requests,inicio = seguimiento.consultas,meter.requests,min(agregados)+args.warmup
+        while len(agregados) < args.warmup+args.records:
+            time.sleep(0.1)
+        time.sleep(args.interval/2)
+        detener.set()
+        seguimiento.parar()
+        seguimiento.hilo.join(30)
+        consultas,requests = seguimiento.consultas-consultas,meter.requests-requests
+        meter.cerrar()
+        simulador.parar()
+
+        with open(os.path.join(carpeta,"SIM0000001_Historic 1.csv"),encoding="utf-8") as f:
+            exportados = sum(1 for _ in f)-1
+        assert exportados == log_sim.total,(exportados,log_sim.total)
+        assert sorted(recibidos) == list(range(log_sim.total)),"faltan records"
+
+    medidos = [recibidos[i]-agregados[i] for i in range(inicio,inicio+args.records)]
+    medidos.sort()
+    resultado = {"interval":args.interval,"records":args.records,"retraso_medio_s":sum(medidos)/len(medidos),
+                 "retraso_p50_s":medidos[len(medidos)//2],"retraso_max_s":medidos[-1],
+                 "consultas_por_record":consultas/args.records,"solicitudes_por_record":requests/args.records}
+    print(f"records: {exportados} exportados, {args.records} medidos (intervalo {args.interval} s)")
+    print(f"retraso: medio {resultado['retraso_medio_s']:.2f} s, p50 {resultado['retraso_p50_s']:.2f} s, "
+          f"máximo {resultado['retraso_max_s']:.2f} s")
+    print(f"consultas del estado por record: {resultado['consultas_por_record']:.2f}, "
+          f"solicitudes por record: {resultado['solicitudes_por_record']:.2f}")
+    if args.json:
+        with open(args.json,"w",encoding="utf-8") as f:
+            json.dump(resultado,f,indent=1)
+
+if __name__ == "__main__":
+    main()
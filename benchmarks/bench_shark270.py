@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+from shark270_core import Shark270, EsperaVentana
+from shark270_decoder import reg2var
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: recuperación de logs, Polling y reg2var contra el simulador
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Inicia el simulador (shark270_simulator.py) en otro proceso, para que el tiempo de CPU medido sea sólo el del cliente, y mide:
+#   - retlog (Standard y Fast, Historic 1 y 2): records/s, solicitudes Modbus por record, CPU por record y memoria máxima.
+#       Con --busy también se mide la consulta del estado de la ventana sin pausa ("sin espera") para comparar con EsperaVentana.
+#   - leer (Polling): lecturas/s, solicitudes por lectura, CPU por lectura y memoria máxima.
+#   - reg2var por formato: llamadas/s, CPU por llamada y memoria máxima.
+# La memoria máxima se mide con tracemalloc en una segunda ejecución, para no afectar los tiempos de la primera.
+# Uso:
+#   python benchmarks/bench_shark270.py [--records N] [--latency s] [--busy s] [--errors p] [--json resultado.json]
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1",0))
+        return s.getsockname()[1]
+
+def iniciar_simulador(args,port):
+    proceso = subprocess.Popen([sys.executable,os.path.join(RAIZ,"shark270_simulator.py"),"--port",str(port),
+                                "--records",str(args.records),"--latency",str(args.latency),"--busy",str(args.busy),
+                                "--errors",str(args.errors)],stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    limite = time.monotonic()+30
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(("127.0.0.1",port),timeout=0.5).close()
+            return proceso
+        except OSError:
+            time.sleep(0.1)
+    proceso.kill()
+    raise RuntimeError("El simulador no inició.")
+
+# medir
+# Ejecuta fn dos veces: la primera mide tiempo, CPU y solicitudes; la segunda la memoria máxima (tracemalloc).
+# Parámetros:
+# fn - función() que retorna la cantidad de unidades procesadas (records, lecturas, llamadas)
+# meter - medidor, para contar las solicitudes (None si no aplica)
+def medir(fn,meter=None):
+    requests = meter.requests if meter is not None else 0
+    wall,cpu = time.perf_counter(),time.process_time()
+    unidades = fn()
+    wall,cpu = time.perf_counter()-wall,time.process_time()-cpu
+    requests = (meter.requests-requests) if meter is not None else 0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"unidades":unidades,"por_segundo":unidades/max(wall,1e-9),"solicitudes_por_unidad":requests/max(unidades,1),
+            "cpu_us_por_unidad":cpu/max(unidades,1)*1e6,"memoria_max_kb":peak/1024}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del Shark270 contra el simulador local.")
+    parser.add_argument("--records",type=int,default=5000,help="records de cada Histórico del simulador")
+    parser.add_argument("--latency",type=float,default=0.0,help="retardo de cada solicitud del simulador (s)")
+    parser.add_argument("--busy",type=float,default=0.0,help="tiempo para preparar cada ventana (s)")
+    parser.add_argument("--errors",type=float,default=0.0,help="probabilidad de error en las lecturas de la ventana")
+    parser.add_argument("--reads",type=int,default=500,help="lecturas de Polling")
+    parser.add_argument("--calls",type=int,default=100000,help="llamadas a reg2var por formato")
+    parser.add_argument("--json",help="guardar los resultados en un archivo JSON")
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    port = puerto_libre()
+    simulador = iniciar_simulador(args,port)
+    carpeta = tempfile.mkdtemp(prefix="bench_shark270_")
+    try:
+        meter = Shark270("127.0.0.1",port)
+        meter.conectar()
+        modos = ["Fast"] if args.errors else ["Standard","Fast"]  # Standard no reintenta las lecturas fallidas
+        esperas = {"":EsperaVentana()}
+        if args.busy:
+            esperas[" sin espera"] = EsperaVentana(0,1,0,adaptativa=False)
+        for modo in modos:
+            for log in ["Historic 1","Historic 2"]:
+                for nombre,espera in esperas.items():
+                    meter.espera = espera
+                    fn = lambda: meter.retlog(log,carpeta=carpeta,incremental=False,transfer_mode=modo)["records"]
+                    resultados[f"retlog {modo} {log}{nombre}"] = medir(fn,meter)
+        meter.espera = EsperaVentana()
+
+        fn = lambda: sum(len(meter.leer(1000,60,"FLOAT")) > 0 for _ in range(args.reads))
+        resultados["leer 60 FLOAT"] = medir(fn,meter)
+        meter.cerrar()
+    finally:
+        simulador.terminate()
+        simulador.wait()
+        shutil.rmtree(carpeta,ignore_errors=True)
+
+    muestras = {"TSTAMP":[0x1801,0x0F0A,0x1E2D],"UINT32":[0x0001,0x86A0],"SINT32":[0xFFFF,0x7960],"UINT16":0x8001,
+                "SINT16":0x8001,"FLOAT":[0x4348,0x0000],"ASCII":[0x5348,0x4152,0x4B32,0x3730]}
+    for formato,registros in muestras.items():
+        def fn(formato=formato,registros=registros):
+            for _ in range(args.calls):
+                reg2var(registros,formato)
+            return args.calls
+        resultados[f"reg2var {formato}"] = medir(fn)
+
+    print(f"\n{'':40}{'unidades/s':>12}{'solic/unidad':>14}{'CPU us/unidad':>15}{'mem max KB':>12}")
+    for nombre,r in resultados.items():
+        print(f"{nombre:40}{r['por_segundo']:12.0f}{r['solicitudes_por_unidad']:14.3f}{r['cpu_us_por_unidad']:15.2f}"
+              f"{r['memoria_max_kb']:12.1f}")
+    if args.json:
+        with open(args.json,"w",encoding="utf-8") as f:
+            json.dump(resultados,f,indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import struct
+import time
+import argparse
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,RAIZ)
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+from shark270_core import Shark270, catalogo_registros
+from shark270_snapshot import SnapshotPlan, variables_snapshot, tomar_snapshots
+from bench_shark270 import puerto_libre, iniciar_simulador
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Benchmark: snapshot de las lecturas contra el simulador
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Verifica que el snapshot interprete cada medición igual que Shark270.leer_variable (una solicitud por medición) y mide,
+# contra varios simuladores (un proceso por medidor):
+#   - Solicitudes por snapshot del plan, comparadas con una lectura por medición.
+#   - Snapshots/s de un medidor y de todos los medidores en paralelo (tomar_snapshots).
+# Uso:
+#   python benchmarks/bench_snapshot.py [--meters 8] [--seconds 5] [--latency s] [--json resultado.json]
+
+# MedidorMemoria
+# Registros aleatorios en memoria con la interfaz de lectura de Shark270, para la verificación.
+class MedidorMemoria:
+    def __init__(self,semilla=270):
+        self.registros = np.random.default_rng(semilla).integers(0,0x10000,size=0x10000,dtype=np.uint16).tolist()
+
+    def leer_registros(self,address,count,idempotente=True):
+        return self.registros[address:address+count]
+
+    def leer_bytes(self,address,count,idempotente=True):
+        return struct.pack(f">{count}H",*self.registros[address:address+count])
+
+# verificar_paridad
+# Cada medición del snapshot debe ser igual a leer_variable (NaN == NaN). Retorna la cantidad de mediciones verificadas.
+def verificar_paridad(plan):
+    fake = MedidorMemoria()
+    t,valores = plan.leer(fake)
+    posicion = {v.reg:i for i,v in enumerate(plan.variables)}
+    igual = lambda a,b: a == b or (a != a and b != b)
+    infos = catalogo_registros().indice.values()
+    for info in infos:
+        esperado = Shark270.leer_variable(fake,info.reg)[1]
+        if isinstance(esperado,list):
+            obtenido = [valores[posicion[info.reg+k]] for k in range(info.size)]
+            assert all(map(igual,obtenido,esperado)),info
+        else:
+            assert igual(valores[posicion[info.reg]],esperado),(info,valores[posicion[info.reg]],esperado)
+    return len(infos)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meters",type=int,default=8)
+    parser.add_argument("--seconds",type=float,default=5)
+    parser.add_argument("--latency",type=float,default=0.0)
+    parser.add_argument("--json")
+    args = parser.parse_args(argv)
+    args.records,args.busy,args.errors = 10,0.0,0.0
+
+    plan = SnapshotPlan(variables_snapshot())
+    verificados = verificar_paridad(plan)
+    print(f"mediciones: {verificados} verificadas ({len(plan.variables)} valores)")
+    resultado = {"valores":len(plan.variables),"solicitudes":plan.solicitudes,"solicitudes_por_medicion":verificados}
+    print(f"solicitudes por snapshot: {plan.solicitudes} (una por medición: {verificados})")
+
+    procesos = []
+    meters = []
+    try:
+        for _ in range(args.meters):
+            port = puerto_libre()
+            procesos.append(iniciar_simulador(args,port))
+            meter = Shark270("127.0.0.1",port)
+            meter.conectar()
+            meters.append(meter)
+
+        inicio = time.perf_counter()
+        n = 0
+        while time.perf_counter()-inicio < args.seconds:
+            plan.leer(meters[0])
+            n += 1
+        resultado["snapshots_s_1"] = n/(time.perf_counter()-inicio)
+
+        inicio = time.perf_counter()
+        n = 0
+        while time.perf_counter()-inicio < args.seconds:
+            for r in tomar_snapshots(meters,plan,workers=len(meters)):
+                if isinstance(r,Exception):
+                    raise r
+            n += len(meters)
+        resultado[f"snapshots_s_{len(meters)}"] = n/(time.perf_counter()-inicio)
+    finally:
+        for meter in meters:
+            meter.cerrar()
+        for proceso in procesos:
+            proceso.kill()
+    print(f"snapshots/s: 1 medidor {resultado['snapshots_s_1']:.1f}, {len(meters)} medidores "
+          f"{resultado[f'snapshots_s_{len(meters)}']:.1f}")
+    if args.json:
+        with open(args.json,"w",encoding="utf-8") as f:
+            json.dump(resultado,f,indent=1)
+
+if __name__ == "__main__":
+    main()
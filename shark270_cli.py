@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from shark270_core import Shark270, Shark270Error, EsperaVentana, LOGS, DATA_FORMATS, TRANSFER_MODES, configurar_cache
+from shark270_export import EXPORT_FORMATS
+from shark270_snapshot import SnapshotPlan, variables_snapshot, guardar_snapshots
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  SHARK270 - Recolección sin interfaz gráfica
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Recupera logs (y opcionalmente lee registros) de varios medidores Shark270 de forma concurrente, utilizando la misma lógica
+# que la interfaz gráfica (shark270_core.py). Al finalizar se muestra un resumen por medidor.
+# Uso:
+#   python shark270_cli.py --meter 192.168.0.90 --meter 192.168.0.91:502/2 --logs "Historic 1" "Historic 2"
+#   python shark270_cli.py --config medidores.json --workers 8 --report resumen.json
+#   python shark270_cli.py --config medidores.json --logs --snapshot lecturas.csv   (sólo snapshot de las lecturas)
+# Archivo de configuración (lista JSON), los campos omitidos toman los valores de los argumentos:
+#   [{"host": "192.168.0.90", "port": 502, "unit": 1, "logs": ["Historic 1"], "read": [[9, 8, "ASCII"]]}]
+
+# parse_meter
+# Interpreta un medidor en formato host[:port][/unit].
+def parse_meter(texto):
+    host,_,unit = texto.partition("/")
+    host,_,port = host.partition(":")
+    return {"host":host,"port":int(port or 502),"unit":int(unit or 1)}
+
+# recolectar_medidor
+# Conecta con un medidor, realiza las lecturas y recupera los logs configurados. Si la conexión falla se reintenta con
+# espera creciente; gracias a la recuperación incremental, un reintento continúa desde el último lote exportado.
+# Parámetros:
+# cfg - configuración del medidor (host, port, unit, logs, read)
+# args - argumentos de la línea de comandos (timeout, retries, formato, carpeta)
+# plan - SnapshotPlan de las lecturas (--snapshot), o None
+# Retorna un diccionario con el resultado del medidor.
+def recolectar_medidor(cfg,args,plan=None):
+    resultado = {"host":cfg["host"],"port":cfg["port"],"unit":cfg["unit"],"SN":None,"status":"error","attempts":0,
+                 "logs":{},"reads":[],"snapshot":None,"error":None,"seconds":0.0,"connection":{}}
+    start_time = time.monotonic()
+    pendientes = list(cfg["logs"])
+    for attempt in range(1,args.retries+2):
+        resultado["attempts"] = attempt
+        meter = Shark270(cfg["host"],cfg["port"],cfg["unit"],timeout=args.request_timeout,retries=args.request_retries,
+                         perfilar=args.profile,espera=EsperaVentana(args.window_delay,2,args.window_delay_max,
+                                                                    args.window_timeout,not args.window_fixed))
+        # Tiempo máximo por medidor: al vencer se cancela la recuperación en curso
+        timer = threading.Timer(max(args.meter_timeout-(time.monotonic()-start_time),0),meter.cancel.set)
+        timer.start()
+        try:
+            meter.conectar()
+            resultado["SN"] = meter.meter_SN.strip()
+            if attempt == 1:
+                for start,count,format in cfg.get("read",[]):
+                    resultado["reads"].append({"start":start,"format":format,
+                                               "values":[v for _,_,v in meter.leer(start,count,format)]})
+            if plan is not None and resultado["snapshot"] is None:
+                t,valores = plan.leer(meter)
+                resultado["snapshot"] = {"time":t,"values":valores}
+            # Los logs pendientes se recuperan en una sola sesión; un reintento continúa con los que no terminaron
+            def terminado(log,r):
+                resultado["logs"][log] = {"records":r["records"],"total":r["total"],"export":r["export"],
+                                          "rate":round(r["rate"],1),"requests_per_record":round(r["requests_per_record"],3),
+                                          "window_prep_ms":r["window_prep_ms"],"cancelled":r["cancelled"]}
+                if not r["cancelled"]:
+                    pendientes.remove(log)
+            if pendientes and not meter.cancel.is_set():
+                meter.retlogs(list(pendientes),args.format,not args.full,args.out,transfer_mode=args.transfer,on_log=terminado)
+            if meter.cancel.is_set():
+                resultado["status"] = "timeout"
+                resultado["error"] = f"Tiempo máximo de {args.meter_timeout} s agotado"
+            else:
+                resultado["status"] = "ok"
+                resultado["error"] = None
+            break
+        except Exception as e:
+            resultado["error"] = str(e) or type(e).__name__
+        finally:
+            timer.cancel()
+            resultado["connection"] = meter.estadisticas()
+            resultado["metrics"] = meter.metricas.a_dict()
+            if args.metrics:
+                guardar_metricas(meter,cfg,args.metrics)
+            meter.cerrar()
+        if meter.cancel.is_set() or attempt > args.retries:
+            break
+        time.sleep(args.backoff*2**(attempt-1))
+    resultado["seconds"] = round(time.monotonic()-start_time,1)
+    return resultado
+
+# guardar_metricas
+# Guarda las mediciones del medidor en la carpeta indicada, como JSON y en formato de Prometheus.
+def guardar_metricas(meter,cfg,carpeta):
+    os.makedirs(carpeta,exist_ok=True)
+    nombre = os.path.join(carpeta,f"{cfg['host']}_{cfg['port']}_{cfg['unit']}_metrics")
+    etiquetas = {"host":cfg["host"],"port":cfg["port"],"unit":cfg["unit"],"meter":(meter.meter_SN or "").strip()}
+    meter.metricas.guardar(f"{nombre}.json",etiquetas)
+    meter.metricas.guardar(f"{nombre}.prom",etiquetas)
+
+# imprimir_resumen
+# Muestra una tabla con el resultado de cada medidor.
+def imprimir_resumen(resultados):
+    print(f"\n{'Medidor':<24}{'SN':<14}{'Estado':<9}{'Int.':>5}{'Records':>10}{'Seg.':>8}  Detalle")
+    for r in resultados:
+        records = sum(l["records"] for l in r["logs"].values())
+        detalle = r["error"] or ", ".join(f"{log}: {l['records']}/{l['total']} ({l['rate']} rec/s)" for log,l in r["logs"].items())
+        print(f"{r['host']+':'+str(r['port'])+'/'+str(r['unit']):<24}{r['SN'] or '-':<14}{r['status']:<9}"
+              f"{r['attempts']:>5}{records:>10}{r['seconds']:>8}  {detalle}")
+    ok = sum(r["status"] == "ok" for r in resultados)
+    print(f"\n{ok}/{len(resultados)} medidores recolectados correctamente.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recolección de logs de medidores Shark270 sin interfaz gráfica.")
+    parser.add_argument("--meter",action="append",default=[],help="medidor host[:port][/unit], se puede repetir")
+    parser.add_argument("--config",help="archivo JSON con la lista de medidores")
+    parser.add_argument("--logs",nargs="*",default=["Historic 1"],choices=list(LOGS),help="logs a recuperar")
+    parser.add_argument("--read",nargs=3,action="append",default=[],metavar=("START","COUNT","FORMAT"),
+                        help="lectura de registros (como en la ventana Polling), se puede repetir")
+    parser.add_argument("--format",default="CSV",choices=EXPORT_FORMATS,help="formato de exportación")
+    parser.add_argument("--transfer",default="Standard",choices=TRANSFER_MODES,help="modo de transferencia de los logs")
+    parser.add_argument("--full",action="store_true",help="recuperar los logs completos en lugar de sólo los records nuevos")
+    parser.add_argument("--out",default="ExportedLogs",help="carpeta de exportación")
+    parser.add_argument("--workers",type=int,default=4,help="medidores atendidos a la vez")
+    parser.add_argument("--meter-timeout",type=float,default=1800,help="tiempo máximo por medidor en segundos")
+    parser.add_argument("--request-timeout",type=float,default=3,help="tiempo máximo de cada solicitud Modbus en segundos")
+    parser.add_argument("--request-retries",type=int,default=2,
+                        help="reintentos de una solicitud Modbus si la conexión se pierde (con reconexión)")
+    parser.add_argument("--window-delay",type=float,default=0.001,
+                        help="espera inicial entre consultas del estado de la ventana en segundos (se duplica en cada consulta)")
+    parser.add_argument("--window-delay-max",type=float,default=0.05,help="espera máxima entre consultas del estado de la ventana")
+    parser.add_argument("--window-timeout",type=float,default=10,help="tiempo máximo de preparación de una ventana en segundos")
+    parser.add_argument("--window-fixed",action="store_true",
+                        help="no esperar el tiempo de preparación típico del medidor antes de la primera consulta")
+    parser.add_argument("--retries",type=int,default=2,help="reintentos por medidor")
+    parser.add_argument("--backoff",type=float,default=2,help="espera inicial entre reintentos en segundos")
+    parser.add_argument("--report",help="archivo JSON donde guardar el resumen")
+    parser.add_argument("--metrics",help="carpeta donde guardar las mediciones de cada medidor (JSON y Prometheus)")
+    parser.add_argument("--profile",action="store_true",help="perfilar la decodificación con cProfile (se guarda con --metrics)")
+    parser.add_argument("--snapshot",help="archivo CSV donde agregar un snapshot de las lecturas de cada medidor")
+    parser.add_argument("--snapshot-regs",nargs="*",type=int,metavar="REG",
+                        help="registros (Reg#) del snapshot, por defecto todas las mediciones de la tabla de registros")
+    parser.add_argument("--cache-dir",help="carpeta de la caché de la tabla de registros y de los formatos de log")
+    args = parser.parse_args(argv)
+    if args.cache_dir:
+        configurar_cache(args.cache_dir)
+
+    reads = [(int(start),int(count),format) for start,count,format in args.read]
+    for _,_,format in reads:
+        if format not in DATA_FORMATS:
+            parser.error(f"formato {format} no válido, opciones: {', '.join(DATA_FORMATS)}")
+    medidores = []
+    if args.config:
+        with open(args.config,encoding="utf-8") as f:
+            for cfg in json.load(f):
+                medidores.append({"host":cfg["host"],"port":cfg.get("port",502),"unit":cfg.get("unit",1),
+                                  "logs":cfg.get("logs",args.logs),"read":cfg.get("read",reads)})
+    for texto in args.meter:
+        medidores.append(dict(parse_meter(texto),logs=args.logs,read=reads))
+    if not medidores:
+        parser.error("indicar al menos un medidor con --meter o --config")
+    if args.profile and min(args.workers,len(medidores)) > 1:
+        parser.error("--profile perfila un medidor a la vez, utilizar --workers 1")
+
+    plan = None
+    if args.snapshot:
+        try:
+            plan = SnapshotPlan(variables_snapshot(args.snapshot_regs))
+        except Shark270Error as e:
+            parser.error(str(e))
+    with ThreadPoolExecutor(max_workers=max(args.workers,1)) as pool:
+        futuros = [pool.submit(recolectar_medidor,cfg,args,plan) for cfg in medidores]
+        for futuro in as_completed(futuros):
+            r = futuro.result()
+            print(f"[{r['status']}] {r['host']}:{r['port']}/{r['unit']} {r['error'] or ''}",flush=True)
+    # Resumen en el mismo orden que la configuración
+    resultados = [f.result() for f in futuros]
+
+    imprimir_resumen(resultados)
+    if plan is not None:
+        guardar_snapshots(args.snapshot,plan,[(f"{r['host']}:{r['port']}/{r['unit']}",r["SN"],r["snapshot"]["time"],
+                                               r["snapshot"]["values"]) for r in resultados if r["snapshot"] is not None])
+    if args.report:
+        with open(args.report,"w",encoding="utf-8") as f:
+            json.dump(resultados,f,indent=1)
+    return 0 if all(r["status"] == "ok" for r in resultados) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
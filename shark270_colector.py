@@ -0,0 +1,462 @@
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import signal
+import datetime
+import itertools
+import threading
+import argparse
+from shark270_core import Shark270, EsperaVentana, LOGS, DATA_FORMATS, TRANSFER_MODES, configurar_cache
+from shark270_export import EXPORT_FORMATS
+from shark270_polling import PollingEngine, ScanGroup
+from shark270_recorder import TimeSeriesRecorder
+from shark270_cli import parse_meter
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  SHARK270 - Recolección programada
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Servicio de recolección sin operador: ejecuta periódicamente las tareas de cada medidor con la misma lógica que la interfaz
+# gráfica (shark270_core.py y shark270_polling.py). Tipos de tarea, en orden de prioridad:
+#   - poll: lectura de grupos de registros cada "interval" segundos, registrada con TimeSeriesRecorder en {recorded}/{SN}.
+#   - logs: recuperación incremental de Históricos cada "interval" segundos (sólo los records nuevos).
+#   - full: recuperación completa de Históricos una vez al día a la hora "at" (HH:MM, hora local), en un archivo nuevo
+#       {SN}_{log}_{AAAAMMDDhhmm} para no reemplazar el archivo de las recuperaciones incrementales (los records que ya rotaron
+#       fuera del log del medidor sólo están en ese archivo). Las recuperaciones incrementales siguientes continúan el archivo
+#       nuevo; shark270_consultas.py une todos los archivos del medidor y log sin repetir records. Se conservan los últimos
+#       --full-keep archivos de recuperaciones completas, los anteriores se eliminan al terminar una recuperación completa
+#       (indexarlos antes con shark270_consultas.py para conservar en el archivo los records que ya rotaron fuera del log).
+# Planificación:
+#   - Las tareas se ordenan por vencimiento (heap). Entre las tareas vencidas se ejecuta primero la de mayor prioridad.
+#   - Cada medidor (host:port) ejecuta una sola tarea a la vez (una sesión, el bloqueo 0xC34B se toma sólo dentro de la tarea),
+#       aunque aparezca en varias entradas de la configuración, y se atienden hasta "workers" medidores en paralelo. Si otro
+#       cliente tiene la sesión del medidor la tarea falla y se reintenta.
+#   - Contrapresión: cada tarea tiene una sola ejecución pendiente; las ejecuciones atrasadas no se acumulan, se omiten y se
+#       cuentan. Una tarea no ocupa al medidor más de CARGA_MAX de su tiempo: si un medidor responde lento, el intervalo de la
+#       tarea se alarga (siguiente >= inicio+duración/CARGA_MAX). Las tareas fallidas se reintentan con espera creciente.
+# Estado: la planificación de cada tarea se guarda en {out}/collector_state.json después de cada ejecución. El avance de los
+# logs ya se guarda por medidor y log en retrieval_state.json, por lo que al reiniciar el servicio no se vuelven a descargar los
+# records ya exportados; una recuperación completa interrumpida se continúa de forma incremental.
+# Uso:
+#   python shark270_colector.py --config colector.json [--workers 8] [--out ExportedLogs]
+# Archivo de configuración (lista JSON), las tareas omitidas no se ejecutan:
+#   [{"host": "192.168.0.90", "port": 502, "unit": 1,
+#     "poll": {"interval": 60, "read": [[1000, 20, "FLOAT"]]},
+#     "logs": {"interval": 3600, "logs": ["Historic 1"]},
+#     "full": {"at": "02:00", "logs": ["Historic 1", "Historic 2"]}}]
+
+PRIORIDADES = {"poll":0,"logs":1,"full":2}
+CARGA_MAX = 0.5     # Fracción máxima del tiempo de un medidor ocupada por una tarea periódica
+BACKOFF_MAX = 600   # Espera máxima entre reintentos de una tarea fallida en segundos
+STATE_NAME = "collector_state.json"
+FULL_RE = r"_\d{12}(?:_\d+)?\.(?:csv|parquet)"  # Sufijo de los archivos de recuperaciones completas ({SN}_{log}_AAAAMMDDhhmm)
+
+# proxima_hora
+# Retorna el siguiente instante (epoch) posterior a despues con la hora local indicada.
+# Parámetros:
+# hora - "HH:MM"
+# despues - epoch en segundos
+def proxima_hora(hora,despues):
+    h,m = (int(x) for x in hora.split(":"))
+    proxima = datetime.datetime.fromtimestamp(despues).replace(hour=h,minute=m,second=0,microsecond=0)
+    if proxima.timestamp() <= despues:
+        proxima += datetime.timedelta(days=1)
+    return proxima.timestamp()
+
+# depurar_completas
+# Elimina los archivos de recuperaciones completas de un medidor y log, excepto los últimos conservar.
+# Parámetros:
+# carpeta - carpeta de exportación
+# nombre - "{SN}_{log}"
+# conservar - cantidad de recuperaciones completas a conservar (0: todas)
+# Retorna la lista de archivos eliminados.
+def depurar_completas(carpeta,nombre,conservar):
+    if conservar <= 0:
+        return []
+    patron = re.compile(re.escape(nombre)+FULL_RE)
+    archivos = sorted(f for f in os.listdir(carpeta) if patron.fullmatch(f))
+    fechas = sorted({f[len(nombre)+1:len(nombre)+13] for f in archivos})
+    eliminados = []
+    if len(fechas) <= conservar:
+        return eliminados
+    for archivo in archivos:
+        if archivo[len(nombre)+1:len(nombre)+13] < fechas[-conservar]:
+            try:
+                os.remove(os.path.join(carpeta,archivo))
+                eliminados.append(archivo)
+            except OSError:
+                pass    # Abierto en otro programa, se elimina en la siguiente recuperación completa
+    return eliminados
+
+# Medidor
+# Conexión y polling de un medidor, compartidos por sus tareas (sólo una tarea del medidor se ejecuta a la vez).
+# Parámetros:
+# cfg - configuración del medidor (host, port, unit)
+# args - argumentos de la línea de comandos
+class Medidor:
+    def __init__(self,cfg,args):
+        self.host = cfg["host"]
+        self.port = cfg["port"]
+        self.unit = cfg["unit"]
+        self.clave = f"{self.host}:{self.port}/{self.unit}"
+        self.args = args
+        self.meter = None
+        self.engines = {}   # PollingEngine por tarea, conservan la última lectura
+        self.recorder = None
+
+    # sesion
+    # Retorna el medidor conectado, conectando si es necesario.
+    def sesion(self):
+        if self.meter is None:
+            args = self.args
+            meter = Shark270(self.host,self.port,self.unit,timeout=args.request_timeout,retries=args.request_retries,
+                             espera=EsperaVentana(args.window_delay,2,args.window_delay_max,args.window_timeout))
+            meter.conectar()
+            self.meter = meter
+        return self.meter
+
+    # leer
+    # Lee una vez los grupos de una tarea poll y registra los valores.
+    def leer(self,tarea):
+        meter = self.sesion()
+        if self.recorder is None:
+            self.recorder = TimeSeriesRecorder(os.path.join(self.args.recorded,meter.meter_SN.strip()))
+        engine = self.engines.get(tarea.clave)
+        if engine is None:
+            engine = self.engines[tarea.clave] = PollingEngine(meter,tarea.grupos,lambda i,cambios: None,recorder=self.recorder)
+        engine.meter = meter
+        engine.leer_grupos(range(len(tarea.grupos)))
+
+    def cerrar(self):
+        if self.meter is not None:
+            self.meter.cerrar()
+            self.meter = None
+
+# Tarea
+# Parámetros:
+# medidor - Medidor de la tarea
+# tipo - tipo de tarea (PRIORIDADES)
+# intervalo - segundos entre ejecuciones (poll, logs)
+# hora - hora diaria "HH:MM" (full)
+# logs - Históricos a recuperar (logs, full)
+# read - lecturas [[registro, cantidad, formato], ...] (poll)
+class Tarea:
+    def __init__(self,medidor,tipo,intervalo=None,hora=None,logs=(),read=()):
+        self.medidor = medidor
+        self.tipo = tipo
+        self.prioridad = PRIORIDADES[tipo]
+        self.intervalo = intervalo
+        self.hora = hora
+        self.logs = list(logs)
+        self.grupos = [ScanGroup(start,count,format,intervalo) for start,count,format in read]
+        self.clave = f"{medidor.clave}/{tipo}"
+        self.siguiente = None   # Vencimiento (epoch)
+        self.ultima = None      # Fin de la última ejecución correcta (epoch)
+        self.errores = 0        # Ejecuciones fallidas consecutivas
+        self.iniciada = False   # Recuperación completa en curso (si se interrumpe, se continúa de forma incremental)
+        self.ejecuciones = 0
+        self.omitidas = 0       # Ejecuciones omitidas por atraso
+        self.duracion = 0.0
+        self.error = None
+        self.detalle = ""
+
+    CAMPOS = ["siguiente","ultima","errores","iniciada","ejecuciones","omitidas","duracion","error"]
+
+    def a_dict(self):
+        return {campo:getattr(self,campo) for campo in self.CAMPOS}
+
+    def restaurar(self,datos):
+        for campo in self.CAMPOS:
+            if campo in datos:
+                setattr(self,campo,datos[campo])
+
+    # programar
+    # Calcula el siguiente vencimiento después de una ejecución.
+    # Parámetros:
+    # inicio, fin - inicio y fin de la ejecución (epoch)
+    # exito - la ejecución terminó correctamente
+    # backoff - espera inicial entre reintentos
+    def programar(self,inicio,fin,exito,backoff):
+        if not exito:
+            self.siguiente = fin+min(backoff*2**(self.errores-1),BACKOFF_MAX)
+        elif self.hora is not None:
+            self.siguiente = proxima_hora(self.hora,fin)
+        else:
+            siguiente = (self.siguiente or inicio)+self.intervalo
+            if siguiente <= fin:
+                # Mantener la cadencia omitiendo las ejecuciones que vencieron durante esta
+                atrasadas = int((fin-siguiente)//self.intervalo)+1
+                self.omitidas += atrasadas
+                siguiente += atrasadas*self.intervalo
+            self.siguiente = max(siguiente,inicio+self.duracion/CARGA_MAX)
+
+# Colector
+# Planificador de las tareas de todos los medidores.
+# Parámetros:
+# medidores - configuración de los medidores (ver archivo de configuración)
+# args - argumentos de la línea de comandos
+# on_status - función(texto) para los mensajes de cada ejecución
+class Colector:
+    def __init__(self,medidores,args,on_status=print):
+        self.args = args
+        self.on_status = on_status
+        self.tareas = []
+        self.medidores = {}     # (host, port) -> Medidor: las entradas del mismo medidor comparten la sesión
+        for cfg in medidores:
+            medidor = self.medidores.get((cfg["host"],cfg["port"]))
+            if medidor is None:
+                medidor = self.medidores[(cfg["host"],cfg["port"])] = Medidor(cfg,args)
+            if "poll" in cfg:
+                self._agregar(Tarea(medidor,"poll",intervalo=cfg["poll"]["interval"],read=cfg["poll"]["read"]))
+            if "logs" in cfg:
+                self._agregar(Tarea(medidor,"logs",intervalo=cfg["logs"]["interval"],logs=cfg["logs"]["logs"]))
+            if "full" in cfg:
+                self._agregar(Tarea(medidor,"full",hora=cfg["full"]["at"],logs=cfg["full"]["logs"]))
+        self.state_file = os.path.join(args.out,STATE_NAME)
+        self.heap = []          # (vencimiento, prioridad, orden, tarea) de las tareas que no están en ejecución
+        self.orden = itertools.count()
+        self.bloqueadas = []    # Tareas vencidas que esperan a su medidor o a un worker libre
+        self.en_curso = {}      # Medidor -> (tarea, hilo)
+        self.lock = threading.Lock()
+        self.cambio = threading.Event()     # Una tarea terminó o se solicitó detener el servicio
+        self.detener = threading.Event()
+
+    # _agregar
+    # Agrega una tarea; las tareas del mismo tipo de otra entrada del mismo medidor se identifican con /2, /3, ...
+    def _agregar(self,tarea):
+        claves = {t.clave for t in self.tareas}
+        clave,n = tarea.clave,1
+        while tarea.clave in claves:
+            n += 1
+            tarea.clave = f"{clave}/{n}"
+        self.tareas.append(tarea)
+
+    # cargar_estado
+    # Restaura la planificación guardada. Las tareas nuevas vencen de inmediato (full: a su próxima hora).
+    def cargar_estado(self):
+        try:
+            with open(self.state_file,encoding="utf-8") as f:
+                estados = json.load(f)
+        except (OSError,ValueError):
+            estados = {}
+        ahora = time.time()
+        for tarea in self.tareas:
+            tarea.restaurar(estados.get(tarea.clave,{}))
+            if tarea.siguiente is None:
+                tarea.siguiente = proxima_hora(tarea.hora,ahora) if tarea.hora is not None else ahora
+            if tarea.iniciada:
+                tarea.siguiente = ahora
+            heapq.heappush(self.heap,(tarea.siguiente,tarea.prioridad,next(self.orden),tarea))
+
+    # guardar_estado
+    # El archivo se reemplaza de forma atómica para que una interrupción no lo deje corrupto.
+    def guardar_estado(self):
+        with self.lock:
+            estados = {tarea.clave:tarea.a_dict() for tarea in self.tareas}
+            os.makedirs(os.path.dirname(self.state_file) or ".",exist_ok=True)
+            tmp = f"{self.state_file}.tmp"
+            with open(tmp,"w",encoding="utf-8") as f:
+                json.dump(estados,f,indent=1)
+            os.replace(tmp,self.state_file)
+
+    # ejecutar
+    # Ejecuta las tareas hasta que se solicite detener el servicio.
+    # Parámetros:
+    # duracion - segundos de ejecución (0: sin límite)
+    def ejecutar(self,duracion=0):
+        self.cargar_estado()
+        fin = time.monotonic()+duracion if duracion else None
+        try:
+            while not self.detener.is_set():
+                self.cambio.clear()
+                self._despachar()
+                with self.lock:
+                    espera = self.heap[0][0]-time.time() if self.heap else 60
+                if fin is not None:
+                    if time.monotonic() >= fin:
+                        break
+                    espera = min(espera,fin-time.monotonic())
+                self.cambio.wait(min(max(espera,0.01),60))
+        finally:
+            self.parar()
+
+    # parar
+    # Cancela las tareas en curso (las recuperaciones se detienen al terminar el lote actual) y cierra las conexiones.
+    def parar(self):
+        self.detener.set()
+        self.cambio.set()
+        with self.lock:
+            hilos = list(self.en_curso.values())
+        for tarea,hilo in hilos:
+            if tarea.medidor.meter is not None:
+                tarea.medidor.meter.cancel.set()
+        for tarea,hilo in hilos:
+            hilo.join()
+        for medidor in self.medidores.values():
+            if medidor.recorder is not None:
+                medidor.recorder.flush()
+            medidor.cerrar()
+        self.guardar_estado()
+
+    def _despachar(self):
+        with self.lock:
+            ahora = time.time()
+            vencidas = self.bloqueadas
+            while self.heap and self.heap[0][0] <= ahora:
+                vencidas.append(heapq.heappop(self.heap)[3])
+            vencidas.sort(key=lambda tarea: (tarea.prioridad,tarea.siguiente))
+            self.bloqueadas = []
+            for tarea in vencidas:
+                if tarea.medidor in self.en_curso or len(self.en_curso) >= self.args.workers or self.detener.is_set():
+                    self.bloqueadas.append(tarea)
+                    continue
+                hilo = threading.Thread(target=self._trabajar,args=(tarea,),daemon=True)
+                self.en_curso[tarea.medidor] = (tarea,hilo)
+                hilo.start()
+
+    def _trabajar(self,tarea):
+        inicio = time.time()
+        exito = False
+        try:
+            completa = self._ejecutar_tarea(tarea)
+            exito = True
+            tarea.errores = 0
+            tarea.error = None
+        except Exception as e:
+            completa = True
+            tarea.errores += 1
+            tarea.error = str(e) or type(e).__name__
+            tarea.medidor.cerrar()  # Se vuelve a conectar en la siguiente tarea del medidor
+        fin = time.time()
+        tarea.duracion = fin-inicio
+        tarea.ejecuciones += 1
+        with self.lock:
+            if completa:
+                # Una tarea cancelada al detener el servicio conserva su vencimiento y se ejecuta al reiniciar
+                if exito:
+                    tarea.ultima = fin
+                tarea.programar(inicio,fin,exito,self.args.backoff)
+            heapq.heappush(self.heap,(tarea.siguiente,tarea.prioridad,next(self.orden),tarea))
+            del self.en_curso[tarea.medidor]
+        self.guardar_estado()
+        estado = "ok" if exito and completa else "cancel" if exito else "error"
+        proxima = datetime.datetime.fromtimestamp(tarea.siguiente).strftime("%d/%m/%Y %H:%M:%S")
+        self.on_status(f"[{estado}] {tarea.clave} {tarea.duracion:.1f} s {tarea.error or tarea.detalle} (siguiente: {proxima})")
+        self.cambio.set()
+
+    # _ejecutar_tarea
+    # Retorna False si la tarea se canceló al detener el servicio.
+    def _ejecutar_tarea(self,tarea):
+        medidor = tarea.medidor
+        if tarea.tipo == "poll":
+            medidor.leer(tarea)
+            tarea.detalle = f"{sum(g.count for g in tarea.grupos)} registros"
+            return True
+        meter = medidor.sesion()
+        meter.cancel.clear()
+        incremental = tarea.tipo == "logs" or tarea.iniciada
+        sufijo = ""
+        if tarea.tipo == "full":
+            tarea.iniciada = True
+            sufijo = datetime.datetime.now().strftime("_%Y%m%d%H%M")
+            self.guardar_estado()
+        # Tiempo máximo por tarea: al vencer se cancela la recuperación en curso
+        timer = threading.Timer(self.args.job_timeout,meter.cancel.set)
+        timer.start()
+        try:
+            resultados = meter.retlogs(tarea.logs,self.args.format,incremental,self.args.out,transfer_mode=self.args.transfer,
+                                       sufijo=sufijo)
+        finally:
+            timer.cancel()
+            timer.join()
+            # La recuperación terminó: la cancelación no debe afectar a las siguientes tareas del medidor (p. ej. la espera
+            # de reconexión de las tareas poll)
+            cancelada = meter.cancel.is_set()
+            meter.cancel.clear()
+        tarea.detalle = ", ".join(f"{log}: {r['records']}/{r['total']}" for log,r in resultados.items())
+        if cancelada:
+            if self.detener.is_set():
+                return False
+            raise TimeoutError(f"Tiempo máximo de {self.args.job_timeout} s agotado ({tarea.detalle})")
+        tarea.iniciada = False
+        if tarea.tipo == "full":
+            for log in tarea.logs:
+                eliminados = depurar_completas(self.args.out,f"{meter.meter_SN.strip()}_{log}",self.args.full_keep)
+                if eliminados:
+                    tarea.detalle += f", {log}: {len(eliminados)} archivos anteriores eliminados"
+        return True
+
+# leer_config
+# Lee el archivo de configuración y valida los logs y formatos.
+def leer_config(ruta,parser):
+    with open(ruta,encoding="utf-8") as f:
+        medidores = json.load(f)
+    for cfg in medidores:
+        cfg.setdefault("port",502)
+        cfg.setdefault("unit",1)
+        for tipo in ["logs","full"]:
+            for log in cfg.get(tipo,{}).get("logs",[]):
+                if log not in LOGS:
+                    parser.error(f"log {log} no válido, opciones: {', '.join(LOGS)}")
+        for _,_,format in cfg.get("poll",{}).get("read",[]):
+            if format not in DATA_FORMATS:
+                parser.error(f"formato {format} no válido, opciones: {', '.join(DATA_FORMATS)}")
+    return medidores
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recolección programada de medidores Shark270 (servicio sin operador).")
+    parser.add_argument("--config",help="archivo JSON con los medidores y sus tareas")
+    parser.add_argument("--meter",action="append",default=[],help="medidor host[:port][/unit] con las tareas de los argumentos")
+    parser.add_argument("--logs",nargs="*",default=["Historic 1"],choices=list(LOGS),help="logs de las tareas de --meter")
+    parser.add_argument("--logs-interval",type=float,default=3600,help="intervalo de la recuperación incremental (--meter)")
+    parser.add_argument("--full-at",help="hora diaria HH:MM de la recuperación completa (--meter)")
+    parser.add_argument("--format",default="CSV",choices=EXPORT_FORMATS,help="formato de exportación")
+    parser.add_argument("--transfer",default="Standard",choices=TRANSFER_MODES,help="modo de transferencia de los logs")
+    parser.add_argument("--out",default="ExportedLogs",help="carpeta de exportación y del estado del servicio")
+    parser.add_argument("--full-keep",type=int,default=7,
+                        help="recuperaciones completas conservadas por medidor y log (0: todas)")
+    parser.add_argument("--recorded",default="RecordedData",help="carpeta de los valores leídos por las tareas poll")
+    parser.add_argument("--workers",type=int,default=4,help="medidores atendidos a la vez")
+    parser.add_argument("--job-timeout",type=float,default=1800,help="tiempo máximo de una tarea en segundos")
+    parser.add_argument("--request-timeout",type=float,default=3,help="tiempo máximo de cada solicitud Modbus en segundos")
+    parser.add_argument("--request-retries",type=int,default=2,
+                        help="reintentos de una solicitud Modbus si la conexión se pierde (con reconexión)")
+    parser.add_argument("--window-delay",type=float,default=0.001,help="espera inicial entre consultas del estado de la ventana")
+    parser.add_argument("--window-delay-max",type=float,default=0.05,help="espera máxima entre consultas del estado de la ventana")
+    parser.add_argument("--window-timeout",type=float,default=10,help="tiempo máximo de preparación de una ventana en segundos")
+    parser.add_argument("--backoff",type=float,default=5,help="espera inicial entre reintentos de una tarea fallida en segundos")
+    parser.add_argument("--duration",type=float,default=0,help="detener el servicio después de estos segundos (0: sin límite)")
+    parser.add_argument("--cache-dir",help="carpeta de la caché de la tabla de registros y de los formatos de log")
+    args = parser.parse_args(argv)
+    args.workers = max(args.workers,1)
+    if args.cache_dir:
+        configurar_cache(args.cache_dir)
+
+    medidores = leer_config(args.config,parser) if args.config else []
+    for texto in args.meter:
+        cfg = dict(parse_meter(texto),logs={"interval":args.logs_interval,"logs":args.logs})
+        if args.full_at:
+            cfg["full"] = {"at":args.full_at,"logs":args.logs}
+        medidores.append(cfg)
+    if not medidores:
+        parser.error("indicar al menos un medidor con --meter o --config")
+    units = {}
+    for cfg in medidores:
+        if units.setdefault((cfg["host"],cfg["port"]),cfg["unit"]) != cfg["unit"]:
+            parser.error(f"el medidor {cfg['host']}:{cfg['port']} aparece con distintos unit")
+
+    colector = Colector(medidores,args,on_status=lambda texto: print(texto,flush=True))
+    # SIGTERM (servicio detenido) y Ctrl+C detienen el servicio guardando el estado
+    def terminar(*_):
+        colector.detener.set()
+        colector.cambio.set()
+    signal.signal(signal.SIGTERM,terminar)
+    signal.signal(signal.SIGINT,terminar)
+    colector.ejecutar(args.duration)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
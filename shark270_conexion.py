@@ -0,0 +1,216 @@
+import time
+import struct
+import threading
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.register_read_message import ReadHoldingRegistersResponse
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Conexiones Modbus TCP administradas
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Capa de conexión con los medidores:
+#   - Un cliente por (host, puerto, esclavo), compartido por todos los objetos Shark270 del mismo medidor (ConnectionPool).
+#   - Si la conexión se pierde (sin respuesta, socket cerrado) se vuelve a conectar con espera creciente. Las solicitudes
+#       idempotentes (lecturas y escrituras de valores absolutos) se reintentan sin que el llamador lo note. La lectura de los
+#       datos de la ventana de un log NO es idempotente (el medidor avanza a la siguiente ventana al leerla), por lo que no se
+#       reintenta: se reporta con ConexionPerdida y la recuperación vuelve a posicionar la ventana.
+#   - Un hilo de mantenimiento lee un registro de los clientes inactivos para mantener la sesión TCP abierta.
+#   - Contadores de solicitudes, errores, reintentos, reconexiones y latencia por cliente.
+# El cliente de pymodbus se crea sin reintentos propios (retries=0) para que esta capa decida qué solicitudes se repiten.
+# Las respuestas de lectura (función 3) se interpretan con RespuestaRegistros: los datos se conservan como una vista de los bytes
+# recibidos, sin convertir cada registro en un entero de Python.
+
+KEEPALIVE_INTERVAL = 30     # Segundos de inactividad antes de enviar una lectura de mantenimiento
+BUSY_EXCEPTION_CODES = (5,6)    # Acknowledge y Slave Device Busy: el medidor no pudo atender la solicitud en ese momento
+
+# RespuestaRegistros
+# Respuesta de read_holding_registers que conserva los datos como bytes big-endian (raw, una memoryview de la trama recibida).
+# La lista registers se genera sólo si se utiliza, con una sola llamada a struct en lugar de un unpack por registro.
+class RespuestaRegistros(ReadHoldingRegistersResponse):
+    def __init__(self,values=None,**kwargs):
+        self.raw = memoryview(b"")
+        self._registers = None
+        super().__init__(values,**kwargs)
+
+    @property
+    def registers(self):
+        if self._registers is None:
+            self._registers = list(struct.unpack(f">{len(self.raw)//2}H",self.raw))
+        return self._registers
+
+    @registers.setter
+    def registers(self,values):
+        self._registers = values
+
+    def decode(self,data):
+        self.raw = memoryview(data)[1:1+data[0]]
+        self._registers = None
+
+    def encode(self):
+        return bytes([len(self.raw)])+self.raw if self._registers is None else super().encode()
+
+# ConexionPerdida
+# La solicitud no obtuvo respuesta o la conexión se cerró, y no pudo (o no debía) reintentarse.
+class ConexionPerdida(Exception):
+    pass
+
+# ManagedClient
+# Cliente Modbus TCP con reconexión, reintentos y contadores.
+# Parámetros:
+# host, port, unit - medidor
+# timeout - tiempo máximo de espera de cada solicitud en segundos
+# retries - reintentos de una solicitud idempotente después de un error transitorio
+# backoff - espera inicial antes de reconectar en segundos (se duplica en cada intento, máximo backoff_max)
+class ManagedClient:
+    def __init__(self,host,port=502,unit=1,timeout=3,retries=2,backoff=0.5,backoff_max=10):
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.client = ModbusTcpClient(host,port=port,timeout=timeout,retries=0)
+        self.client.register(RespuestaRegistros)
+        self.lock = threading.RLock()
+        self.referencias = 0
+        self.ultimo_uso = time.monotonic()
+        self.stats = {"requests":0,"errors":0,"retries":0,"reconnects":0,"keepalives":0,
+                      "latency_total":0.0,"latency_max":0.0,"latency_last":0.0}
+
+    # conectar
+    # Abre la conexión TCP. Retorna False si no se pudo conectar.
+    def conectar(self):
+        with self.lock:
+            return self.client.connect()
+
+    def cerrar(self):
+        with self.lock:
+            self.client.close()
+
+    # estadisticas
+    # Retorna una copia de los contadores, con la latencia media en ms.
+    def estadisticas(self):
+        with self.lock:
+            stats = dict(self.stats)
+        exitosas = stats["requests"]-stats["errors"]
+        stats["latency_avg_ms"] = stats["latency_total"]/max(exitosas,1)*1000
+        stats["latency_max_ms"] = stats["latency_max"]*1000
+        stats["latency_last_ms"] = stats["latency_last"]*1000
+        for campo in ("latency_total","latency_max","latency_last"):
+            del stats[campo]
+        return stats
+
+    def _reconectar(self,intento,cancel=None):
+        self.client.close()
+        espera = min(self.backoff*2**intento,self.backoff_max)
+        if cancel is not None and cancel.wait(espera):
+            raise ConexionPerdida("Operación cancelada durante la reconexión.")
+        elif cancel is None:
+            time.sleep(espera)
+        self.stats["reconnects"] += 1
+        self.client.connect()
+
+    # ejecutar
+    # Envía una solicitud y retorna la respuesta de pymodbus (las respuestas de error Modbus se retornan al llamador).
+    # Parámetros:
+    # metodo - método del cliente (read_holding_registers, write_register, write_registers)
+    # args - argumentos del método sin el número de esclavo
+    # idempotente - la solicitud puede repetirse sin efectos secundarios
+    # cancel - threading.Event que interrumpe la espera entre reconexiones
+    def ejecutar(self,metodo,*args,idempotente=True,cancel=None):
+        with self.lock:
+            intento = 0
+            while True:
+                self.stats["requests"] += 1
+                inicio = time.monotonic()
+                try:
+                    if not self.client.connected and not self.client.connect():
+                        raise ConnectionException(f"No se pudo conectar con {self.host}:{self.port}")
+                    response = getattr(self.client,metodo)(*args,self.unit)
+                    transitorio = isinstance(response,ModbusIOException) or \
+                        (isinstance(response,ExceptionResponse) and response.exception_code in BUSY_EXCEPTION_CODES)
+                except (ConnectionException,ModbusIOException,OSError) as e:
+                    response = e
+                    transitorio = True
+                latencia = time.monotonic()-inicio
+                self.ultimo_uso = time.monotonic()
+                if not transitorio:
+                    if response.isError():
+                        self.stats["errors"] += 1
+                    else:
+                        self.stats["latency_total"] += latencia
+                        self.stats["latency_max"] = max(self.stats["latency_max"],latencia)
+                        self.stats["latency_last"] = latencia
+                    return response
+
+                self.stats["errors"] += 1
+                if not idempotente or intento >= self.retries:
+                    # La siguiente solicitud se envía en una conexión nueva
+                    self.client.close()
+                    raise ConexionPerdida(f"{metodo} en {self.host}:{self.port}: {response}")
+                self._reconectar(intento,cancel)
+                self.stats["retries"] += 1
+                intento += 1
+
+    # mantener
+    # Lee un registro si el cliente está inactivo, para que el medidor o la red no cierren la sesión TCP. No espera si
+    # otro hilo está utilizando el cliente.
+    def mantener(self,intervalo=KEEPALIVE_INTERVAL):
+        if time.monotonic()-self.ultimo_uso < intervalo or not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.client.connected:
+                self.stats["keepalives"] += 1
+                self.ejecutar("read_holding_registers",0,1)
+        except ConexionPerdida:
+            pass # Se reconecta en la siguiente solicitud
+        finally:
+            self.lock.release()
+
+# ConnectionPool
+# Clientes compartidos por (host, puerto, esclavo). Cada obtener debe tener su liberar; el cliente se cierra cuando se libera
+# la última referencia.
+# Parámetros:
+# keepalive - segundos de inactividad antes de la lectura de mantenimiento (0 para desactivarla)
+class ConnectionPool:
+    def __init__(self,keepalive=KEEPALIVE_INTERVAL):
+        self.keepalive = keepalive
+        self.clientes = {}
+        self.lock = threading.Lock()
+        self.hilo = None
+
+    # obtener
+    # Retorna el cliente del medidor, creándolo si no existe.
+    # Parámetros:
+    # host, port, unit - medidor
+    # opciones - parámetros de ManagedClient (timeout, retries, backoff) si el cliente se crea
+    def obtener(self,host,port=502,unit=1,**opciones):
+        with self.lock:
+            clave = (host,port,unit)
+            cliente = self.clientes.get(clave)
+            if cliente is None:
+                cliente = self.clientes[clave] = ManagedClient(host,port,unit,**opciones)
+            cliente.referencias += 1
+            if self.keepalive and self.hilo is None:
+                self.hilo = threading.Thread(target=self._mantener,daemon=True)
+                self.hilo.start()
+            return cliente
+
+    def liberar(self,cliente):
+        with self.lock:
+            cliente.referencias -= 1
+            if cliente.referencias <= 0:
+                self.clientes.pop((cliente.host,cliente.port,cliente.unit),None)
+                cliente.cerrar()
+
+    def _mantener(self):
+        while True:
+            time.sleep(max(self.keepalive/3,1))
+            with self.lock:
+                clientes = list(self.clientes.values())
+            for cliente in clientes:
+                cliente.mantener(self.keepalive)
+
+pool = ConnectionPool()
@@ -0,0 +1,483 @@
+import os
+import io
+import re
+import json
+import time
+import calendar
+import argparse
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Consultas sobre los logs exportados
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Los archivos exportados ({SN}_{log}.csv / .parquet en "ExportedLogs") se indexan en un archivo columnar para consultarlos sin
+# abrirlos completos en Excel:
+#   - {carpeta}/Archive/{SN}/{log}/{AAAA-MM}_{n}.parquet: records de un mes, ordenados por "t" (timestamp en segundos epoch,
+#       int64) más las columnas exportadas (sin el texto del Timestamp), en row groups de ROW_GROUP records.
+#   - {carpeta}/Archive/{SN}/{log}/index.json: rango de tiempo, records y columnas de cada parte, y hasta dónde se indexó cada
+#       archivo exportado. Un CSV que creció (recuperación incremental) se indexa sólo desde el último byte indexado (si el
+#       encabezado y los últimos bytes indexados no cambiaron); un archivo reemplazado (recuperación completa) se vuelve a
+#       indexar desde el inicio. Si index.json falta, está dañado o es de una versión anterior, se reconstruye desde las partes
+#       existentes (nunca se eliminan records que sólo estén en el archivo).
+# El archivo es la unión de todos los archivos exportados del medidor y log ({SN}_{log}.csv, las copias _0, _1, ... y los
+# Parquet de recuperaciones incrementales), con un solo record por timestamp: los records nuevos cuyo timestamp ya está en el
+# archivo se descartan (se conserva el primero indexado). Para detectarlos se lee sólo la columna "t" de las partes del mismo
+# mes cuyo rango [t0, t1] del índice se superpone con los records nuevos, y de ellas sólo los row groups de ese rango, en
+# lugar de volver a leer todos los archivos exportados.
+# Una consulta lee sólo las partes cuyo rango se superpone con el rango pedido, y de ellas sólo las columnas seleccionadas y
+# los row groups del rango (estadísticas de "t"). El promedio, mínimo y máximo por intervalo se calculan con NumPy (reduceat)
+# sobre los records ordenados, sin recorrerlos en Python.
+# Requiere pandas y pyarrow (se importan al indexar o consultar).
+# Uso:
+#   python shark270_consultas.py index [--dir ExportedLogs]
+#   python shark270_consultas.py list [--dir ExportedLogs]
+#   python shark270_consultas.py query [--sn SN] [--log "Historic 1"] [--from "01/01/2024 00:00:00"] [--to ...]
+#                                      [--columns "Volts A-N" 1000 ...] [--every 15m] [--agg min max avg] [--out archivo.csv]
+
+ARCHIVE_DIR = "Archive"
+INDEX_VERSION = 2
+ROW_GROUP = 8192
+MAX_PARTES = 8  # Partes de un mismo mes antes de unirlas en una sola
+AGREGADOS = ["min","max","avg","count"]
+EXPORT_RE = re.compile(r"^(?P<sn>.+)_(?P<log>Historic \d)(?:_\d+)?\.(?P<ext>csv|parquet)$")
+PARTE_RE = re.compile(r"^(?P<mes>\d{4}-\d{2})_(?P<n>\d+)\.parquet$")
+FORMATO_TSTAMP = "%d/%m/%Y %H:%M:%S"
+archive_lock = threading.Lock()
+
+# ConsultaError
+# La consulta no puede realizarse (columna inexistente, fecha inválida, archivo sin indexar, etc.).
+class ConsultaError(Exception):
+    pass
+
+# parse_tiempo
+# Convierte una fecha "dd/mm/aaaa hh:mm:ss" (formato de exportación) o "aaaa-mm-dd[ hh:mm[:ss]]" en segundos epoch, con la
+# misma convención que los timestamps del medidor (hora local del medidor sin zona horaria).
+def parse_tiempo(texto):
+    if texto is None or isinstance(texto,(int,float)):
+        return texto
+    for formato in (FORMATO_TSTAMP,"%d/%m/%Y %H:%M","%d/%m/%Y","%Y-%m-%d %H:%M:%S","%Y-%m-%dT%H:%M:%S","%Y-%m-%d %H:%M",
+                    "%Y-%m-%d"):
+        try:
+            return calendar.timegm(datetime.strptime(texto.strip(),formato).timetuple())
+        except ValueError:
+            pass
+    raise ConsultaError(f"Fecha no reconocida: {texto}")
+
+# parse_intervalo
+# Convierte un intervalo "900", "30s", "15m", "1h" o "1d" en segundos.
+def parse_intervalo(texto):
+    if texto is None or isinstance(texto,(int,float)):
+        return texto
+    m = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*",texto)
+    if m is None:
+        raise ConsultaError(f"Intervalo no reconocido: {texto}")
+    return int(m.group(1))*{"":1,"s":1,"m":60,"h":3600,"d":86400}[m.group(2)]
+
+def _leer_indice(ruta):
+    try:
+        with open(ruta,encoding="utf-8") as f:
+            indice = json.load(f)
+        if indice.get("version") == INDEX_VERSION:
+            return indice
+    except (OSError,ValueError):
+        pass
+    return {"version":INDEX_VERSION,"siguiente":0,"fuentes":{},"partes":[]}
+
+def _guardar_indice(ruta,indice):
+    tmp = f"{ruta}.tmp"
+    with open(tmp,"w",encoding="utf-8") as f:
+        json.dump(indice,f,indent=1)
+    os.replace(tmp,ruta)
+
+# _a_epoch
+# Convierte la columna Timestamp exportada ("dd/mm/20yy hh:mm:ss", 'NaT') en segundos epoch int64 (NaT: -1 << 63).
+def _a_epoch(pd,timestamps):
+    fechas = pd.to_datetime(timestamps,format=FORMATO_TSTAMP,errors="coerce")
+    return fechas.to_numpy(dtype="datetime64[ns]").astype("datetime64[s]").astype(np.int64)
+
+# formatear_tiempo
+# Segundos epoch como texto "dd/mm/aaaa hh:mm:ss".
+def formatear_tiempo(t):
+    return (datetime(1970,1,1)+timedelta(seconds=int(t))).strftime(FORMATO_TSTAMP)
+
+# LogArchive
+# Archivo columnar de un medidor y log.
+# Parámetros:
+# carpeta - carpeta del archivo ({exportados}/Archive/{SN}/{log})
+class LogArchive:
+    def __init__(self,carpeta):
+        self.carpeta = carpeta
+        self.ruta_indice = os.path.join(carpeta,"index.json")
+        self.indice = _leer_indice(self.ruta_indice)
+        if not self.indice["partes"] and os.path.isdir(carpeta):
+            self._reconstruir_indice()
+
+    # _reconstruir_indice
+    # Genera el índice desde las partes existentes cuando index.json no existe, está dañado o es de una versión anterior. Las
+    # partes no se descartan: pueden contener records que ya no están en ningún archivo exportado. Los timestamps repetidos
+    # entre partes (en la versión anterior cada archivo exportado tenía sus propias partes) se conservan sólo en la primera
+    # parte; una parte con timestamps repetidos se reemplaza por una nueva con el resto de sus records. Los archivos exportados
+    # se vuelven a indexar (sus records ya presentes se omiten).
+    def _reconstruir_indice(self):
+        import pyarrow.parquet
+        partes = sorted((int(m.group("n")),m.group("mes"),m.group(0)) for m in map(PARTE_RE.match,os.listdir(self.carpeta)) if m)
+        if not partes:
+            return
+        self.indice["siguiente"] = partes[-1][0]+1
+        for _,mes,archivo in partes:
+            ruta = os.path.join(self.carpeta,archivo)
+            try:
+                tabla = pyarrow.parquet.read_table(ruta).to_pandas()
+            except (OSError,ValueError):
+                continue # Parte incompleta (escritura interrumpida): se deja en la carpeta sin indexar
+            t = tabla["t"].to_numpy()
+            nuevos = self._sin_repetidos(mes,tabla[np.r_[True,t[1:] != t[:-1]]]) if len(tabla) else tabla
+            if len(nuevos) == len(tabla):
+                if len(tabla):
+                    self.indice["partes"].append({"archivo":archivo,"fuente":None,"mes":mes,"t0":int(t[0]),"t1":int(t[-1]),
+                                                  "filas":len(tabla),"columnas":[c for c in tabla.columns if c != "t"]})
+                continue
+            if len(nuevos):
+                self._escribir_parte(None,mes,nuevos)
+            os.remove(ruta)  # Sus records están en la parte nueva o en partes anteriores
+        _guardar_indice(self.ruta_indice,self.indice)
+
+    # columnas
+    # Columnas disponibles (en el orden de exportación, sin repetir) de todas las partes.
+    def columnas(self):
+        vistas = {}
+        for parte in self.indice["partes"]:
+            vistas.update(dict.fromkeys(parte["columnas"]))
+        return list(vistas)
+
+    # rango
+    # Retorna (primer, último timestamp epoch, records), o None si el archivo está vacío.
+    def rango(self):
+        partes = self.indice["partes"]
+        if not partes:
+            return None
+        return min(p["t0"] for p in partes),max(p["t1"] for p in partes),sum(p["filas"] for p in partes)
+
+    # indexar
+    # Agrega al archivo los records nuevos de un archivo exportado (los timestamps que ya están en el archivo se omiten).
+    # Parámetros:
+    # ruta - archivo exportado (.csv o .parquet)
+    # Retorna la cantidad de records agregados.
+    def indexar(self,ruta):
+        import pandas as pd
+        nombre = os.path.basename(ruta)
+        stat = os.stat(ruta)
+        fuente = self.indice["fuentes"].get(nombre)
+        if fuente is not None and fuente["size"] == stat.st_size and fuente["mtime_ns"] == stat.st_mtime_ns:
+            return 0
+
+        if ruta.endswith(".csv"):
+            with open(ruta,"rb") as f:
+                encabezado = f.readline()
+                desde = len(encabezado)
+                if fuente is not None and fuente.get("encabezado") == encabezado.decode("utf-8") and \
+                        fuente["offset"] <= stat.st_size:
+                    f.seek(fuente["offset"]-len(fuente["cola"]))
+                    if f.read(len(fuente["cola"])).decode("latin1") == fuente["cola"]:
+                        desde = fuente["offset"]
+                f.seek(desde)
+                datos = f.read()
+                # Sólo las líneas completas (el CSV puede estar escribiéndose)
+                fin = desde+datos.rfind(b"\n")+1
+                datos = datos[:fin-desde]
+                f.seek(max(fin-64,0))
+                cola = f.read(fin-max(fin-64,0))
+            tabla = pd.read_csv(io.BytesIO(encabezado+datos),na_values=["NaN"],keep_default_na=False) if datos else None
+            self.indice["fuentes"][nombre] = {"size":stat.st_size,"mtime_ns":stat.st_mtime_ns,"offset":fin,
+                                              "encabezado":encabezado.decode("utf-8"),"cola":cola.decode("latin1")}
+        else:
+            import pyarrow.parquet
+            try:
+                tabla = pyarrow.parquet.read_table(ruta).to_pandas()
+            except (OSError,ValueError):
+                return 0 # El archivo aún se está escribiendo (sin pie): se indexa en la siguiente consulta
+            self.indice["fuentes"][nombre] = {"size":stat.st_size,"mtime_ns":stat.st_mtime_ns}
+
+        agregados = 0
+        if tabla is not None and len(tabla) > 0:
+            t = _a_epoch(pd,tabla.pop("Timestamp"))
+            validos = t != np.iinfo(np.int64).min
+            tabla.insert(0,"t",t)
+            tabla = tabla[validos].sort_values("t",kind="stable")
+            agregados = self._escribir_partes(nombre,tabla)
+        _guardar_indice(self.ruta_indice,self.indice)
+        return agregados
+
+    # _escribir_partes
+    # Escribe los records (ordenados por t) cuyo timestamp no está en el archivo en una parte por mes, y une las partes de un
+    # mismo mes cuando son más de MAX_PARTES. Retorna la cantidad de records escritos.
+    def _escribir_partes(self,fuente,tabla):
+        import pandas as pd
+        t = tabla["t"].to_numpy()
+        tabla = tabla[np.r_[True,t[1:] != t[:-1]]]  # Timestamps repetidos en el mismo archivo exportado
+        meses = tabla["t"].to_numpy().astype("datetime64[s]").astype("datetime64[M]")
+        cortes = np.flatnonzero(meses[1:] != meses[:-1])+1
+        escritos = 0
+        for inicio,fin in zip(np.r_[0,cortes],np.r_[cortes,len(tabla)]):
+            mes = str(meses[inicio])
+            nuevos = self._sin_repetidos(mes,tabla.iloc[inicio:fin])
+            if len(nuevos) == 0:
+                continue
+            self._escribir_parte(fuente,mes,nuevos)
+            escritos += len(nuevos)
+            partes = [p for p in self.indice["partes"] if p["mes"] == mes]
+            if len(partes) > MAX_PARTES:
+                unidas = pd.concat([self._leer_parte(p) for p in partes]).sort_values("t",kind="stable")
+                for parte in partes:
+                    self.indice["partes"].remove(parte)
+                    os.remove(os.path.join(self.carpeta,parte["archivo"]))
+                self._escribir_parte(fuente,mes,unidas)
+        return escritos
+
+    # _sin_repetidos
+    # Retorna los records de un mes (ordenados por t) cuyo timestamp no está en las partes del archivo. Sólo se lee la columna
+    # "t" de las partes del mes que se superponen con el rango de los records.
+    def _sin_repetidos(self,mes,tabla):
+        t = tabla["t"].to_numpy()
+        t0,t1 = int(t[0]),int(t[-1])
+        for parte in self.indice["partes"]:
+            if parte["mes"] == mes and parte["t0"] <= t1 and parte["t1"] >= t0:
+                existentes = self._leer_parte(parte,[],t0,t1+1)["t"].to_numpy()
+                nuevos = ~np.isin(t,existentes,assume_unique=True)
+                tabla,t = tabla[nuevos],t[nuevos]
+                if len(t) == 0:
+                    break
+        return tabla
+
+    def _escribir_parte(self,fuente,mes,tabla):
+        import pyarrow
+        import pyarrow.parquet
+        os.makedirs(self.carpeta,exist_ok=True)
+        archivo = f"{mes}_{self.indice['siguiente']:05}.parquet"
+        self.indice["siguiente"] += 1
+        pyarrow.parquet.write_table(pyarrow.Table.from_pandas(tabla,preserve_index=False),
+                                    os.path.join(self.carpeta,archivo),row_group_size=ROW_GROUP)
+        t = tabla["t"].to_numpy()
+        self.indice["partes"].append({"archivo":archivo,"fuente":fuente,"mes":mes,"t0":int(t[0]),"t1":int(t[-1]),
+                                      "filas":len(tabla),"columnas":[c for c in tabla.columns if c != "t"]})
+
+    def _leer_parte(self,parte,columnas=None,t0=None,t1=None):
+        import pyarrow.parquet
+        filtros = [("t",">=",t0)] if t0 is not None else []
+        filtros += [("t","<",t1)] if t1 is not None else []
+        if columnas is not None:
+            columnas = ["t"]+[c for c in columnas if c in parte["columnas"]]
+        return pyarrow.parquet.read_table(os.path.join(self.carpeta,parte["archivo"]),columns=columnas,
+                                          filters=filtros or None).to_pandas()
+
+    # leer
+    # Retorna un DataFrame con "t" y las columnas pedidas de los records con t0 <= t < t1, ordenados por t. Sólo se leen las
+    # partes que se superponen con el rango.
+    # Parámetros:
+    # columnas - columnas exportadas a leer (None: todas)
+    # t0, t1 - rango en segundos epoch (None: sin límite)
+    def leer(self,columnas=None,t0=None,t1=None):
+        import pandas as pd
+        partes = [p for p in self.indice["partes"] if (t0 is None or p["t1"] >= t0) and (t1 is None or p["t0"] < t1)]
+        tablas = [self._leer_parte(p,columnas,t0,t1) for p in sorted(partes,key=lambda p: p["t0"])]
+        if not tablas:
+            return pd.DataFrame({"t":np.empty(0,dtype=np.int64),**{c:[] for c in columnas or self.columnas()}})
+        tabla = pd.concat(tablas,ignore_index=True)
+        return tabla.sort_values("t",kind="stable",ignore_index=True)
+
+# ruta_archivo
+# Carpeta del archivo de un medidor y log.
+def ruta_archivo(carpeta,sn,log):
+    return os.path.join(carpeta,ARCHIVE_DIR,sn,log)
+
+# indexar_exportados
+# Indexa los archivos exportados nuevos o modificados de la carpeta de exportación.
+# Parámetros:
+# carpeta - carpeta de exportación
+# Retorna {(SN, log): records agregados}.
+def indexar_exportados(carpeta="ExportedLogs"):
+    agregados = {}
+    with archive_lock:
+        if not os.path.isdir(carpeta):
+            return agregados
+        archivos = {}
+        for nombre in sorted(os.listdir(carpeta)):
+            m = EXPORT_RE.match(nombre)
+            if m is not None:
+                archivos.setdefault((m.group("sn"),m.group("log")),[]).append(os.path.join(carpeta,nombre))
+        for (sn,log),rutas in archivos.items():
+            archivo = LogArchive(ruta_archivo(carpeta,sn,log))
+            agregados[(sn,log)] = sum(archivo.indexar(ruta) for ruta in rutas)
+    return agregados
+
+# archivos_indexados
+# Retorna {(SN, log): LogArchive} de los archivos indexados, filtrados por número de serie y log.
+# Parámetros:
+# sns, logs - listas de números de serie y logs (None: todos)
+def archivos_indexados(carpeta="ExportedLogs",sns=None,logs=None):
+    base = os.path.join(carpeta,ARCHIVE_DIR)
+    archivos = {}
+    if not os.path.isdir(base):
+        return archivos
+    for sn in sorted(os.listdir(base)):
+        if sns and sn not in sns:
+            continue
+        for log in sorted(os.listdir(os.path.join(base,sn))):
+            if (not logs or log in logs) and os.path.exists(os.path.join(base,sn,log,"index.json")):
+                archivos[(sn,log)] = LogArchive(os.path.join(base,sn,log))
+    return archivos
+
+# resolver_columnas
+# Convierte la selección de columnas en columnas exportadas. Cada elemento puede ser:
+#   - Número de registro de la tabla de registros (Reg#): la descripción del registro (todas sus columnas "(n)" si es arreglo).
+#   - Descripción exacta de la tabla de registros (igual que el encabezado exportado), con sus columnas "(n)".
+#   - Texto contenido en el encabezado (sin distinguir mayúsculas).
+# Parámetros:
+# disponibles - columnas de los archivos consultados
+# seleccion - lista de elementos
+def resolver_columnas(disponibles,seleccion):
+    columnas = {}
+    for elemento in seleccion:
+        elemento = str(elemento).strip()
+        if elemento.isdigit():
+            from shark270_core import catalogo_registros
+            info = catalogo_registros().buscar(int(elemento))
+            if info is None:
+                raise ConsultaError(f"El registro {elemento} no está en la tabla de registros.")
+            elemento = info.name
+        exactas = [c for c in disponibles if c == elemento or c.startswith(f"{elemento} (")]
+        encontradas = exactas or [c for c in disponibles if elemento.lower() in c.lower()]
+        if not encontradas:
+            raise ConsultaError(f"Ninguna columna de los logs consultados corresponde a '{elemento}'.")
+        columnas.update(dict.fromkeys(encontradas))
+    return list(columnas)
+
+# agregar_intervalos
+# Agrega los valores por intervalo de tiempo (sin contar NaN).
+# Parámetros:
+# t - timestamps epoch ordenados (int64)
+# valores - arreglo (n, columnas) float64
+# intervalo - segundos por intervalo
+# agregados - lista de AGREGADOS
+# Retorna (inicio de cada intervalo, {agregado: arreglo (intervalos, columnas)}).
+def agregar_intervalos(t,valores,intervalo,agregados):
+    if len(t) == 0:
+        return t,{a:np.empty((0,valores.shape[1])) for a in agregados}
+    cubetas = t//intervalo*intervalo
+    inicios = np.flatnonzero(np.r_[True,cubetas[1:] != cubetas[:-1]])
+    validos = ~np.isnan(valores)
+    cantidad = np.add.reduceat(validos,inicios,axis=0)
+    resultado = {}
+    with np.errstate(invalid="ignore",divide="ignore"):
+        for agregado in agregados:
+            if agregado == "min":
+                resultado[agregado] = np.fmin.reduceat(valores,inicios,axis=0)
+            elif agregado == "max":
+                resultado[agregado] = np.fmax.reduceat(valores,inicios,axis=0)
+            elif agregado == "avg":
+                resultado[agregado] = np.add.reduceat(np.where(validos,valores,0),inicios,axis=0)/cantidad
+            elif agregado == "count":
+                resultado[agregado] = cantidad
+            else:
+                raise ConsultaError(f"Agregado no soportado: {agregado} ({', '.join(AGREGADOS)})")
+    return cubetas[inicios],resultado
+
+# consultar
+# Consulta los logs indexados.
+# Parámetros:
+# carpeta - carpeta de exportación
+# sns, logs - números de serie y logs (None: todos)
+# t0, t1 - rango de tiempo [t0, t1) como texto (ver parse_tiempo) o segundos epoch (None: sin límite)
+# columnas - selección de columnas (ver resolver_columnas, None: todas)
+# intervalo - intervalo de agregación (ver parse_intervalo, None: records sin agregar)
+# agregados - agregados por intervalo y columna numérica, columnas "{columna} [{agregado}]"
+# indexar - indexar antes los archivos exportados nuevos o modificados
+# Retorna un DataFrame con las columnas SN, Log, Timestamp y los valores.
+def consultar(carpeta="ExportedLogs",sns=None,logs=None,t0=None,t1=None,columnas=None,intervalo=None,
+              agregados=("min","max","avg"),indexar=True):
+    import pandas as pd
+    t0,t1,intervalo = parse_tiempo(t0),parse_tiempo(t1),parse_intervalo(intervalo)
+    if indexar:
+        indexar_exportados(carpeta)
+    archivos = archivos_indexados(carpeta,sns,logs)
+    if not archivos:
+        raise ConsultaError("No hay logs indexados para la selección.")
+    disponibles = list(dict.fromkeys(c for archivo in archivos.values() for c in archivo.columnas()))
+    seleccion = resolver_columnas(disponibles,columnas) if columnas else disponibles
+
+    tablas = []
+    for (sn,log),archivo in archivos.items():
+        presentes = [c for c in seleccion if c in archivo.columnas()]
+        if columnas and not presentes:
+            continue # El log no contiene ninguna de las columnas seleccionadas
+        tabla = archivo.leer(presentes,t0,t1)
+        if intervalo:
+            numericas = [c for c in seleccion if c in tabla.columns and pd.api.types.is_numeric_dtype(tabla[c])]
+            valores = tabla[numericas].to_numpy(dtype=np.float64).reshape(len(tabla),len(numericas))
+            inicios,resultado = agregar_intervalos(tabla["t"].to_numpy(),valores,intervalo,agregados)
+            datos = {"t":inicios}
+            for j,columna in enumerate(numericas):
+                for agregado in agregados:
+                    datos[f"{columna} [{agregado}]"] = resultado[agregado][:,j]
+            tabla = pd.DataFrame(datos)
+        tabla.insert(0,"Log",log)
+        tabla.insert(0,"SN",sn)
+        tablas.append(tabla)
+    tabla = pd.concat(tablas,ignore_index=True)
+    tabla.insert(2,"Timestamp",pd.to_datetime(tabla.pop("t"),unit="s"))
+    return tabla
+
+# guardar_resultado
+# Guarda el resultado de una consulta en CSV (Timestamp con el formato de exportación) o Parquet, según la extensión.
+def guardar_resultado(tabla,ruta):
+    if ruta.endswith(".parquet"):
+        tabla.to_parquet(ruta,index=False)
+    else:
+        tabla = tabla.assign(Timestamp=tabla["Timestamp"].dt.strftime(FORMATO_TSTAMP))
+        tabla.to_csv(ruta,index=False,na_rep="NaN")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre los logs exportados del Shark270.")
+    parser.add_argument("accion",choices=["index","list","query"])
+    parser.add_argument("--dir",default="ExportedLogs",help="carpeta de exportación")
+    parser.add_argument("--sn",nargs="*",help="números de serie")
+    parser.add_argument("--log",nargs="*",help="logs (p. ej. \"Historic 1\")")
+    parser.add_argument("--from",dest="desde",help="inicio del rango (dd/mm/aaaa hh:mm:ss o aaaa-mm-dd hh:mm:ss)")
+    parser.add_argument("--to",dest="hasta",help="fin del rango (no incluido)")
+    parser.add_argument("--columns",nargs="*",help="descripciones o números de registro de la tabla de registros")
+    parser.add_argument("--every",help="intervalo de agregación (p. ej. 900, 15m, 1h, 1d)")
+    parser.add_argument("--agg",nargs="*",default=["min","max","avg"],choices=AGREGADOS,help="agregados por intervalo")
+    parser.add_argument("--out",help="guardar el resultado en .csv o .parquet (por defecto se imprime)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.accion == "index":
+            inicio = time.monotonic()
+            for (sn,log),records in indexar_exportados(args.dir).items():
+                print(f"{sn:16}{log:14}{records:10} records nuevos")
+            print(f"\n (!) Indexado en {time.monotonic()-inicio:.1f} s.")
+        elif args.accion == "list":
+            indexar_exportados(args.dir)
+            print(f"\n{'SN':16}{'Log':14}{'Records':>10}  {'Desde':20}{'Hasta':20}Columnas")
+            for (sn,log),archivo in archivos_indexados(args.dir,args.sn,args.log).items():
+                rango = archivo.rango()
+                if rango is not None:
+                    desde,hasta = (formatear_tiempo(t) for t in rango[:2])
+                    print(f"{sn:16}{log:14}{rango[2]:10}  {desde:20}{hasta:20}{len(archivo.columnas())}")
+        else:
+            tabla = consultar(args.dir,args.sn,args.log,args.desde,args.hasta,args.columns,args.every,args.agg)
+            if args.out:
+                guardar_resultado(tabla,args.out)
+                print(f"\n (!) {len(tabla)} filas guardadas en {args.out}")
+            else:
+                print(tabla.to_string(index=False,max_rows=60))
+    except ConsultaError as e:
+        print(f"\n /!\\ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,922 @@
+import os
+import struct
+import time
+import threading
+import queue
+import collections
+import numpy as np
+from pymodbus.exceptions import ModbusException
+from shark270_decoder import reg2var, decode_many, tstamp_tuple, compilar_decoder, FORMAT_SIZES, struct_registros, epoch_records
+from shark270_records import tstamp_a_epoch, TSTAMP_NULO
+from shark270_export import abrir_export, completar_export
+from shark270_estado import cargar_estado, guardar_estado
+from shark270_registros import cargar_catalogo, directorio_cache, CACHE_PATH, CACHE_NAME
+from shark270_layouts import layout_cache, huella_setup, Layout, LAYOUTS_NAME
+from shark270_conexion import pool, ConexionPerdida
+from shark270_metricas import Metricas
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Comunicación con el medidor Shark270
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Este módulo contiene la lógica de comunicación con el medidor, independiente de la interfaz gráfica. Cada instancia de Shark270
+# tiene su propio cliente Modbus TCP, por lo que se pueden utilizar varios medidores a la vez (ver shark270_cli.py).
+# La interfaz recibe los mensajes de estado y el progreso mediante callbacks.
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),"Shark270-Meter-Readings-Register-Table.xlsx")
+reg_catalog = None
+reg_catalog_cache = CACHE_PATH
+reg_catalog_lock = threading.Lock()
+
+# Direcciones de cada Histórico: (bloque de estado, disponibilidad, setup, número de log)
+LOGS = {
+    "Historic 1": (0xC757,0xC75C,0x84CF,2),
+    "Historic 2": (0xC767,0xC76C,0x858F,3),
+    "Historic 3": (0xC777,0xC77C,0x864F,4),
+    "Historic 4": (0xC787,0xC78C,0x870F,5),
+    "Historic 5": (0xC797,0xC79C,0x87CF,6),
+    "Historic 6": (0xC7A7,0xC7AC,0x888F,7),
+}
+
+# Formatos de interpretación de registros
+DATA_FORMATS = ["TSTAMP","UINT32","SINT32","UINT16","SINT16","FLOAT","ASCII"]
+
+# Modos de transferencia de logs:
+#   - Standard: lectura del estado de la ventana (0xC351) y luego de los datos (0xC353), decodificación en el mismo hilo.
+#   - Fast: una sola lectura de 125 registros (límite de Modbus) con el estado, el índice y los datos de la ventana; la
+#       decodificación y exportación se realizan en otro hilo mientras se descarga la siguiente ventana. Si una lectura falla
+#       se reduce el tamaño de la ventana a la mitad y se vuelve a aumentar después de varias ventanas sin errores.
+# Ambos modos configuran la ventana con num_repeats = 1, igual que la versión original (ver configurar_ventana).
+TRANSFER_MODES = ["Standard","Fast"]
+WINDOW_MAX_BYTES = 246  # 123 registros de datos + 2 registros de estado/índice = 125 registros
+
+# Tamaño del log, records utilizados, tamaño del record en bytes y disponibilidad (inicio del bloque de estado de un Histórico)
+LOG_STATUS_LAYOUT = [("UINT32",2),("UINT32",2),("UINT16",1),("UINT16",1)]
+
+# Shark270Error
+# Condición del medidor que impide completar una operación (medidor o log ocupado, respuesta de error, etc.).
+class Shark270Error(Exception):
+    pass
+
+# Shark270CommError
+# Una solicitud Modbus no obtuvo respuesta válida (respuesta de error, tiempo de espera agotado).
+class Shark270CommError(Shark270Error):
+    pass
+
+# LoteBuffer
+# Buffer de bytes donde se acumulan los datos de las ventanas de un lote, tal como llegan del medidor (big-endian). Los datos
+# se copian una sola vez desde la respuesta Modbus y el lote se decodifica desde una vista del buffer. El buffer se reserva
+# con la capacidad de un lote completo y se reutiliza en los siguientes lotes (vaciar no libera la memoria).
+# Parámetros:
+# capacidad - bytes reservados
+class LoteBuffer:
+    def __init__(self,capacidad):
+        self.datos = bytearray(capacidad)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def agregar(self,datos):
+        m = len(datos)
+        self.datos[self.n:self.n+m] = datos
+        self.n += m
+
+    # vista
+    # Retorna los datos del lote sin copiarlos (memoryview).
+    def vista(self):
+        return memoryview(self.datos)[:self.n]
+
+    def vaciar(self):
+        self.n = 0
+
+# PipelineExport
+# Ejecuta la exportación de los lotes en un hilo aparte, para decodificar un lote mientras se descarga el siguiente.
+# Si la exportación falla, el error se reporta en la siguiente llamada a enviar o cerrar. Los LoteBuffer ya exportados se
+# devuelven vacíos con buffer() para reutilizarlos.
+# Parámetros:
+# exportar - función(lote, siguiente) que decodifica y escribe un lote
+class PipelineExport:
+    def __init__(self,exportar):
+        self.exportar = exportar
+        self.cola = queue.Queue(maxsize=4)
+        self.libres = queue.SimpleQueue()
+        self.error = None
+        self.hilo = threading.Thread(target=self._procesar,daemon=True)
+        self.hilo.start()
+
+    def _procesar(self):
+        while True:
+            lote = self.cola.get()
+            if lote is None:
+                return
+            if self.error is None:
+                try:
+                    self.exportar(*lote)
+                except Exception as e:
+                    self.error = e
+            if isinstance(lote[0],LoteBuffer):
+                lote[0].vaciar()
+                self.libres.put(lote[0])
+
+    # buffer
+    # Retorna un LoteBuffer ya exportado, o None si todos están en uso.
+    def buffer(self):
+        try:
+            return self.libres.get_nowait()
+        except queue.Empty:
+            return None
+
+    def enviar(self,registros,siguiente):
+        if self.error is not None:
+            raise self.error
+        self.cola.put((registros,siguiente))
+
+    def cerrar(self):
+        self.cola.put(None)
+        self.hilo.join()
+        if self.error is not None:
+            raise self.error
+
+# VerificacionVentanas
+# Verifica los records de cada ventana recuperada por sus timestamps, comparando cada record con el anterior aceptado:
+#   - Duplicado: mismo timestamp que el record anterior (p. ej. records de una ventana leída dos veces).
+#   - Desordenado: timestamp anterior al del record anterior.
+#   - Salto: intervalo mayor que SALTO veces el intervalo de logging (mediana de los últimos INTERVALOS intervalos positivos,
+#       de modo que un intervalo corto aislado, p. ej. un ajuste de hora o un record de evento, no cambia la estimación).
+# Una ventana con records duplicados o desordenados se vuelve a solicitar (sólo esa ventana) hasta reintentos veces. Si la
+# anomalía persiste es parte del contenido del log (cambio de hora del medidor) y la ventana se acepta, omitiendo los records
+# duplicados. Los saltos sólo se cuentan: volver a leer la ventana no cambia un corte de energía registrado en el log.
+# Los records con timestamp inválido no se comparan.
+# Parámetros:
+# itemsize - tamaño del record en bytes
+# ultimo - timestamp epoch del último record exportado (recuperación incremental), o None
+# reintentos - solicitudes repetidas de una ventana con anomalías
+class VerificacionVentanas:
+    SALTO = 1.5
+    INTERVALOS = 64
+
+    def __init__(self,itemsize,ultimo=None,reintentos=2):
+        self.itemsize = itemsize
+        self.ultimo = ultimo
+        self.reintentos = reintentos
+        self.intervalos = collections.deque(maxlen=self.INTERVALOS)    # Últimos intervalos positivos entre records
+        self.indice = None      # Índice de la última ventana con anomalías
+        self.repeticiones = 0   # Solicitudes repetidas de esa ventana
+        self.conteo = {"ventanas_repetidas":0,"duplicados":0,"desordenados":0,"saltos":0}
+
+    # revisar
+    # Retorna los bytes de los records aceptados de la ventana, o None si la ventana debe volver a solicitarse.
+    # Parámetros:
+    # indice - índice del primer record de la ventana
+    # datos - bytes de los records válidos de la ventana
+    def revisar(self,indice,datos):
+        epoch = epoch_records(datos,self.itemsize)
+        posiciones = np.flatnonzero(epoch != TSTAMP_NULO)
+        t = epoch[posiciones]
+        if self.ultimo is None:
+            # El primer record no tiene anterior con el cual compararse
+            posiciones = posiciones[1:]
+        else:
+            t = np.concatenate(([self.ultimo],t))
+        if len(t) == 0:
+            return datos
+        diferencias = np.diff(t)
+        duplicados = diferencias == 0
+        desordenados = diferencias < 0
+        if duplicados.any() or desordenados.any():
+            if self.indice != indice:
+                self.indice,self.repeticiones = indice,0
+            if self.repeticiones < self.reintentos:
+                self.repeticiones += 1
+                self.conteo["ventanas_repetidas"] += 1
+                return None
+            self.conteo["duplicados"] += int(duplicados.sum())
+            self.conteo["desordenados"] += int(desordenados.sum())
+            if duplicados.any():
+                records = np.frombuffer(datos,dtype=np.uint8).reshape(-1,self.itemsize)
+                datos = np.delete(records,posiciones[duplicados],axis=0).tobytes()
+        positivas = diferencias[diferencias > 0]
+        recientes = np.concatenate((np.fromiter(self.intervalos,dtype=np.int64,count=len(self.intervalos)),positivas))
+        if len(recientes):
+            self.conteo["saltos"] += int((diferencias > self.SALTO*np.median(recientes[-self.INTERVALOS:])).sum())
+        self.intervalos.extend(positivas.tolist())
+        self.ultimo = int(t[-1])
+        return datos
+
+# catalogo_registros
+# Carga el catálogo de registros (Shark270-Meter-Readings-Register-Table.xlsx) la primera vez que se necesita.
+def catalogo_registros():
+    global reg_catalog
+    with reg_catalog_lock:
+        if reg_catalog is None:
+            reg_catalog = cargar_catalogo(TABLE_PATH,reg_catalog_cache)
+        return reg_catalog
+
+# configurar_cache
+# Cambia la carpeta de las cachés persistentes (catálogo de registros y formatos de log). Llamar antes de conectar.
+# Parámetros:
+# carpeta - carpeta de las cachés (None: la carpeta por defecto, ver shark270_registros.directorio_cache)
+def configurar_cache(carpeta):
+    global reg_catalog_cache
+    carpeta = directorio_cache(carpeta)
+    with reg_catalog_lock:
+        reg_catalog_cache = os.path.join(carpeta,CACHE_NAME)
+    layout_cache.cambiar_ruta(os.path.join(carpeta,LAYOUTS_NAME))
+
+# construir_layout
+# Obtiene los títulos, tamaños y formatos de las variables de un record a partir de los registros del log setup.
+# Los registros marcados como arreglo en el catálogo (armónicos y samples) se exportan con una columna por elemento.
+# Parámetros:
+# historic_vars - registros (base 0) configurados en el Histórico
+# Retorna (rec_titles, rec_var_sizes, rec_var_types, registros no encontrados en la tabla)
+def construir_layout(historic_vars):
+    catalogo = catalogo_registros()
+    rec_titles = ['Timestamp']
+    rec_var_sizes = [3]
+    rec_var_types = ['TSTAMP']
+    no_encontrados = []
+
+    for reg in historic_vars:
+        info = catalogo.buscar(reg+1)
+        if info is None:
+            no_encontrados.append(reg+1)
+        elif info.is_array:
+            rec_titles.extend([f"{info.name} ({n})" for n in range(1,info.size+1)])
+            rec_var_sizes.extend([1]*info.size)
+            rec_var_types.extend([info.format]*info.size)
+        else:
+            rec_titles.append(info.name)
+            rec_var_sizes.append(info.size)
+            rec_var_types.append(info.format)
+    return rec_titles,rec_var_sizes,rec_var_types,no_encontrados
+
+# interpretar_registros
+# Interpreta un bloque de registros en un formato, como se muestra en la ventana de Polling.
+# Parámetros:
+# start_address - registro donde inicia el bloque (base 1)
+# data_request - registros leídos, como bytes big-endian (Shark270.leer_bytes) o lista de enteros
+# format - formato para interpretar todos los datos
+# Retorna una lista de (registro, valor hexadecimal, valor interpretado)
+def interpretar_registros(start_address,data_request,format):
+    if not isinstance(data_request,(bytes,bytearray,memoryview)):
+        data_request = struct_registros(len(data_request)).pack(*data_request)
+    n = len(data_request)//2
+    bytes_value = data_request.hex().upper()
+    valores = ["   ↑"]*n # Indicador que el registro actual es parte de un registro previo
+    size = FORMAT_SIZES.get(format)
+    if format == "ASCII":
+        if n > 0:
+            valores[0] = bytes(data_request).decode('latin1')
+    elif size is not None:
+        completos = n//size
+        for j,true_value in enumerate(decode_many(data_request[:2*completos*size],[(format,size)]*completos)):
+            valores[j*size] = true_value
+        if completos*size < n:
+            valores[completos*size] = "Incomplete data"
+    return [(start_address+i,bytes_value[4*i:4*i+4],valores[i]) for i in range(n)]
+
+# EsperaVentana
+# Espera de la preparación de cada ventana de un log (estado 0xFF00). En lugar de consultar el estado sin pausa, lo que satura
+# al medidor y a la red, se espera entre consultas:
+#   - Primera consulta: después del tiempo de preparación típico del medidor, si adaptativa está habilitada. El tiempo se ajusta
+#       en cada ventana para que la primera consulta encuentre la ventana ocupada en una fracción OCUPADAS de las ventanas: si la
+#       ventana estaba ocupada se aumenta, si estaba lista se reduce (si se esperara el promedio medido, la espera sólo podría
+#       crecer, porque una ventana lista en la primera consulta no indica cuándo estuvo lista).
+#   - Consultas siguientes: retardo_inicial, multiplicado por factor en cada consulta ocupada hasta retardo_max.
+#   - Si la ventana no está lista después de timeout segundos se reporta con Shark270Error.
+# Con retardo_inicial = retardo_max = 0 y adaptativa deshabilitada se consulta sin pausa (comportamiento anterior).
+# Parámetros:
+# retardo_inicial - espera después de la primera consulta ocupada en segundos
+# factor - multiplicador de la espera en cada consulta ocupada
+# retardo_max - espera máxima entre consultas en segundos
+# timeout - tiempo máximo de preparación de una ventana en segundos
+# adaptativa - esperar el tiempo de preparación típico antes de la primera consulta
+class EsperaVentana:
+    OCUPADAS = 0.2  # Fracción objetivo de primeras consultas con la ventana ocupada
+    PASO = 0.05     # Ajuste relativo de la espera inicial en cada ventana
+    ALFA = 0.2      # Peso de cada medición en el promedio móvil del tiempo de preparación
+
+    def __init__(self,retardo_inicial=0.0005,factor=2,retardo_max=0.05,timeout=10,adaptativa=True):
+        self.retardo_inicial = retardo_inicial
+        self.factor = factor
+        self.retardo_max = retardo_max
+        self.timeout = timeout
+        self.adaptativa = adaptativa
+        self.preparacion = None # Tiempo de preparación típico medido de una ventana en segundos
+        self.primera = 0.0      # Espera antes de la primera consulta en segundos
+        self.iniciar()
+
+    # iniciar
+    # Comienza la espera de una ventana (después de configurarla o de leer la anterior).
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.consulta = self.inicio      # Inicio de la última consulta
+        self.ocupada = None              # Inicio de la última consulta con la ventana ocupada
+
+    # antes_de_consultar
+    # Espera antes de la siguiente consulta del estado. Retorna False si se canceló durante la espera.
+    # Parámetros:
+    # cancel - threading.Event de cancelación
+    def antes_de_consultar(self,cancel):
+        if self.consultas == 0:
+            retardo = self.primera if self.adaptativa else 0
+        else:
+            retardo = min(self.retardo_inicial*self.factor**(self.consultas-1),self.retardo_max)
+        if time.perf_counter()-self.inicio+retardo > self.timeout:
+            raise Shark270Error(f"El medidor no preparó la ventana en {self.timeout} s.")
+        if retardo > 0 and cancel.wait(retardo):
+            return False
+        self.consultas += 1
+        self.consulta = time.perf_counter()
+        return True
+
+    # registrar_ocupada / registrar_lista
+    # Resultado de la última consulta. Cuando la ventana está lista se mide el tiempo de preparación (punto medio entre la
+    # última consulta ocupada y la consulta lista) y se ajusta la espera antes de la primera consulta.
+    def registrar_ocupada(self):
+        self.ocupada = self.consulta
+
+    def registrar_lista(self):
+        if not self.adaptativa:
+            return
+        lista = self.consulta-self.inicio
+        medido = lista if self.ocupada is None else (self.ocupada-self.inicio+lista)/2
+        if self.preparacion is None:
+            self.preparacion = medido
+            self.primera = (1-self.OCUPADAS)*medido
+            return
+        self.preparacion += self.ALFA*(medido-self.preparacion)
+        if self.ocupada is not None:
+            self.primera += self.PASO*max(self.primera,medido)
+        else:
+            self.primera -= self.PASO*self.primera*self.OCUPADAS/(1-self.OCUPADAS)
+
+
+# Shark270
+# Conexión Modbus TCP con un medidor Shark270.
+# Parámetros:
+# host - dirección IP del medidor
+# port - puerto de conexión, 502 por defecto
+# slave_address - número de esclavo del medidor
+# timeout - tiempo máximo de espera de cada solicitud en segundos
+# retries - reintentos de una solicitud idempotente si la conexión se pierde (ver shark270_conexion.py)
+# backoff - espera inicial antes de reconectar en segundos
+# perfilar - perfilar la decodificación y exportación de los logs con cProfile (ver shark270_metricas.py)
+# espera - EsperaVentana para la preparación de las ventanas de los logs (None: valores por defecto)
+class Shark270:
+    def __init__(self,host,port=502,slave_address=1,timeout=3,retries=2,backoff=0.5,perfilar=False,espera=None):
+        self.host = host
+        self.port = port
+        self.slave_address = slave_address
+        self.opciones = {"timeout":timeout,"retries":retries,"backoff":backoff}
+        self.client = None  # shark270_conexion.ManagedClient, compartido por los objetos del mismo medidor
+        # Las operaciones de varias solicitudes (sesión de recuperación) se serializan con este lock.
+        self.lock = threading.RLock()
+        # Solicitud de cancelación de la recuperación en curso
+        self.cancel = threading.Event()
+        self.meter_name = None
+        self.meter_SN = None
+        self.meter_type = None
+        self.requests = 0   # Solicitudes Modbus realizadas
+        self.metricas = Metricas(perfilar)  # Solicitudes, latencias, esperas de ventana y tiempo por fase
+        self.espera = espera or EsperaVentana()    # Mide el tiempo de preparación de las ventanas de este medidor
+
+    # conectar
+    # Establece la conexión y obtiene el nombre, número de serie y modelo del medidor.
+    def conectar(self):
+        self.client = pool.obtener(self.host,self.port,self.slave_address,**self.opciones)
+        if not self.client.conectar():
+            self.cerrar()
+            raise Shark270Error(f"No se pudo conectar con {self.host}:{self.port}.")
+        id_request = self.leer_registros(0,16)
+        type_request = self.leer_registros(26,4)
+        self.meter_name = reg2var(id_request[0:8],"ASCII")
+        self.meter_SN   = reg2var(id_request[8:16],"ASCII")
+        self.meter_type = reg2var(type_request,"ASCII")
+
+    # cerrar
+    # Termina la conexión con el medidor (se cierra cuando ningún otro objeto del mismo medidor la utiliza).
+    def cerrar(self):
+        with self.lock:
+            if self.client is not None:
+                pool.liberar(self.client)
+                self.client = None
+
+    # estadisticas
+    # Contadores de la conexión: solicitudes, errores, reintentos, reconexiones y latencia.
+    def estadisticas(self):
+        client = self.client
+        return client.estadisticas() if client is not None else {}
+
+    def _ejecutar(self,metodo,*args,idempotente=True):
+        client = self.client
+        if client is None:
+            raise Shark270CommError("La conexión con el medidor está cerrada.")
+        registros = args[1] if metodo == "read_holding_registers" else 1 if metodo == "write_register" else len(args[1])
+        with self.lock:
+            self.requests += 1
+            inicio = time.perf_counter()
+            try:
+                response = client.ejecutar(metodo,*args,idempotente=idempotente,cancel=self.cancel)
+            except ConexionPerdida as e:
+                self.metricas.registrar_solicitud(metodo,registros,time.perf_counter()-inicio,error=True)
+                raise Shark270CommError(f"Conexión perdida: {e}") from e
+        self.metricas.registrar_solicitud(metodo,registros,time.perf_counter()-inicio,error=response.isError())
+        return response
+
+    # leer_registros / escribir_registro / escribir_registros
+    # Acceso al cliente Modbus serializado con el lock del medidor.
+    # Parámetros:
+    # address - registro inicial (base 0)
+    # count - cantidad de registros a leer
+    # value(s) - valor o lista de valores a escribir
+    # idempotente - la lectura puede repetirse si la conexión se pierde (False para los datos de la ventana de un log)
+    def leer_registros(self,address,count,idempotente=True):
+        return self._leer(address,count,idempotente).registers
+
+    # leer_bytes
+    # Lee registros y retorna los datos como bytes big-endian (memoryview de la respuesta, sin copiarlos ni convertirlos a
+    # enteros). Se utiliza para los bloques que se decodifican con struct o NumPy (ventanas de los logs, Polling, snapshot).
+    def leer_bytes(self,address,count,idempotente=True):
+        return self._leer(address,count,idempotente).raw
+
+    def _leer(self,address,count,idempotente):
+        response = self._ejecutar("read_holding_registers",address,count,idempotente=idempotente)
+        if response.isError():
+            raise Shark270CommError(f"Error al leer {count} registros en {address:#06X}: {response}")
+        return response
+
+    def escribir_registro(self,address,value):
+        response = self._ejecutar("write_register",address,value)
+        if response.isError():
+            raise Shark270CommError(f"Error al escribir el registro {address:#06X}: {response}")
+
+    def escribir_registros(self,address,values):
+        response = self._ejecutar("write_registers",address,values)
+        if response.isError():
+            raise Shark270CommError(f"Error al escribir los registros {address:#06X}: {response}")
+
+    # leer
+    # Lee un bloque de registros y los interpreta en un formato (Polling).
+    # Parámetros:
+    # start_adress - registro donde inicia la lectura (base 1)
+    # address_count - cantidad de registros a leer
+    # format - formato para interpretar todos los datos
+    def leer(self,start_address,address_count,format):
+        return interpretar_registros(start_address,self.leer_bytes(start_address-1,address_count),format)
+
+    # leer_variable
+    # Lee una medición documentada en la tabla de registros y la interpreta con su formato y escala.
+    # Parámetros:
+    # reg - número de registro (base 1)
+    # Retorna (descripción, valor). Los registros de 16 bits de varios registros (arreglos) retornan una lista.
+    def leer_variable(self,reg):
+        info = catalogo_registros().buscar(reg)
+        if info is None:
+            raise Shark270Error(f"Número de registro [{reg}] no encontrado.")
+        registers = self.leer_registros(reg-1,info.size)
+        if info.format in ("UINT16","SINT16"):
+            valores = decode_many(registers,[(info.format,1)]*info.size)
+        else:
+            valores = decode_many(registers,[(info.format,info.size)])
+        if info.scale and info.format not in ("TSTAMP","ASCII"):
+            valores = [v/100 for v in valores]
+        return info.name,(valores if len(valores) > 1 else valores[0])
+
+    # close_log_session
+    # Desacopla el log para permitir el acceso a otros sofwares.
+    def close_log_session(self):
+        log_disengage = self.leer_registros(0xC34F,1)[0] & 0xFF00
+        self.escribir_registro(0xC34F,log_disengage)
+
+    # configurar_ventana
+    # Configura la ventana de recuperación (0xC350-0xC352): records por ventana y record inicial.
+    # El campo de repeticiones (byte bajo de 0xC350) se escribe siempre en 1, igual que la versión original, con el que la
+    # ventana avanza al leer sus datos durante todo el log. Otros valores no se utilizan: no se ha verificado en un medidor si
+    # la ventana deja de avanzar después de esa cantidad de ventanas.
+    # Parámetros:
+    # rec_per_window - cantidad de records por ventana
+    # offset - índice del primer record de la ventana
+    def configurar_ventana(self,rec_per_window,offset):
+        num_repeats = 1
+        packed_rec_window = struct.pack('>h',rec_per_window << 8 | num_repeats)
+        packed_rec_window = struct.unpack('>h',packed_rec_window)[0]
+        self.escribir_registros(0xC350,[packed_rec_window,(offset >> 16) & 0xFF,offset & 0xFFFF])
+
+    # esperar_ventana
+    # Espera que el medidor prepare la ventana y retorna el índice del primer record de la ventana,
+    # o None si se canceló la recuperación. Las consultas del estado se espacian según self.espera.
+    def esperar_ventana(self):
+        self.espera.iniciar()
+        while True:
+            inicio = time.perf_counter()
+            if not self.espera.antes_de_consultar(self.cancel):
+                return None
+            window_offset = self.leer_registros(0xC351,2)
+            window_status = reg2var(window_offset[0],"UINT16") & 0xFF00
+            if window_status != 0xFF00:
+                self.espera.registrar_lista()
+                self.metricas.agregar_fase("wait",time.perf_counter()-inicio)
+                return reg2var(window_offset,"UINT32") & 0x00FFFFFF
+            self.espera.registrar_ocupada()
+            self.metricas.spin(time.perf_counter()-inicio)
+
+    # leer_estados_logs
+    # Lee el bloque de estado de varios Históricos en una sola solicitud (los bloques son consecutivos, 16 registros cada uno).
+    # No requiere la sesión de recuperación.
+    # Parámetros:
+    # logs - Históricos a leer
+    # Retorna {log: (records utilizados, timestamp del último record [año, mes, día, hora, minuto, segundo] o None)}.
+    def leer_estados_logs(self,logs):
+        direcciones = {log:LOGS[log][0] for log in logs}
+        inicio = min(direcciones.values())
+        registros = self.leer_registros(inicio,max(direcciones.values())+16-inicio)
+        estados = {}
+        for log,direccion in direcciones.items():
+            bloque = registros[direccion-inicio:direccion-inicio+16]
+            number_rec_used = decode_many(bloque[2:4],LOG_STATUS_LAYOUT[1:2])[0]
+            estados[log] = (number_rec_used,tstamp_tuple(bloque[9:12]) if number_rec_used > 0 else None)
+        return estados
+
+    # buscar_record
+    # Búsqueda del primer record con timestamp posterior a tstamp, leyendo sólo el timestamp de una ventana por paso.
+    # Se utiliza cuando el log rotó y los índices de los records cambiaron desde la última recuperación. Los records nuevos
+    # están al final del log y suelen ser pocos: el rango se acota desde el final con pasos que se duplican (1, 2, 4, ...) y
+    # luego se busca de forma binaria, con O(log records nuevos) pasos en lugar de O(log records del log).
+    # Parámetros:
+    # tstamp - timestamp [año, mes, día, hora, minuto, segundo] del último record exportado
+    # number_rec_used - records del log
+    # rec_per_window - records por ventana
+    def buscar_record(self,tstamp,number_rec_used,rec_per_window):
+        # Retorna True si el record i es posterior a tstamp, None si se canceló la recuperación
+        def posterior(i):
+            self.configurar_ventana(rec_per_window,i)
+            if self.esperar_ventana() is None:
+                return None
+            return tstamp_tuple(self.leer_registros(0xC353,3)) > tstamp
+
+        lo,hi = 0,number_rec_used
+        paso = 1
+        while paso <= number_rec_used:
+            despues = posterior(number_rec_used-paso)
+            if despues is None:
+                return hi
+            if not despues:
+                lo = number_rec_used-paso+1
+                break
+            hi = number_rec_used-paso
+            paso *= 2
+        while lo < hi:
+            mid = (lo+hi)//2
+            despues = posterior(mid)
+            if despues is None:
+                break
+            if despues:
+                hi = mid
+            else:
+                lo = mid+1
+        return lo
+
+    # retlog
+    # Accede a un log y lo recupera, exportando los records en la carpeta de exportación.
+    # La secuencia de recuperación sigue los pasos de Modbus "Shark-270-Meter-Modbus-Protocol-Application-Guide_E159718, sección 3"
+    # Parámetros:
+    # log - Histórico a recuperar
+    # export_format - formato del archivo exportado (CSV, Parquet)
+    # incremental - recuperar sólo los records nuevos desde la última recuperación (o continuar una descarga interrumpida)
+    # carpeta - carpeta de exportación
+    # on_status - callback(mensaje) para los mensajes de estado
+    # on_progress - callback(records recuperados, records del log, records/s)
+    # transfer_mode - modo de transferencia (TRANSFER_MODES)
+    # on_warning - callback(mensaje) para las advertencias (registros no encontrados, records duplicados), on_status si se omite
+    # Retorna un diccionario con el resultado (records exportados, archivo, velocidad, solicitudes por record, tiempo de
+    # preparación típico de una ventana, cancelado).
+    def retlog(self,log,export_format="CSV",incremental=True,carpeta="ExportedLogs",on_status=None,on_progress=None,
+               transfer_mode="Standard",on_warning=None):
+        on_status = on_status or (lambda msg: None)
+        on_progress = on_progress or (lambda *args: None)
+        self.abrir_sesion(on_status)
+        try:
+            return self._recuperar_log(log,export_format,incremental,carpeta,on_status,on_progress,transfer_mode,
+                                       on_warning=on_warning or on_status)
+        except Exception:
+            self._cerrar_sesion_error()
+            raise
+
+    # retlogs
+    # Recupera varios logs uno después del otro en una sola sesión de recuperación: el bloqueo de la sesión (0xC34B) se toma
+    # una vez y cada log se acopla sobre el anterior, que se desacopla sólo al terminar el último. La decodificación y
+    # exportación de cada lote se realiza en otro hilo mientras se descarga la siguiente ventana (en ambos modos).
+    # Parámetros:
+    # logs - Históricos a recuperar, en orden
+    # export_format, incremental, carpeta, on_status, transfer_mode, on_warning - ver retlog
+    # on_progress - callback(records recuperados, records de todos los logs, records/s del log actual)
+    # on_log - callback(log, resultado) al terminar cada log
+    # on_records - callback(log, store) con cada lote exportado (RecordStore que se reutiliza en el siguiente lote, se llama
+    #   desde el hilo de exportación)
+    # sufijo - texto agregado al nombre de los archivos exportados nuevos ({SN}_{log}{sufijo}), p. ej. para que una
+    #   recuperación completa no reemplace el archivo de las recuperaciones anteriores. Un archivo que se continúa conserva su nombre.
+    # Retorna {log: resultado de retlog} con los logs recuperados (se detiene en el primero cancelado).
+    def retlogs(self,logs,export_format="CSV",incremental=True,carpeta="ExportedLogs",on_status=None,on_progress=None,
+                transfer_mode="Standard",on_log=None,on_records=None,sufijo="",on_warning=None):
+        on_status = on_status or (lambda msg: None)
+        on_warning = on_warning or on_status
+        on_progress = on_progress or (lambda *args: None)
+        on_log = on_log or (lambda log,resultado: None)
+        self.abrir_sesion(on_status)
+        resultados = {}
+        try:
+            # Records de cada log para el progreso combinado
+            totales = {log:decode_many(self.leer_registros(LOGS[log][0],4),LOG_STATUS_LAYOUT[:2])[1] for log in logs}
+            hechos = 0
+            for i,log in enumerate(logs):
+                if self.cancel.is_set():
+                    break
+                on_status(f"(!) Recuperando {log} [{i+1}/{len(logs)}].")
+                progreso = lambda siguiente,total,rate,log=log,hechos=hechos: \
+                    on_progress(hechos+siguiente,sum(totales.values())-totales[log]+total,rate)
+                resultado = self._recuperar_log(log,export_format,incremental,carpeta,on_status,progreso,transfer_mode,
+                                                desacoplar=False,en_paralelo=True,on_records=on_records,sufijo=sufijo,
+                                                on_warning=on_warning)
+                totales[log] = resultado["total"]
+                hechos += resultado["total"]
+                resultados[log] = resultado
+                on_log(log,resultado)
+                if resultado["cancelled"]:
+                    break
+            self.close_log_session()
+        except Exception:
+            self._cerrar_sesion_error()
+            raise
+        return resultados
+
+    # abrir_sesion
+    # Toma el bloqueo de la sesión de recuperación (0xC34B).
+    def abrir_sesion(self,on_status):
+        # Verificar que el medidor esté disponible para una lectura
+        meter_availability = self.leer_registros(0xC34B,1)[0]
+        if(meter_availability != 0 and meter_availability != 0x0B00):
+            self.close_log_session()
+            raise Shark270Error("El medidor está ocupado.")
+        self.escribir_registro(0xC34B,0x000B)
+        meter_availability = self.leer_registros(0xC34B,1)[0]
+        if(meter_availability != 0x0B00): # El medidor realiza un shift automaticamente (<< 4)
+            raise Shark270Error("El medidor está ocupado en otra sesión.")
+        on_status("(!) Sesión de recuperación iniciada.")
+
+    def _cerrar_sesion_error(self):
+        try:
+            self.close_log_session()
+        except Exception:
+            pass # La conexión pudo haberse perdido
+
+    # _recuperar_log
+    # Parámetros:
+    # desacoplar - desacoplar el log al terminar (False si a continuación se acopla otro log de la misma sesión)
+    # en_paralelo - exportar los lotes en otro hilo también en modo Standard
+    # on_records, sufijo - ver retlogs
+    # on_warning - ver retlog (on_status si se omite)
+    def _recuperar_log(self,log,export_format,incremental,carpeta,on_status,on_progress,transfer_mode,desacoplar=True,
+                       en_paralelo=False,on_records=None,sufijo="",on_warning=None):
+        on_warning = on_warning or on_status
+        log_status_block_address,log_availability_address,log_setup_address,log_number = LOGS[log]
+        # Obtener estado del log
+        log_status_block = self.leer_registros(log_status_block_address,16)
+        log_size_rec,number_rec_used,rec_size_bytes,log_availability = decode_many(log_status_block[0:6],LOG_STATUS_LAYOUT)
+        # 6-8 primer timestamp, 9-11 último timestamp, 4 registros vacios al final
+
+        # Verificar que el log esté disponible
+        if(log_availability != 0):
+            self.close_log_session()
+            raise Shark270Error(f"El log seleccionado está ocupado por COM{log_availability}.")
+
+        # Acoplar log
+        enable = 1
+        scope = 0 # Normal record
+        packed_log_engage = struct.pack('>h',log_number << 8 | enable << 7 | scope)
+        packed_log_engage = struct.unpack('>h',packed_log_engage)[0]
+        self.escribir_registro(0xC34F,packed_log_engage)
+
+        # Revisar que se haya acoplado correctamente
+        log_availability = self.leer_registros(log_availability_address,1)[0]
+        if(log_availability == 0):
+            raise Shark270Error("El log no se ha acoplado correctamente.")
+
+        # Revisar log setup: la cabecera y la lista de variables se leen en una sola solicitud, con la cantidad de variables
+        # guardada de este medidor y log. Si las variables, el tamaño del record y la tabla de registros no cambiaron desde la
+        # última recuperación se utiliza el formato guardado.
+        guardadas = layout_cache.variables(self.meter_SN,log_number)
+        n_guardadas = len(guardadas) if guardadas is not None else 0
+        log_setup = self.leer_registros(log_setup_address,2+n_guardadas)
+        log_reg_per_rec = (log_setup[0] & 0xFF00) >> 8
+        if log_reg_per_rec == n_guardadas:
+            historic_vars = list(log_setup[2:2+n_guardadas])
+        else:
+            # Primera recuperación o cantidad de variables distinta (medidor reprogramado)
+            historic_vars = self.leer_registros(log_setup_address+2,log_reg_per_rec) if log_reg_per_rec else []
+        huella_catalogo = catalogo_registros().huella
+        huella = huella_setup(log_setup[0],historic_vars,rec_size_bytes,huella_catalogo)
+        layout = layout_cache.buscar(self.meter_SN,log_number,huella,historic_vars)
+        if layout is None:
+            rec_titles,rec_var_sizes,rec_var_types,no_encontrados = construir_layout(historic_vars)
+            # Compilar el formato del record para decodificar cada ventana en una sola pasada
+            decoder = compilar_decoder(rec_titles,rec_var_sizes,rec_var_types,rec_size_bytes)
+            layout = Layout(decoder,historic_vars,no_encontrados,huella_catalogo)
+            layout_cache.guardar(self.meter_SN,log_number,huella,layout)
+        for table_reg_num in layout.no_encontrados:
+            on_warning(f"/!\\ Número de registro [{table_reg_num}] no encontrado.")
+        decoder = layout.decoder
+        max_rec_per_window = WINDOW_MAX_BYTES//rec_size_bytes # División que redondea hacia abajo
+        if max_rec_per_window == 0:
+            raise Shark270Error(f"El record ocupa {rec_size_bytes} bytes, más que una ventana ({WINDOW_MAX_BYTES} bytes).")
+        rec_per_window = max_rec_per_window
+        register_count = rec_per_window*decoder.rec_size_regs
+
+        # Recuperación incremental: continuar desde el último record exportado de este medidor y log
+        state_file = os.path.join(carpeta,"retrieval_state.json")
+        inicio = 0
+        continuar = None
+        first_tstamp = tstamp_tuple(log_status_block[6:9])
+        estado = cargar_estado(self.meter_SN,log_number,state_file) if incremental else None
+        if estado is not None and estado["layout"] == decoder.huella and estado["format"] == export_format and \
+                completar_export(estado["export"]):
+            # Si el archivo exportado se eliminó o movió, el log se recupera completo en un archivo nuevo. Un Parquet
+            # interrumpido se completa con las partes ya escritas
+            continuar = estado["export"]
+            if estado["first_tstamp"] == first_tstamp and estado["last_index"] <= number_rec_used:
+                inicio = estado["last_index"]
+            elif estado["last_tstamp"] >= first_tstamp:
+                # El log rotó: se busca el primer record posterior al último exportado
+                inicio = self.buscar_record(estado["last_tstamp"],number_rec_used,rec_per_window)
+            # Si no, el log fue reiniciado o ya no contiene el último record exportado: se recupera completo
+
+        resultado = {"log":log,"records":0,"total":number_rec_used,"export":None,"rate":0.0,"requests_per_record":0.0,
+                     "window_prep_ms":None,"cancelled":False,"verificacion":None}
+        if inicio >= number_rec_used:
+            if desacoplar:
+                self.close_log_session()
+            return resultado
+
+        # Abrir el archivo de exportación, los records se escriben a medida que se recuperan. Si el archivo anterior no puede
+        # continuarse (p. ej. está abierto en Excel) se escribe uno nuevo con el log completo.
+        export,continua = abrir_export(carpeta,f"{self.meter_SN.strip()}_{log}{sufijo}",export_format,decoder.titulos,continuar)
+        if not continua:
+            inicio,continuar = 0,None
+
+        # Obtener ventana
+        modo_rapido = transfer_mode == "Fast"
+        try:
+            self.configurar_ventana(rec_per_window,inicio)
+        except BaseException:
+            export.cerrar()
+            raise
+
+        if estado is None or continuar is None:
+            estado = {"last_index":0,"last_tstamp":None}
+        estado.update(first_tstamp=first_tstamp,layout=decoder.huella,format=export_format,
+                      export=os.path.abspath(export.ruta) if continuar is None else continuar)
+
+        siguiente = inicio # Índice del siguiente record a recuperar
+        # Los records nuevos se comparan con el último exportado en el mismo archivo
+        ultimo = int(tstamp_a_epoch(estado["last_tstamp"])[0]) if continuar is not None and estado["last_tstamp"] else None
+        verificacion = VerificacionVentanas(decoder.itemsize,None if ultimo == TSTAMP_NULO else ultimo)
+        start_time = time.monotonic()
+        start_requests = self.requests
+        last_flush = start_time
+
+        # Escribe los records de un lote y guarda el avance para continuar desde este punto
+        # Parámetros:
+        # lote - LoteBuffer con los records del lote
+        # siguiente - índice del siguiente record después del lote
+        def exportar_lote(lote,siguiente):
+            store.vaciar()
+            with self.metricas.perfilar():
+                with self.metricas.fase("decode"):
+                    decoder.decodificar_en(store,lote.vista())
+                with self.metricas.fase("export"):
+                    export.escribir(store)
+            if on_records is not None and len(store) > 0:
+                on_records(log,store)
+            tstamp = store.ultimo_tstamp()
+            if tstamp is not None:
+                estado.update(last_index=siguiente,last_tstamp=tstamp)
+                guardar_estado(self.meter_SN,log_number,estado,state_file)
+
+        store = decoder.crear_store()   # Records del lote en columnas tipadas, se reutiliza en cada lote
+        pipeline = PipelineExport(exportar_lote) if modo_rapido or en_paralelo else None
+        # Un lote se exporta al alcanzar 64 ventanas completas; la última ventana agregada puede excederlo
+        capacidad_lote = 65*max_rec_per_window*rec_size_bytes
+        lote = LoteBuffer(capacidad_lote)
+        ventanas_ok = 0 # Ventanas consecutivas sin errores (modo Fast)
+        errores = 0     # Lecturas consecutivas fallidas
+        esperando = False   # Espera de la ventana actual iniciada (modo Fast)
+        try:
+            while(siguiente < number_rec_used):
+                if self.cancel.is_set():
+                    break
+
+                # Los datos de la ventana no se reintentan automáticamente (al leerlos el medidor avanza a la siguiente
+                # ventana): si la lectura falla o la conexión se pierde, la ventana se vuelve a posicionar en el siguiente record.
+                try:
+                    if modo_rapido:
+                        # Estado, índice y datos de la ventana en una sola solicitud
+                        if not esperando:
+                            self.espera.iniciar()
+                            esperando = True
+                        inicio_lectura = time.perf_counter()
+                        if not self.espera.antes_de_consultar(self.cancel):
+                            break
+                        self.metricas.agregar_fase("wait",time.perf_counter()-inicio_lectura)
+                        inicio_lectura = time.perf_counter()
+                        window = self.leer_bytes(0xC351,2+register_count,idempotente=False)
+                        if window[0] == 0xFF:
+                            self.espera.registrar_ocupada()
+                            self.metricas.spin(time.perf_counter()-inicio_lectura)
+                            continue # El medidor aún prepara la ventana
+                        self.espera.registrar_lista()
+                        esperando = False
+                        self.metricas.agregar_fase("transfer",time.perf_counter()-inicio_lectura)
+                        current_index = int.from_bytes(window[0:4],"big") & 0x00FFFFFF
+                        window_data = window[4:]
+                    else:
+                        # Esperar que el medidor prepara la ventana
+                        current_index = self.esperar_ventana()
+                        if current_index is None:
+                            break
+                        with self.metricas.fase("transfer"):
+                            window_data = self.leer_bytes(0XC353,register_count,idempotente=False)
+                except (Shark270CommError,ModbusException):
+                    esperando = False
+                    errores += 1
+                    if errores > 3:
+                        raise
+                    if modo_rapido:
+                        # Reducir la ventana
+                        rec_per_window = max(rec_per_window//2,1)
+                        register_count = rec_per_window*decoder.rec_size_regs
+                        ventanas_ok = 0
+                    self.configurar_ventana(rec_per_window,siguiente)
+                    continue
+                errores = 0
+                if current_index != siguiente:
+                    # El medidor avanzó una ventana cuya respuesta se perdió: volver a posicionarla
+                    self.configurar_ventana(rec_per_window,siguiente)
+                    continue
+
+                # La última ventana puede contener posiciones después del último record
+                validos = max(min(len(window_data)//decoder.itemsize,number_rec_used-current_index),0)
+                with self.metricas.fase("verify"):
+                    datos = verificacion.revisar(current_index,window_data[:validos*decoder.itemsize])
+                if datos is None:
+                    # Timestamps duplicados o desordenados: volver a solicitar sólo esta ventana
+                    self.configurar_ventana(rec_per_window,current_index)
+                    continue
+                siguiente = current_index+validos
+                on_progress(siguiente,number_rec_used,(siguiente-inicio)/max(time.monotonic()-start_time,1e-6))
+
+                # Escribir en el archivo de exportación por lotes (máximo 64 ventanas o 1 segundo)
+                lote.agregar(datos)
+                if len(lote) >= 64*2*register_count or time.monotonic()-last_flush > 1:
+                    if pipeline is not None:
+                        pipeline.enviar(lote,siguiente)
+                        lote = pipeline.buffer() or LoteBuffer(capacidad_lote)
+                    else:
+                        exportar_lote(lote,siguiente)
+                        lote.vaciar()
+                    last_flush = time.monotonic()
+
+                if modo_rapido:
+                    ventanas_ok += 1
+                    if ventanas_ok >= 32 and rec_per_window < max_rec_per_window and siguiente < number_rec_used:
+                        # Sin errores recientes: volver a aumentar la ventana
+                        rec_per_window = min(rec_per_window*2,max_rec_per_window)
+                        register_count = rec_per_window*decoder.rec_size_regs
+                        self.configurar_ventana(rec_per_window,siguiente)
+                        ventanas_ok = 0
+
+        finally:
+            # Se escriben los records recuperados aunque la sesión se interrumpa
+            try:
+                if pipeline is not None:
+                    pipeline.enviar(lote,siguiente)
+                    pipeline.cerrar()
+                else:
+                    exportar_lote(lote,siguiente)
+            finally:
+                export.cerrar()
+
+        if desacoplar:
+            self.close_log_session()
+
+        conteo = verificacion.conteo
+        if conteo["duplicados"] or conteo["desordenados"] or conteo["saltos"]:
+            on_warning(f"/!\\ {log}: {conteo['duplicados']} records duplicados omitidos, {conteo['desordenados']} fuera de orden, "
+                      f"{conteo['saltos']} saltos de tiempo ({conteo['ventanas_repetidas']} ventanas solicitadas nuevamente).")
+        records = export.records
+        resultado.update(records=records,verificacion=conteo,export=export.ruta,cancelled=self.cancel.is_set(),
+                         rate=records/max(time.monotonic()-start_time,1e-6),
+                         requests_per_record=(self.requests-start_requests)/max(records,1),
+                         window_prep_ms=self.espera.preparacion*1000 if self.espera.preparacion is not None else None)
+        return resultado
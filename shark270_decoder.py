@@ -0,0 +1,349 @@
+import struct
+import zlib
+from collections import namedtuple
+import numpy as np
+from shark270_records import RecordStore, tstamp_a_epoch
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Decodificación de registros Shark270
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Este módulo contiene la interpretación de los registros del medidor:
+#   - reg2var: interpreta un valor a la vez con el codec de su formato (CODECS).
+#   - decode_many: interpreta un bloque de registros con varios valores en una sola llamada (Polling, bloques de estado).
+#   - compilar_decoder: compila el formato de los records de un Histórico para decodificar ventanas completas (o varias ventanas)
+#       con NumPy en una sola pasada por tipo de dato, en lugar de llamar reg2var campo por campo. Los records se guardan en
+#       columnas tipadas (shark270_records.RecordStore) hasta exportarlos.
+
+# Máscara de los bytes válidos de un TSTAMP [año, mes, día, hora, minuto, segundo]
+TSTAMP_MASK = np.array([0x7F,0x0F,0x1F,0x1F,0x3F,0x3F],dtype=np.uint8)
+
+# Codec
+# Interpretación de un formato, compilada una sola vez.
+# size - cantidad de registros que utiliza un valor (ASCII: todos los registros recibidos)
+# codigo - código de struct del valor en big-endian, como se recibe en Modbus (ASCII y TSTAMP se leen como bytes)
+# numpy - tipo NumPy equivalente para decodificar records completos (compilar_decoder)
+# decode - función(registros) que interpreta un valor. Los formatos de 16 bits reciben un entero, el resto una lista.
+Codec = namedtuple("Codec",["size","codigo","numpy","decode"])
+
+_U16 = struct.Struct('>H')
+_S16 = struct.Struct('>h')
+_U16X2 = struct.Struct('>HH')
+_U32 = struct.Struct('>I')
+_S32 = struct.Struct('>i')
+_F32 = struct.Struct('>f')
+_U16_STRUCTS = {}   # cantidad de registros -> struct.Struct('>{n}H')
+
+# struct_registros
+# Retorna la struct.Struct (compilada una vez por cantidad) que convierte n registros de 16 bits a bytes big-endian.
+def struct_registros(n):
+    codec = _U16_STRUCTS.get(n)
+    if codec is None:
+        codec = _U16_STRUCTS[n] = struct.Struct(f'>{n}H')
+    return codec
+
+def _formatear_tstamp(r0,r1,r2):
+    return f"{r1 >> 8 & 0x1F:02}/{r0 & 0x0F:02}/20{r0 >> 8 & 0x7F:02} {r1 & 0x1F:02}:{r2 >> 8 & 0x3F:02}:{r2 & 0x3F:02}"
+
+def _decode_tstamp(registers):
+    return _formatear_tstamp(registers[0],registers[1],registers[2])
+
+def _decode_ascii(registers):
+    return struct_registros(len(registers)).pack(*registers).decode('latin1')
+
+# FLOAT: el entero (reg[0] << 16 | reg[1]) reinterpretado como float equivale a leer los 4 bytes como '>f'.
+CODECS = {
+    "TSTAMP": Codec(3,"6s",None,_decode_tstamp),
+    "UINT32": Codec(2,"I",">u4",lambda registers: _U32.unpack(_U16X2.pack(registers[0],registers[1]))[0]),
+    "SINT32": Codec(2,"i",">i4",lambda registers: _S32.unpack(_U16X2.pack(registers[0],registers[1]))[0]),
+    "UINT16": Codec(1,"H",">u2",lambda register: _U16.unpack(_U16.pack(register))[0]),
+    "SINT16": Codec(1,"h",">i2",lambda register: _S16.unpack(_U16.pack(register))[0]),
+    "FLOAT":  Codec(2,"f",">f4",lambda registers: _F32.unpack(_U16X2.pack(registers[0],registers[1]))[0]),
+    "ASCII":  Codec(None,"s",None,_decode_ascii),
+}
+
+# Tipos NumPy y cantidad de registros de cada formato numérico (compilar_decoder)
+NUMPY_TYPES = {formato:codec.numpy for formato,codec in CODECS.items() if codec.numpy is not None}
+FORMAT_SIZES = {formato:codec.size for formato,codec in CODECS.items() if codec.size is not None}
+
+# reg2var
+# Esta función permite interpretar los registros obtenidos del medidor
+# según el formato en el que está almacenado.
+# Parámetros:
+# registers - lista de bytes para interpretar
+# data_type - formato de interpretación (TSTAMP, UINT32/16, SINT32/16, FLOAT, ASCII )
+def reg2var(registers,data_type):
+    codec = CODECS.get(data_type)
+    if codec is not None:
+        return codec.decode(registers)
+
+
+# BlockLayout
+# Formato compilado de un bloque de registros: una sola struct.Struct interpreta todos los valores del bloque.
+# Parámetros:
+# layout - secuencia de (formato, registros); cada valor utiliza los primeros registros de su formato y omite el resto
+class BlockLayout:
+    def __init__(self,layout):
+        self.layout = tuple((formato,size) for formato,size in layout)
+        codigos = ['>']
+        self.post = []  # Posiciones que requieren conversión después de unpack: (posición, formato)
+        for j,(formato,size) in enumerate(self.layout):
+            codec = CODECS.get(formato)
+            if codec is None:
+                raise ValueError(f"Formato desconocido: {formato}")
+            usados = size if codec.size is None else codec.size
+            if size < usados:
+                raise ValueError(f"El formato {formato} requiere {usados} registros y tiene {size}.")
+            codigos.append(f"{2*usados}s" if codec.codigo.endswith("s") else codec.codigo)
+            if size > usados:
+                codigos.append(f"{2*(size-usados)}x")
+            if formato in ("TSTAMP","ASCII"):
+                self.post.append((j,formato))
+        self.registros = sum(size for formato,size in self.layout)
+        self.struct = struct.Struct("".join(codigos))
+
+    # decodificar
+    # Parámetros:
+    # registers - registros del bloque (lista de enteros) o bytes big-endian
+    def decodificar(self,registers):
+        if isinstance(registers,(bytes,bytearray,memoryview)):
+            valores = list(self.struct.unpack_from(registers))
+        else:
+            valores = list(self.struct.unpack(struct_registros(self.registros).pack(*registers[:self.registros])))
+        for j,formato in self.post:
+            if formato == "TSTAMP":
+                valores[j] = _formatear_tstamp(*struct_registros(3).unpack(valores[j]))
+            else:
+                valores[j] = valores[j].decode('latin1')
+        return valores
+
+_layouts = {}
+
+# decode_many
+# Interpreta un bloque de registros con varios valores en una sola llamada, con los mismos resultados que reg2var por valor.
+# Parámetros:
+# registers - registros del bloque (lista de enteros) o bytes big-endian
+# layout - BlockLayout o secuencia de (formato, registros)
+def decode_many(registers,layout):
+    if not isinstance(layout,BlockLayout):
+        clave = tuple(map(tuple,layout))
+        compilado = _layouts.get(clave)
+        if compilado is None:
+            compilado = _layouts[clave] = BlockLayout(clave)
+        layout = compilado
+    return layout.decodificar(registers)
+
+# tstamp_tuple
+# Interpreta un TSTAMP como [año, mes, día, hora, minuto, segundo] (enmascarado), que se puede comparar en orden cronológico.
+# Parámetros:
+# registers - 3 registros del timestamp
+def tstamp_tuple(registers):
+    return [b & m for b,m in zip(struct.pack('>HHH',*registers[0:3]),TSTAMP_MASK.tolist())]
+
+# epoch_records
+# Timestamps (segundos epoch, ver tstamp_a_epoch) de los records de una ventana, tomados de los primeros 6 bytes de cada record.
+# Parámetros:
+# datos - bytes big-endian de los records, tal como llegan del medidor
+# itemsize - tamaño del record en bytes
+def epoch_records(datos,itemsize):
+    n = len(datos)//itemsize
+    tstamps = np.frombuffer(datos,dtype=np.uint8,count=n*itemsize).reshape(n,itemsize)[:,:6] & TSTAMP_MASK
+    return tstamp_a_epoch(tstamps)
+
+# formatear_tstamp
+# Da formato "dd/mm/20yy hh:mm:ss" (igual que reg2var) a timestamps ya enmascarados.
+# Parámetros:
+# tstamps - secuencia de [año, mes, día, hora, minuto, segundo]
+def formatear_tstamp(tstamps):
+    return [f"{d:02}/{m:02}/20{y:02} {h:02}:{mi:02}:{s:02}" for y,m,d,h,mi,s in tstamps]
+
+
+# RecordDecoder
+# Decodificador compilado para el formato de record de un Histórico. Se construye una vez por log con
+# compilar_decoder y se reutiliza para todas las ventanas. Las columnas del mismo tipo se agrupan para
+# extraerlas todas con una sola indexación del bloque de bytes.
+# Atributos:
+# itemsize - tamaño del record en bytes (rec_size_bytes)
+# titulos - encabezados de las columnas exportadas
+# grupos - lista de (formato, tipo NumPy, índices de bytes, posiciones de columna, escalar)
+# tipos - (formato, tipo NumPy, forma de un valor) de cada columna en un RecordStore
+class RecordDecoder:
+    def __init__(self,itemsize,titulos,grupos):
+        self.itemsize = itemsize
+        self.titulos = titulos
+        self.grupos = grupos
+        self.rec_size_regs = itemsize//2
+        self.tipos = [None]*len(titulos)
+        for formato,tipo,indices,posiciones,escalar in grupos:
+            if formato == "TSTAMP":
+                columna = (formato,np.dtype(np.int64),())
+            elif formato == "ASCII":
+                columna = (formato,np.dtype(np.uint8),(len(indices)//len(posiciones),))
+            else:
+                columna = (formato,np.dtype(np.float64) if escalar else np.dtype(tipo).newbyteorder('='),())
+            for pos in posiciones:
+                self.tipos[pos] = columna
+        # Huella del formato, identifica si dos recuperaciones del mismo log son compatibles
+        self.huella = f"{zlib.crc32(repr((itemsize,titulos,[g[0] for g in grupos])).encode()):08X}"
+
+    # decodificar
+    # Convierte una o varias ventanas en bloques de columnas tipadas.
+    # Parámetros:
+    # window_data - registros de la ventana (lista de enteros de 16 bits) o bytes big-endian tal como llegan del medidor
+    # Retorna una lista de (formato, posiciones, arreglo) por grupo. El arreglo tiene una fila por record y una columna por
+    # posición (TSTAMP: (n,k,6) uint8 ya enmascarado, ASCII: (n,k,bytes) uint8).
+    def decodificar(self,window_data):
+        if isinstance(window_data,(bytes,bytearray,memoryview)):
+            raw = np.frombuffer(window_data,dtype=np.uint8)
+        else:
+            raw = np.asarray(window_data,dtype='>u2').view(np.uint8)
+        n_recs = raw.size//self.itemsize
+        raw = raw[:n_recs*self.itemsize].reshape(n_recs,self.itemsize)
+
+        bloques = []
+        for formato,tipo,indices,posiciones,escalar in self.grupos:
+            datos = raw.take(indices,axis=1)
+            if formato == "TSTAMP":
+                datos = datos.reshape(n_recs,len(posiciones),6) & TSTAMP_MASK
+            elif formato == "ASCII":
+                datos = datos.reshape(n_recs,len(posiciones),-1)
+            else:
+                datos = datos.view(tipo)
+                if escalar:
+                    datos = datos.astype(np.float64)/100
+            bloques.append((formato,posiciones,datos))
+        return bloques
+
+    # a_dict / desde_dict
+    # Forma serializable (JSON) del decoder compilado, para guardarlo en la caché de formatos de log (shark270_layouts.py).
+    def a_dict(self):
+        return {"itemsize":self.itemsize,"titulos":self.titulos,
+                "grupos":[[formato,tipo,indices.tolist(),posiciones,escalar]
+                          for formato,tipo,indices,posiciones,escalar in self.grupos]}
+
+    @classmethod
+    def desde_dict(cls,datos):
+        grupos = [(formato,tipo,np.asarray(indices,dtype=np.intp),posiciones,escalar)
+                  for formato,tipo,indices,posiciones,escalar in datos["grupos"]]
+        return cls(datos["itemsize"],datos["titulos"],grupos)
+
+    # crear_store
+    # Retorna un RecordStore vacío para los records de este formato.
+    def crear_store(self,capacidad=1024):
+        return RecordStore(self.titulos,self.tipos,capacidad)
+
+    # decodificar_en
+    # Decodifica una o varias ventanas y agrega los records al final de store (TSTAMP como segundos epoch).
+    # Parámetros:
+    # store - RecordStore creado con crear_store
+    # window_data - ver decodificar
+    def decodificar_en(self,store,window_data):
+        columnas = [None]*len(self.titulos)
+        for formato,posiciones,datos in self.decodificar(window_data):
+            for j,pos in enumerate(posiciones):
+                columnas[pos] = tstamp_a_epoch(datos[:,j]) if formato == "TSTAMP" else datos[:,j]
+        store.agregar(columnas)
+
+    # columnas
+    # Separa los bloques de decodificar en un arreglo por columna, en el orden de titulos.
+    # Parámetros:
+    # bloques - resultado de decodificar
+    def columnas(self,bloques):
+        columnas = [None]*len(self.titulos)
+        for formato,posiciones,datos in bloques:
+            for j,pos in enumerate(posiciones):
+                columnas[pos] = datos[:,j]
+        return columnas
+
+    # ultimo_tstamp
+    # Retorna el timestamp [año, mes, día, hora, minuto, segundo] del último record decodificado (columna 0), o None.
+    # Parámetros:
+    # bloques - resultado de decodificar
+    def ultimo_tstamp(self,bloques):
+        for formato,posiciones,datos in bloques:
+            if posiciones[0] == 0 and formato == "TSTAMP" and len(datos) > 0:
+                return datos[-1,0].tolist()
+        return None
+
+    # a_filas
+    # Convierte los bloques decodificados en filas de Python con los mismos valores que genera reg2var
+    # (TSTAMP como texto "dd/mm/20yy hh:mm:ss", NaN como 'NaN').
+    # Parámetros:
+    # bloques - resultado de decodificar
+    def a_filas(self,bloques):
+        if not bloques or len(bloques[0][2]) == 0:
+            return []
+        filas = np.empty((len(bloques[0][2]),len(self.titulos)),dtype=object)
+        for formato,posiciones,datos in bloques:
+            if formato == "TSTAMP":
+                valores = [formatear_tstamp(rec) for rec in datos.tolist()]
+            elif formato == "ASCII":
+                valores = [[bytes(v).decode('latin1') for v in rec] for rec in datos]
+            elif datos.dtype.kind == 'f':
+                valores = [['NaN' if v != v else v for v in rec] for rec in datos.tolist()]
+            else:
+                valores = datos.tolist()
+            bloque = np.empty((len(valores),len(posiciones)),dtype=object)
+            bloque[:] = valores
+            filas[:,posiciones] = bloque
+        return filas.tolist()
+
+
+# escalar_variable
+# Indica si los valores de una variable de un record se dividen entre 100, con las reglas de la interpretación original.
+# Parámetros:
+# titulo - título de la variable
+# formato - formato de la variable
+# size - registros de la variable (UINT16/SINT16 de varios registros: un valor por registro)
+def escalar_variable(titulo,formato,size):
+    if formato in ("UINT16","SINT16") and size > 1:
+        return '%' in titulo
+    return formato not in ("TSTAMP","ASCII") and (('%' in titulo) or ('Phase' in titulo))
+
+# compilar_decoder
+# Compila el formato de record de un Histórico (rec_titles, rec_var_sizes, rec_var_types) en un RecordDecoder.
+# Replica las reglas de la interpretación campo por campo:
+#   - Cada variable utiliza sólo los primeros registros de su formato (p. ej. un FLOAT de 3 registros usa los 2 primeros).
+#   - Las variables UINT16/SINT16 de varios registros se separan en una columna por registro, escaladas sólo si el título contiene '%'.
+#   - El resto de variables numéricas se escala /100 si el título contiene '%' o 'Phase'.
+# Parámetros:
+# rec_titles - títulos de las variables del record
+# rec_var_sizes - tamaño en registros de cada variable
+# rec_var_types - formato de cada variable
+# rec_size_bytes - tamaño del record reportado por el medidor (si es mayor a la suma de las variables se ignora el relleno)
+def compilar_decoder(rec_titles,rec_var_sizes,rec_var_types,rec_size_bytes=None):
+    titulos = []
+    grupos = {} # (formato, ancho en bytes, escalar) -> (offsets, posiciones)
+    offset = 0
+
+    def agregar(formato,ancho,escalar,offset,titulo):
+        offsets,posiciones = grupos.setdefault((formato,ancho,escalar),([],[]))
+        offsets.append(offset)
+        posiciones.append(len(titulos))
+        titulos.append(titulo)
+
+    for titulo,size,formato in zip(rec_titles,rec_var_sizes,rec_var_types):
+        if formato in ("UINT16","SINT16") and size > 1:
+            # El registro contiene varias variables del mismo tipo
+            for n in range(size):
+                agregar(formato,2,escalar_variable(titulo,formato,size),offset+2*n,f"{titulo} ({n+1})")
+        elif formato == "ASCII":
+            agregar(formato,2*size,False,offset,titulo)
+        else:
+            if formato not in FORMAT_SIZES:
+                raise ValueError(f"Formato {formato} no soportado ({titulo}).")
+            if size < FORMAT_SIZES[formato]:
+                raise ValueError(f"La variable {titulo} ({formato}) requiere {FORMAT_SIZES[formato]} registros y tiene {size}.")
+            agregar(formato,2*FORMAT_SIZES[formato],escalar_variable(titulo,formato,size),offset,titulo)
+        offset += 2*size
+
+    itemsize = offset if rec_size_bytes is None else rec_size_bytes
+    if itemsize < offset:
+        raise ValueError(f"El record ocupa {offset} bytes pero el medidor reporta {rec_size_bytes}.")
+
+    grupos_compilados = []
+    for (formato,ancho,escalar),(offsets,posiciones) in grupos.items():
+        # Índices de todos los bytes del grupo, en orden de columna
+        indices = (np.asarray(offsets)[:,None] + np.arange(ancho)).ravel()
+        grupos_compilados.append((formato,NUMPY_TYPES.get(formato),indices,posiciones,escalar))
+    return RecordDecoder(itemsize,titulos,grupos_compilados)
@@ -0,0 +1,57 @@
+import os
+import json
+import threading
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Estado de recuperación de logs
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Registro local del avance de la recuperación de cada log, por número de serie del medidor y número de log. Permite que una
+# nueva recuperación descargue sólo los records nuevos y que una descarga interrumpida continúe desde el último lote exportado.
+# El estado de cada log es un diccionario con:
+#   - last_index: índice del siguiente record a recuperar (records ya exportados)
+#   - last_tstamp: timestamp [año, mes, día, hora, minuto, segundo] del último record exportado
+#   - first_tstamp: timestamp del primer record del log al momento de la recuperación (detecta si el log fue reiniciado o rotó)
+#   - layout: huella de los encabezados del record (si el medidor se reprograma no se agregan records a un archivo incompatible)
+#   - export: ruta del archivo de exportación
+#   - format: formato del archivo de exportación
+
+STATE_FILE = os.path.join("ExportedLogs","retrieval_state.json")
+state_lock = threading.Lock()
+
+def _clave(meter_SN,log_number):
+    return f"{meter_SN.strip()}/{log_number}"
+
+def _leer_archivo(ruta):
+    try:
+        with open(ruta,encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return {}
+
+# cargar_estado
+# Obtiene el estado guardado de un log, o None si nunca se ha recuperado.
+# Parámetros:
+# meter_SN - número de serie del medidor
+# log_number - número de log (2-7 para Historic 1-6)
+# ruta - archivo de estado
+def cargar_estado(meter_SN,log_number,ruta=STATE_FILE):
+    with state_lock:
+        return _leer_archivo(ruta).get(_clave(meter_SN,log_number))
+
+# guardar_estado
+# Guarda el estado de un log. El archivo se reemplaza de forma atómica para que una interrupción no lo deje corrupto.
+# Parámetros:
+# meter_SN - número de serie del medidor
+# log_number - número de log
+# estado - diccionario con el estado del log
+# ruta - archivo de estado
+def guardar_estado(meter_SN,log_number,estado,ruta=STATE_FILE):
+    with state_lock:
+        estados = _leer_archivo(ruta)
+        estados[_clave(meter_SN,log_number)] = estado
+        os.makedirs(os.path.dirname(ruta) or ".",exist_ok=True)
+        tmp = f"{ruta}.tmp"
+        with open(tmp,"w",encoding="utf-8") as f:
+            json.dump(estados,f,indent=1)
+        os.replace(tmp,ruta)
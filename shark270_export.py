@@ -0,0 +1,187 @@
+import os
+import csv
+import shutil
+from shark270_records import formatear_epoch
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Exportación incremental de logs
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Los records recuperados se escriben en disco a medida que se decodifican, en lugar de acumular el log completo en memoria.
+# La memoria utilizada depende sólo del tamaño del lote que se escribe, no de la cantidad de records del log. Cada lote llega
+# como un RecordStore (columnas tipadas); los timestamps se convierten a texto sólo aquí.
+#   - CSV: cada lote se escribe y se vacía al disco (flush), por lo que si la sesión se interrumpe el archivo contiene todos
+#       los records recuperados hasta ese momento.
+#   - Parquet: un archivo Parquet sólo se puede leer cuando tiene el pie, que se escribe al cerrarlo. Por eso cada lote se
+#       escribe como un Parquet completo en {archivo}.partial/{n}.parquet (el avance de la recuperación se guarda después de
+#       cada lote, ver shark270_estado.py), y al cerrar el writer las partes se unen en el archivo final (un row group por lote)
+#       y se elimina la carpeta. Si el proceso termina sin cerrarlo, la carpeta .partial se puede leer como un dataset Parquet
+#       (pyarrow.parquet.read_table) y la siguiente recuperación une las partes antes de continuar (completar_export).
+#       Requiere pyarrow (se importa sólo al exportar en este formato).
+
+EXPORT_FORMATS = ["CSV","Parquet"]
+
+# CsvLogWriter
+# Escribe los records en un archivo .csv con el mismo contenido que la exportación original (encabezados en la primera fila,
+# NaN como 'NaN').
+# Parámetros:
+# ruta - archivo de destino
+# titulos - encabezados de las columnas
+# agregar - agrega los records al final de un archivo existente (sin repetir los encabezados)
+class CsvLogWriter:
+    extension = "csv"
+
+    def __init__(self,ruta,titulos,agregar=False):
+        self.ruta = ruta
+        self.records = 0
+        self.file = open(ruta,"a" if agregar else "w",newline="",encoding="utf-8")
+        self.writer = csv.writer(self.file,lineterminator=os.linesep)
+        if not agregar:
+            self.writer.writerow(titulos)
+        self.file.flush()
+
+    # escribir
+    # Escribe un lote de records decodificados.
+    # Parámetros:
+    # store - RecordStore con los records del lote
+    def escribir(self,store):
+        self.writer.writerows(store.iter_filas())
+        self.file.flush()
+        self.records += len(store)
+
+    def cerrar(self):
+        self.file.close()
+
+PARCIAL = ".partial"    # Carpeta de las partes de un Parquet en escritura: {archivo}.partial
+
+# _partes
+# Partes escritas de un Parquet en escritura, en orden.
+def _partes(carpeta):
+    return sorted(os.path.join(carpeta,f) for f in os.listdir(carpeta) if f.endswith(".parquet"))
+
+# _unir_partes
+# Une las partes de {ruta}.partial en ruta (un row group por parte) y elimina la carpeta. El archivo se reemplaza de forma
+# atómica, si el proceso termina durante la unión las partes se conservan.
+# Parámetros:
+# ruta - archivo final
+# titulos - encabezados de las columnas (para un archivo sin records)
+def _unir_partes(ruta,titulos=None):
+    import pyarrow
+    import pyarrow.parquet
+    carpeta = ruta+PARCIAL
+    partes = _partes(carpeta)
+    tmp = f"{ruta}.tmp"
+    if partes:
+        writer = None
+        try:
+            for parte in partes:
+                tabla = pyarrow.parquet.read_table(parte)
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(tmp,tabla.schema)
+                writer.write_table(tabla)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        # Log vacío: se escribe un archivo válido sin records
+        tabla = pyarrow.table({titulo:pyarrow.array([],type=pyarrow.string()) for titulo in titulos or []})
+        pyarrow.parquet.write_table(tabla,tmp)
+    os.replace(tmp,ruta)
+    shutil.rmtree(carpeta,ignore_errors=True)
+
+# completar_export
+# Indica si el archivo exportado de una recuperación anterior existe. Si era un Parquet cuya recuperación se interrumpió sin
+# cerrarlo, primero une las partes ya escritas en el archivo.
+# Parámetros:
+# ruta - archivo exportado
+def completar_export(ruta):
+    if os.path.isdir(ruta+PARCIAL):
+        try:
+            if _partes(ruta+PARCIAL):
+                _unir_partes(ruta)
+        except (OSError,ImportError,ValueError):
+            pass    # Partes ilegibles o pyarrow no instalado: el log se recupera completo en un archivo nuevo
+    return os.path.exists(ruta)
+
+# ParquetLogWriter
+# Escribe los records en un archivo .parquet con columnas tipadas (TSTAMP y ASCII como texto), un Parquet completo por lote
+# hasta cerrarlo (ver encabezado).
+# Parámetros:
+# ruta - archivo de destino
+# titulos - encabezados de las columnas
+class ParquetLogWriter:
+    extension = "parquet"
+
+    def __init__(self,ruta,titulos):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.ruta = ruta
+        self.titulos = titulos
+        self.records = 0
+        self.partes = 0
+        # Las partes de una recuperación anterior de este archivo que no se continuó se reemplazan
+        shutil.rmtree(ruta+PARCIAL,ignore_errors=True)
+        os.makedirs(ruta+PARCIAL)
+
+    def escribir(self,store):
+        if len(store) == 0:
+            return
+        arrays = []
+        for i,(formato,tipo,forma) in enumerate(store.tipos):
+            if formato == "TSTAMP":
+                arrays.append(self.pa.array(formatear_epoch(store.columna(i))))
+            elif formato == "ASCII":
+                arrays.append(self.pa.array(store.valores(i)))
+            else:
+                arrays.append(self.pa.array(store.columna(i)))
+        tabla = self.pa.table(arrays,names=self.titulos)
+        # La parte se escribe completa con otro nombre y se renombra: una parte .parquet siempre tiene pie
+        parte = os.path.join(self.ruta+PARCIAL,f"{self.partes:06}.parquet")
+        self.pa.parquet.write_table(tabla,f"{parte}.tmp")
+        os.replace(f"{parte}.tmp",parte)
+        self.partes += 1
+        self.records += len(tabla)
+
+    def cerrar(self):
+        _unir_partes(self.ruta,self.titulos)
+
+# abrir_export
+# Crea el writer del log en la carpeta de exportación. Si el archivo {nombre}.{ext} no puede abrirse (p. ej. está abierto en
+# Excel) se intenta con {nombre}_0, {nombre}_1, ...
+# Parámetros:
+# carpeta - carpeta de exportación (se crea si no existe)
+# nombre - nombre del archivo sin extensión
+# formato - formato de exportación (EXPORT_FORMATS)
+# titulos - encabezados de las columnas
+# continuar - archivo de una recuperación anterior del mismo log. Los CSV se continúan en el mismo archivo; un Parquet no
+#   puede modificarse, por lo que los records nuevos se escriben en el siguiente archivo {nombre}_x.parquet libre.
+# Retorna (writer, continúa el archivo anterior). Si el CSV anterior no puede abrirse se escribe un archivo nuevo y los records
+# deben recuperarse completos.
+def abrir_export(carpeta,nombre,formato,titulos,continuar=None):
+    writer_class = ParquetLogWriter if formato == "Parquet" else CsvLogWriter
+    os.makedirs(carpeta,exist_ok=True)
+    if continuar is not None and os.path.exists(continuar):
+        if writer_class is CsvLogWriter:
+            try:
+                return CsvLogWriter(continuar,titulos,agregar=True),True
+            except OSError:
+                return _abrir_libre(writer_class,carpeta,nombre,titulos),False
+        x = 0
+        while completar_export(os.path.join(carpeta,f"{nombre}_{x}.{writer_class.extension}")):
+            x += 1
+        return writer_class(os.path.join(carpeta,f"{nombre}_{x}.{writer_class.extension}"),titulos),True
+    try:
+        return writer_class(os.path.join(carpeta,f"{nombre}.{writer_class.extension}"),titulos),False
+    except OSError:
+        return _abrir_libre(writer_class,carpeta,nombre,titulos),False
+
+# _abrir_libre
+# Crea el writer en el primer archivo {nombre}_0 ... {nombre}_99 que pueda abrirse.
+def _abrir_libre(writer_class,carpeta,nombre,titulos):
+    for x in range(99):
+        try:
+            return writer_class(os.path.join(carpeta,f"{nombre}_{x}.{writer_class.extension}"),titulos)
+        except OSError:
+            pass
+    return writer_class(os.path.join(carpeta,f"{nombre}_99.{writer_class.extension}"),titulos)
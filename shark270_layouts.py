@@ -0,0 +1,148 @@
+import os
+import json
+import zlib
+import threading
+from shark270_decoder import RecordDecoder
+from shark270_registros import directorio_cache
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Caché de formatos de log
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# El formato de los records de un Histórico (variables configuradas en el log setup) sólo cambia cuando el medidor se
+# reprograma. En lugar de construir el decoder en cada recuperación, el decoder compilado se guarda por número de serie y log,
+# con una huella de:
+#   - El primer registro del log setup (cantidad de variables en el byte alto) y la lista de variables. Se leen en una sola
+#       solicitud de 2+N registros, con la cantidad N de variables guardada (variables); sólo si la cantidad cambió se vuelven a
+#       leer las variables.
+#   - El tamaño del record reportado en el bloque de estado del log (ya leído para la recuperación).
+#   - La versión de la tabla de registros (RegisterCatalog.huella), de la que dependen los títulos y formatos.
+# El decoder guardado se utiliza sólo si la huella y la lista de variables coinciden exactamente; si no, se compila de nuevo.
+# Archivo: {directorio_cache}/log_layouts.json (ver shark270_registros.directorio_cache; se puede borrar, se vuelve a generar en
+# la siguiente recuperación). Si no se puede escribir (p. ej. PermissionError), la caché se mantiene sólo en memoria.
+
+LAYOUTS_NAME = "log_layouts.json"
+LAYOUTS_PATH = os.path.join(directorio_cache(),LAYOUTS_NAME)
+LAYOUTS_VERSION = 1
+
+# Layout
+# Formato de un log guardado en la caché.
+# Parámetros:
+# decoder - RecordDecoder compilado
+# historic_vars - registros configurados en el Histórico
+# no_encontrados - registros que no están en la tabla de registros (se reportan en cada recuperación)
+# catalogo - huella de la tabla de registros con la que se construyó
+class Layout:
+    def __init__(self,decoder,historic_vars,no_encontrados,catalogo):
+        self.decoder = decoder
+        self.historic_vars = historic_vars
+        self.no_encontrados = no_encontrados
+        self.catalogo = catalogo
+
+# huella_setup
+# Huella de los datos que identifican el formato de un log.
+# Parámetros:
+# cabecera - primer registro del log setup
+# historic_vars - registros configurados en el Histórico
+# rec_size_bytes - tamaño del record del bloque de estado
+# huella_catalogo - versión de la tabla de registros
+def huella_setup(cabecera,historic_vars,rec_size_bytes,huella_catalogo):
+    return f"{zlib.crc32(repr((cabecera,list(historic_vars),rec_size_bytes,huella_catalogo)).encode()):08X}"
+
+# LayoutCache
+# Parámetros:
+# ruta - archivo de la caché (None: sólo en memoria)
+class LayoutCache:
+    def __init__(self,ruta=LAYOUTS_PATH):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.entradas = None    # {"{SN}/{log}": {"huella", "historic_vars", "decoder", "no_encontrados", "catalogo"}}
+        self.layouts = {}       # Layouts ya construidos en este proceso: "{SN}/{log}" -> (huella, Layout)
+
+    def _cargar(self):
+        if self.entradas is not None:
+            return
+        self.entradas = {}
+        if self.ruta is None:
+            return
+        try:
+            with open(self.ruta,encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") == LAYOUTS_VERSION:
+                self.entradas = datos["logs"]
+        except (OSError,ValueError,KeyError):
+            pass
+
+    # cambiar_ruta
+    # Utiliza otro archivo de caché (None: sólo en memoria); las entradas se leen del archivo nuevo.
+    def cambiar_ruta(self,ruta):
+        with self.lock:
+            self.ruta = ruta
+            self.entradas = None
+
+    def _guardar(self):
+        if self.ruta is None:
+            return
+        tmp = f"{self.ruta}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.ruta) or ".",exist_ok=True)
+            with open(tmp,"w",encoding="utf-8") as f:
+                json.dump({"version":LAYOUTS_VERSION,"logs":self.entradas},f,separators=(",",":"))
+            os.replace(tmp,self.ruta)
+        except OSError as e:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            if isinstance(e,PermissionError):
+                # Sin permisos de escritura: la caché queda sólo en memoria para el resto de la ejecución
+                self.ruta = None
+
+    # variables
+    # Retorna la lista de variables guardada de un log, o None.
+    def variables(self,meter_SN,log_number):
+        clave = f"{meter_SN.strip()}/{log_number}"
+        with self.lock:
+            self._cargar()
+            entrada = self.entradas.get(clave)
+            return list(entrada["historic_vars"]) if entrada is not None else None
+
+    # buscar
+    # Retorna el Layout guardado si la huella y la lista de variables coinciden, o None.
+    # Parámetros:
+    # meter_SN - número de serie del medidor
+    # log_number - número de log
+    # huella - huella_setup de la recuperación actual
+    # historic_vars - registros configurados leídos del medidor
+    def buscar(self,meter_SN,log_number,huella,historic_vars):
+        clave = f"{meter_SN.strip()}/{log_number}"
+        historic_vars = list(historic_vars)
+        with self.lock:
+            guardado = self.layouts.get(clave)
+            if guardado is not None and guardado[0] == huella and list(guardado[1].historic_vars) == historic_vars:
+                return guardado[1]
+            self._cargar()
+            entrada = self.entradas.get(clave)
+            if entrada is None or entrada["huella"] != huella or entrada["historic_vars"] != historic_vars:
+                return None
+            try:
+                layout = Layout(RecordDecoder.desde_dict(entrada["decoder"]),entrada["historic_vars"],entrada["no_encontrados"],
+                                entrada["catalogo"])
+            except (KeyError,TypeError,ValueError):
+                return None # Entrada de otra versión o dañada: se reconstruye
+            self.layouts[clave] = (huella,layout)
+            return layout
+
+    # guardar
+    # Guarda el formato de un log con la huella actual.
+    def guardar(self,meter_SN,log_number,huella,layout):
+        clave = f"{meter_SN.strip()}/{log_number}"
+        with self.lock:
+            self._cargar()
+            self.entradas[clave] = {"huella":huella,"historic_vars":list(layout.historic_vars),
+                                    "decoder":layout.decoder.a_dict(),"no_encontrados":list(layout.no_encontrados),
+                                    "catalogo":layout.catalogo}
+            self.layouts[clave] = (huella,layout)
+            self._guardar()
+
+layout_cache = LayoutCache()
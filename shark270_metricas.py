@@ -0,0 +1,204 @@
+import json
+import time
+import threading
+import contextlib
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Instrumentación de la comunicación
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Mediciones de una sesión con el medidor, para distinguir si una recuperación lenta se debe a la red, al tiempo que el medidor
+# tarda en preparar cada ventana (lecturas con estado 0xFF00) o a la decodificación y exportación local.
+#   - Solicitudes por tipo (read, write): cantidad, errores, bytes enviados y recibidos (tramas Modbus TCP) e histograma de latencia.
+#   - Esperas de ventana: lecturas con el medidor ocupado (spins).
+#   - Tiempo por fase: wait (preparación de la ventana), transfer (lectura de los datos), decode, export.
+# Las mediciones pueden guardarse como JSON o en formato de texto de Prometheus, y opcionalmente se perfila la decodificación
+# y exportación con cProfile: un perfil por hilo (el pipeline de exportación decodifica en otro hilo), unidos al guardarlos.
+# Sólo un bloque se perfila a la vez en todo el proceso (en Python 3.12+ cProfile no admite dos perfiles activos); los bloques
+# de otros hilos durante ese tiempo se ejecutan sin perfilar y se cuentan en profile_skipped. Para un perfil completo se
+# perfila un solo medidor a la vez (shark270_cli.py no admite --profile con varios medidores en paralelo).
+
+perfil_lock = threading.Lock()    # Bloque perfilado en curso en el proceso
+
+# Límites de los intervalos del histograma de latencia en ms (el último intervalo es +Inf)
+LATENCY_BUCKETS_MS = [1,2,5,10,20,50,100,200,500,1000,2000,5000]
+
+# Tamaño de las tramas Modbus TCP en bytes (encabezado MBAP de 7 bytes + PDU)
+def _bytes_trama(metodo,registros):
+    if metodo == "read_holding_registers":
+        return 7+5,7+2+2*registros
+    if metodo == "write_register":
+        return 7+5,7+5
+    return 7+6+2*registros,7+5
+
+# Metricas
+# Parámetros:
+# perfilar - habilita cProfile en las fases de decodificación y exportación
+class Metricas:
+    def __init__(self,perfilar=False):
+        self.lock = threading.Lock()
+        self.perfil = perfilar
+        self.perfiles = []      # cProfile.Profile de cada hilo perfilado
+        self.local = threading.local()
+        self.omitidos = 0       # Bloques no perfilados porque otro hilo estaba perfilando
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self.lock:
+            self.inicio = time.time()
+            self.solicitudes = {}
+            self.spins = 0
+            self.fases = {}
+
+    # registrar_solicitud
+    # Parámetros:
+    # metodo - método de pymodbus (read_holding_registers, write_register, write_registers)
+    # registros - registros leídos o escritos
+    # latencia - duración de la solicitud en segundos
+    # error - la solicitud falló
+    def registrar_solicitud(self,metodo,registros,latencia,error=False):
+        tipo = "read" if metodo.startswith("read") else "write"
+        enviados,recibidos = _bytes_trama(metodo,registros)
+        latencia_ms = latencia*1000
+        with self.lock:
+            s = self.solicitudes.get(tipo)
+            if s is None:
+                s = self.solicitudes[tipo] = {"count":0,"errors":0,"bytes_sent":0,"bytes_received":0,"latency_ms_sum":0.0,
+                                              "latency_ms_max":0.0,"buckets":[0]*(len(LATENCY_BUCKETS_MS)+1)}
+            s["count"] += 1
+            s["bytes_sent"] += enviados
+            if error:
+                s["errors"] += 1
+                return
+            s["bytes_received"] += recibidos
+            s["latency_ms_sum"] += latencia_ms
+            s["latency_ms_max"] = max(s["latency_ms_max"],latencia_ms)
+            for i,limite in enumerate(LATENCY_BUCKETS_MS):
+                if latencia_ms <= limite:
+                    s["buckets"][i] += 1
+                    break
+            else:
+                s["buckets"][-1] += 1
+
+    # agregar_fase
+    # Suma tiempo a una fase.
+    def agregar_fase(self,fase,segundos):
+        with self.lock:
+            self.fases[fase] = self.fases.get(fase,0.0)+segundos
+
+    # spin
+    # Registra una lectura de la ventana con el medidor ocupado (tiempo sumado a la fase wait).
+    def spin(self,segundos):
+        with self.lock:
+            self.spins += 1
+            self.fases["wait"] = self.fases.get("wait",0.0)+segundos
+
+    # fase
+    # Mide el tiempo de un bloque: with metricas.fase("decode"): ...
+    @contextlib.contextmanager
+    def fase(self,fase):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.agregar_fase(fase,time.perf_counter()-inicio)
+
+    # perfilar
+    # Perfila un bloque con cProfile si está habilitado, con el perfil del hilo que ejecuta el bloque.
+    @contextlib.contextmanager
+    def perfilar(self):
+        if not self.perfil:
+            yield
+            return
+        perfil = getattr(self.local,"perfil",None)
+        if perfil is None:
+            import cProfile
+            perfil = self.local.perfil = cProfile.Profile()
+            with self.lock:
+                self.perfiles.append(perfil)
+        if not perfil_lock.acquire(blocking=False):
+            with self.lock:
+                self.omitidos += 1
+            yield
+            return
+        try:
+            perfil.enable()
+            try:
+                yield
+            finally:
+                perfil.disable()
+        finally:
+            perfil_lock.release()
+
+    # a_dict
+    # Retorna una copia de las mediciones.
+    def a_dict(self):
+        with self.lock:
+            solicitudes = {tipo:dict(s,buckets=list(s["buckets"])) for tipo,s in self.solicitudes.items()}
+            datos = {"start":self.inicio,"seconds":time.time()-self.inicio,"requests":solicitudes,"busy_spins":self.spins,
+                     "phases":dict(self.fases),"latency_buckets_ms":LATENCY_BUCKETS_MS}
+            if self.perfil:
+                datos["profile_skipped"] = self.omitidos
+            return datos
+
+    # resumen
+    # Texto de una línea para la interfaz: latencia media, esperas de ventana y tiempo por fase.
+    def resumen(self):
+        datos = self.a_dict()
+        lecturas = datos["requests"].get("read",{})
+        exitosas = lecturas.get("count",0)-lecturas.get("errors",0)
+        latencia = lecturas.get("latency_ms_sum",0.0)/max(exitosas,1)
+        fases = ", ".join(f"{fase} {segundos:.1f} s" for fase,segundos in sorted(datos["phases"].items()))
+        return f"Lat. {latencia:.1f} ms, {datos['busy_spins']} esperas | {fases}"
+
+    # a_prometheus
+    # Mediciones en formato de texto de Prometheus.
+    # Parámetros:
+    # etiquetas - etiquetas comunes (p. ej. {"meter": SN, "log": "Historic 1"})
+    def a_prometheus(self,etiquetas=None):
+        datos = self.a_dict()
+        base = ",".join(f'{k}="{v}"' for k,v in (etiquetas or {}).items())
+        def etiquetar(**extra):
+            texto = ",".join(filter(None,[base]+[f'{k}="{v}"' for k,v in extra.items()]))
+            return "{"+texto+"}" if texto else ""
+        lineas = ["# TYPE shark270_requests_total counter","# TYPE shark270_request_errors_total counter",
+                  "# TYPE shark270_bytes_sent_total counter","# TYPE shark270_bytes_received_total counter",
+                  "# TYPE shark270_request_latency_ms histogram"]
+        for tipo,s in datos["requests"].items():
+            lineas.append(f"shark270_requests_total{etiquetar(type=tipo)} {s['count']}")
+            lineas.append(f"shark270_request_errors_total{etiquetar(type=tipo)} {s['errors']}")
+            lineas.append(f"shark270_bytes_sent_total{etiquetar(type=tipo)} {s['bytes_sent']}")
+            lineas.append(f"shark270_bytes_received_total{etiquetar(type=tipo)} {s['bytes_received']}")
+            acumulado = 0
+            for limite,cantidad in zip(LATENCY_BUCKETS_MS+["+Inf"],s["buckets"]):
+                acumulado += cantidad
+                lineas.append(f"shark270_request_latency_ms_bucket{etiquetar(type=tipo,le=limite)} {acumulado}")
+            lineas.append(f"shark270_request_latency_ms_sum{etiquetar(type=tipo)} {s['latency_ms_sum']:.3f}")
+            lineas.append(f"shark270_request_latency_ms_count{etiquetar(type=tipo)} {acumulado}")
+        lineas.append("# TYPE shark270_busy_spins_total counter")
+        lineas.append(f"shark270_busy_spins_total{etiquetar()} {datos['busy_spins']}")
+        lineas.append("# TYPE shark270_phase_seconds_total counter")
+        for fase,segundos in sorted(datos["phases"].items()):
+            lineas.append(f"shark270_phase_seconds_total{etiquetar(phase=fase)} {segundos:.6f}")
+        return "\n".join(lineas)+"\n"
+
+    # guardar
+    # Guarda las mediciones: formato Prometheus si la ruta termina en .prom, JSON en otro caso. Si el perfil está habilitado
+    # se guarda también, junto al JSON, en {ruta}.pstats con los perfiles de todos los hilos (ver con python -m pstats).
+    # Parámetros:
+    # ruta - archivo de destino
+    # etiquetas - etiquetas de Prometheus
+    def guardar(self,ruta,etiquetas=None):
+        with open(ruta,"w",encoding="utf-8") as f:
+            if ruta.endswith(".prom"):
+                f.write(self.a_prometheus(etiquetas))
+            else:
+                json.dump(dict(self.a_dict(),labels=etiquetas or {}),f,indent=1)
+        with self.lock:
+            perfiles = list(self.perfiles)
+        if perfiles and not ruta.endswith(".prom"):
+            import pstats
+            stats = pstats.Stats(perfiles[0])
+            for perfil in perfiles[1:]:
+                stats.add(perfil)
+            stats.dump_stats(f"{ruta}.pstats")
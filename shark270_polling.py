@@ -0,0 +1,125 @@
+import time
+import threading
+from collections import namedtuple
+from shark270_core import interpretar_registros
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Polling continuo por grupos de lectura
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Un grupo de lectura (ScanGroup) es un rango de registros que se interpreta en un formato y se lee cada cierto intervalo.
+# En cada ciclo se leen los grupos cuyo intervalo se cumplió, uniendo los rangos contiguos o superpuestos en la menor cantidad
+# de solicitudes read_holding_registers posible (máximo 125 registros por solicitud, límite de Modbus). Cada grupo se interpreta
+# desde los bytes de la respuesta (Shark270.leer_bytes). Las lecturas se realizan en un hilo aparte y cada grupo se reporta con
+# on_update, que recibe sólo los registros cuyo valor cambió.
+
+MAX_REGS_PER_READ = 125
+
+# ScanGroup
+# start - registro donde inicia el grupo (base 1)
+# count - cantidad de registros
+# format - formato para interpretar los registros (DATA_FORMATS)
+# interval - intervalo de lectura en segundos
+ScanGroup = namedtuple("ScanGroup",["start","count","format","interval"])
+
+# agrupar_lecturas
+# Une los rangos de los grupos en bloques de lectura.
+# Parámetros:
+# grupos - grupos a leer
+# max_regs - máximo de registros por solicitud
+# Retorna una lista de (registro inicial, cantidad) ordenada por registro
+def agrupar_lecturas(grupos,max_regs=MAX_REGS_PER_READ):
+    rangos = sorted((g.start,g.start+g.count) for g in grupos if g.count > 0)
+    bloques = []
+    for inicio,fin in rangos:
+        if bloques and inicio <= bloques[-1][1]:
+            bloques[-1][1] = max(bloques[-1][1],fin)
+        else:
+            bloques.append([inicio,fin])
+
+    # Dividir los bloques que exceden el límite de registros por solicitud
+    lecturas = []
+    for inicio,fin in bloques:
+        while inicio < fin:
+            cantidad = min(fin-inicio,max_regs)
+            lecturas.append((inicio,cantidad))
+            inicio += cantidad
+    return lecturas
+
+# PollingEngine
+# Lee periódicamente los grupos de un medidor en un hilo aparte.
+# Parámetros:
+# meter - medidor conectado (shark270_core.Shark270)
+# grupos - lista de ScanGroup
+# on_update - función(indice del grupo, filas cambiadas) con filas [(posición en el grupo, registro, hex, valor), ...]
+# on_error - función(excepción) al fallar una lectura; el polling se detiene
+# min_interval - tiempo mínimo entre ciclos en segundos
+# recorder - TimeSeriesRecorder donde se registran todos los valores leídos (shark270_recorder.py), opcional
+class PollingEngine:
+    def __init__(self,meter,grupos,on_update,on_error=None,min_interval=0.1,recorder=None):
+        self.meter = meter
+        self.grupos = list(grupos)
+        self.on_update = on_update
+        self.on_error = on_error
+        self.min_interval = min_interval
+        self.recorder = recorder
+        self.ultimos = [None]*len(self.grupos)    # Última lectura de cada grupo, para reportar sólo los cambios
+        self.detener = threading.Event()
+        self.hilo = None
+        self.ciclos = 0
+        self.lecturas = 0
+
+    def iniciar(self):
+        self.detener.clear()
+        self.hilo = threading.Thread(target=self._ejecutar,daemon=True)
+        self.hilo.start()
+
+    def parar(self):
+        self.detener.set()
+
+    # leer_grupos
+    # Lee una vez los grupos indicados y reporta los registros que cambiaron.
+    # Parámetros:
+    # indices - posiciones de los grupos en self.grupos
+    def leer_grupos(self,indices):
+        bloques = []    # (registro inicial, bytes big-endian de la respuesta)
+        t = time.time()
+        for inicio,cantidad in agrupar_lecturas([self.grupos[i] for i in indices]):
+            bloques.append((inicio,self.meter.leer_bytes(inicio-1,cantidad)))
+            self.lecturas += 1
+
+        for i in indices:
+            g = self.grupos[i]
+            # Los bytes del grupo son vistas de las respuestas; sólo un grupo dividido entre dos lecturas se une en una copia
+            partes = [datos[2*max(g.start-inicio,0):2*(g.start+g.count-inicio)] for inicio,datos in bloques
+                      if inicio < g.start+g.count and inicio+len(datos)//2 > g.start]
+            filas = interpretar_registros(g.start,partes[0] if len(partes) == 1 else b"".join(partes),g.format)
+            if self.recorder is not None:
+                self.recorder.registrar_filas(t,filas,g.format)
+            anteriores = self.ultimos[i] or [None]*len(filas)
+            self.ultimos[i] = filas
+            # Se reportan las filas cuyo valor hexadecimal o interpretado cambió
+            cambios = [(k,*fila) for k,(fila,previa) in enumerate(zip(filas,anteriores)) if fila != previa]
+            if cambios:
+                self.on_update(i,cambios)
+
+    def _ejecutar(self):
+        if not self.grupos:
+            return
+        siguiente = [time.monotonic()]*len(self.grupos)
+        while not self.detener.is_set():
+            ahora = time.monotonic()
+            pendientes = [i for i in range(len(self.grupos)) if siguiente[i] <= ahora]
+            if pendientes:
+                try:
+                    self.leer_grupos(pendientes)
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(e)
+                    return
+                self.ciclos += 1
+                for i in pendientes:
+                    # Mantener la cadencia del grupo; si la lectura se atrasó más de un intervalo, continuar desde ahora
+                    siguiente[i] = max(siguiente[i]+self.grupos[i].interval,ahora)
+            espera = min(siguiente)-time.monotonic()
+            self.detener.wait(max(espera,self.min_interval))
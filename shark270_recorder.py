@@ -0,0 +1,149 @@
+import os
+import threading
+import numpy as np
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Registro de series de tiempo del Polling
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Guarda los valores leídos en el Polling por serie: un registro leído en un formato (serie, p. ej. "1000_FLOAT"), ya que el
+# mismo registro interpretado en otro formato es otra serie. Se utiliza un TimeSeriesRecorder (una carpeta) por medidor. Las
+# últimas muestras de cada registro se mantienen en un buffer circular de NumPy de tamaño fijo (consulta inmediata para graficar
+# o mostrar), y las muestras más antiguas se escriben en disco antes de ser reemplazadas, por lo que la memoria utilizada no
+# crece con el tiempo de registro.
+# Archivos en disco:
+#   - {carpeta}/{serie}/{inicio del bloque}.bin: muestras (timestamp epoch float64, valor float64) little-endian, agrupadas en
+#       bloques de chunk_seconds segundos. Los archivos sólo se agregan (append), cada escritura es un lote de muestras.
+#   - Una consulta por rango de tiempo lee sólo los bloques que se superponen con el rango.
+# Sólo se registran valores numéricos (los formatos TSTAMP y ASCII se omiten).
+
+SAMPLE_DTYPE = np.dtype([("t","<f8"),("v","<f8")])
+
+# serie
+# Nombre de la serie de un registro leído en un formato.
+# Parámetros:
+# reg - número de registro
+# formato - formato de interpretación (DATA_FORMATS)
+def serie(reg,formato):
+    return f"{reg}_{formato}"
+
+# RingBuffer
+# Últimas muestras de una serie.
+# Parámetros:
+# capacidad - cantidad de muestras en memoria
+class RingBuffer:
+    def __init__(self,capacidad):
+        self.datos = np.zeros(capacidad,dtype=SAMPLE_DTYPE)
+        self.capacidad = capacidad
+        self.escritos = 0   # Muestras recibidas
+        self.guardados = 0  # Muestras escritas en disco (las más antiguas)
+
+    def agregar(self,t,v):
+        self.datos[self.escritos%self.capacidad] = (t,v)
+        self.escritos += 1
+
+    # rango
+    # Retorna las muestras [desde, hasta) por número de muestra, en orden. Deben estar todavía en el buffer.
+    def rango(self,desde,hasta):
+        indices = np.arange(desde,hasta)%self.capacidad
+        return self.datos[indices]
+
+# TimeSeriesRecorder
+# Parámetros:
+# carpeta - carpeta donde se escriben las muestras antiguas (None: sólo memoria, las muestras antiguas se descartan)
+# capacidad - muestras por registro en memoria
+# chunk_seconds - duración de cada bloque en disco
+class TimeSeriesRecorder:
+    def __init__(self,carpeta=None,capacidad=3600,chunk_seconds=3600):
+        self.carpeta = carpeta
+        self.capacidad = capacidad
+        self.chunk_seconds = chunk_seconds
+        self.series = {}
+        self.lock = threading.Lock()
+
+    # registrar
+    # Agrega una muestra por serie.
+    # Parámetros:
+    # t - timestamp epoch en segundos (time.time())
+    # valores - {serie: valor}
+    def registrar(self,t,valores):
+        with self.lock:
+            for serie,v in valores.items():
+                buffer = self.series.get(serie)
+                if buffer is None:
+                    buffer = self.series[serie] = RingBuffer(self.capacidad)
+                if buffer.escritos-buffer.guardados == self.capacidad:
+                    # El buffer está lleno de muestras sin guardar: escribir la mitad más antigua en un solo lote
+                    self._guardar(serie,buffer,buffer.guardados+max(self.capacidad//2,1))
+                buffer.agregar(t,v)
+
+    # registrar_filas
+    # Agrega las filas interpretadas de una lectura (shark270_core.interpretar_registros), una serie por registro y formato.
+    # Parámetros:
+    # t - timestamp epoch en segundos
+    # filas - [(registro, hex, valor), ...]
+    # formato - formato con el que se interpretaron las filas
+    def registrar_filas(self,t,filas,formato):
+        self.registrar(t,{serie(reg,formato):value for reg,bytes_value,value in filas
+                          if isinstance(value,(int,float)) and not isinstance(value,bool)})
+
+    def _guardar(self,serie,buffer,hasta):
+        muestras = buffer.rango(buffer.guardados,hasta)
+        buffer.guardados = hasta
+        if self.carpeta is None or len(muestras) == 0:
+            return
+        carpeta = os.path.join(self.carpeta,str(serie))
+        os.makedirs(carpeta,exist_ok=True)
+        bloques = (muestras["t"]//self.chunk_seconds).astype(np.int64)
+        cortes = np.flatnonzero(np.diff(bloques))+1
+        for parte in np.split(muestras,cortes):
+            inicio = int(parte["t"][0]//self.chunk_seconds)*self.chunk_seconds
+            with open(os.path.join(carpeta,f"{inicio}.bin"),"ab") as f:
+                f.write(parte.tobytes())
+
+    # flush
+    # Escribe en disco todas las muestras pendientes (p. ej. al detener el Polling). Las muestras se mantienen en memoria.
+    def flush(self):
+        with self.lock:
+            for serie,buffer in self.series.items():
+                self._guardar(serie,buffer,buffer.escritos)
+
+    # ultimos
+    # Retorna las últimas n muestras en memoria de una serie, como arreglos (t, v).
+    def ultimos(self,serie,n=None):
+        with self.lock:
+            buffer = self.series.get(serie)
+            if buffer is None:
+                return np.empty(0),np.empty(0)
+            disponibles = min(buffer.escritos,self.capacidad)
+            n = disponibles if n is None else min(n,disponibles)
+            muestras = buffer.rango(buffer.escritos-n,buffer.escritos)
+        return muestras["t"],muestras["v"]
+
+    # consultar
+    # Retorna las muestras de una serie con t0 <= t < t1, de disco y de memoria, como arreglos (t, v).
+    # Parámetros:
+    # serie - nombre de la serie (ver serie)
+    # t0, t1 - rango de tiempo epoch en segundos
+    def consultar(self,serie,t0,t1):
+        partes = []
+        # Se lee el disco con el lock tomado para que ninguna muestra pase del buffer al disco durante la consulta
+        with self.lock:
+            if self.carpeta is not None:
+                carpeta = os.path.join(self.carpeta,str(serie))
+                inicio = int(t0//self.chunk_seconds)*self.chunk_seconds
+                if os.path.isdir(carpeta):
+                    for nombre in sorted(os.listdir(carpeta),key=lambda x: int(x.split(".")[0])):
+                        bloque = int(nombre.split(".")[0])
+                        if inicio <= bloque < t1:
+                            partes.append(np.fromfile(os.path.join(carpeta,nombre),dtype=SAMPLE_DTYPE))
+            buffer = self.series.get(serie)
+            if buffer is not None:
+                # Las muestras ya guardadas se leyeron del disco
+                desde = buffer.guardados if self.carpeta is not None else buffer.escritos-min(buffer.escritos,self.capacidad)
+                partes.append(buffer.rango(desde,buffer.escritos))
+        if not partes:
+            return np.empty(0),np.empty(0)
+        muestras = np.concatenate(partes)
+        muestras = muestras[(muestras["t"] >= t0) & (muestras["t"] < t1)]
+        return muestras["t"],muestras["v"]
@@ -0,0 +1,141 @@
+import numpy as np
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Almacenamiento compacto de records
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Los records decodificados de un Histórico se guardan en columnas tipadas de NumPy en lugar de listas de objetos de Python:
+#   - Numéricas: el tipo del formato en el orden de bytes nativo (float32, int32, uint16, ...), float64 si se escalan /100.
+#   - TSTAMP: segundos epoch int64 (la hora del medidor, sin zona horaria). El texto "dd/mm/20yy hh:mm:ss" se genera sólo al
+#       exportar. Un timestamp inválido (p. ej. mes 0) se guarda como TSTAMP_NULO y se exporta como 'NaT'.
+#   - ASCII: los bytes de cada valor (arreglo (n, ancho) uint8).
+# Un valor ocupa de 2 a 8 bytes en lugar de los 24-80 bytes de un float, int o texto de Python más la referencia en la lista.
+
+TSTAMP_NULO = np.iinfo(np.int64).min
+_MES_BASE = np.datetime64("2000-01","M")
+
+# tstamp_a_epoch
+# Convierte timestamps [año, mes, día, hora, minuto, segundo] (ya enmascarados, año desde 2000) a segundos epoch.
+# Parámetros:
+# tstamps - arreglo (n, 6) de enteros
+# Retorna un arreglo int64 de n valores (TSTAMP_NULO si la fecha no es válida).
+def tstamp_a_epoch(tstamps):
+    t = np.asarray(tstamps,dtype=np.int64).reshape(-1,6)
+    y,m,d,h,mi,s = t.T
+    meses = _MES_BASE+(y*12+m-1)
+    dias = meses.astype("datetime64[D]")+(d-1)
+    valido = (m >= 1) & (m <= 12) & (d >= 1) & (h < 24) & (mi < 60) & (s < 60) & (dias.astype("datetime64[M]") == meses)
+    epoch = dias.astype("datetime64[s]").astype(np.int64)+h*3600+mi*60+s
+    return np.where(valido,epoch,TSTAMP_NULO)
+
+# epoch_a_tstamp
+# Conversión inversa de tstamp_a_epoch.
+# Retorna (arreglo (n, 6) int64 [año desde 2000, mes, día, hora, minuto, segundo], máscara de valores válidos).
+def epoch_a_tstamp(epoch):
+    epoch = np.asarray(epoch,dtype=np.int64)
+    valido = epoch != TSTAMP_NULO
+    epoch = np.where(valido,epoch,0)
+    segundos = epoch.astype("datetime64[s]")
+    meses = segundos.astype("datetime64[M]")
+    dias = segundos.astype("datetime64[D]")
+    del_dia = epoch-dias.astype("datetime64[s]").astype(np.int64)
+    meses_1970 = meses.astype(np.int64)
+    tstamps = np.stack([meses_1970//12-30,meses_1970%12+1,(dias-meses.astype("datetime64[D]")).astype(np.int64)+1,
+                        del_dia//3600,del_dia//60%60,del_dia%60],axis=-1)
+    return tstamps,valido
+
+# formatear_epoch
+# Da formato "dd/mm/20yy hh:mm:ss" (igual que reg2var) a segundos epoch.
+def formatear_epoch(epoch):
+    tstamps,valido = epoch_a_tstamp(epoch)
+    return [f"{d:02}/{m:02}/20{y:02} {h:02}:{mi:02}:{s:02}" if ok else 'NaT'
+            for (y,m,d,h,mi,s),ok in zip(tstamps.tolist(),valido.tolist())]
+
+# RecordStore
+# Records de un log en columnas tipadas, con capacidad que crece al doble cuando se llena (los lotes se agregan sin copiar
+# los records anteriores en cada lote). vaciar() reutiliza la memoria para el siguiente lote.
+# Parámetros:
+# titulos - encabezados de las columnas
+# tipos - (formato, tipo NumPy, forma de un valor) por columna, ver RecordDecoder.tipos
+# capacidad - records reservados inicialmente
+class RecordStore:
+    def __init__(self,titulos,tipos,capacidad=1024):
+        self.titulos = titulos
+        self.tipos = tipos
+        self.n = 0
+        self.columnas = [np.empty((capacidad,)+forma,dtype=tipo) for formato,tipo,forma in tipos]
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacidad(self):
+        return len(self.columnas[0]) if self.columnas else 0
+
+    # nbytes
+    # Memoria reservada por las columnas en bytes.
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.columnas)
+
+    def vaciar(self):
+        self.n = 0
+
+    def _reservar(self,n):
+        if n <= self.capacidad:
+            return
+        capacidad = max(n,2*self.capacidad)
+        for i,columna in enumerate(self.columnas):
+            nueva = np.empty((capacidad,)+columna.shape[1:],dtype=columna.dtype)
+            nueva[:self.n] = columna[:self.n]
+            self.columnas[i] = nueva
+
+    # agregar
+    # Agrega un lote de records.
+    # Parámetros:
+    # columnas - un arreglo por columna, todos con la misma cantidad de records
+    def agregar(self,columnas):
+        m = len(columnas[0]) if columnas else 0
+        self._reservar(self.n+m)
+        for columna,datos in zip(self.columnas,columnas):
+            columna[self.n:self.n+m] = datos
+        self.n += m
+
+    # columna
+    # Retorna la columna i (vista de los records guardados, sin copiar).
+    def columna(self,i):
+        return self.columnas[i][:self.n]
+
+    # ultimo_tstamp
+    # Retorna el timestamp [año, mes, día, hora, minuto, segundo] del último record (columna 0), o None.
+    def ultimo_tstamp(self):
+        if self.n == 0 or self.tipos[0][0] != "TSTAMP":
+            return None
+        tstamps,valido = epoch_a_tstamp(self.columnas[0][self.n-1:self.n])
+        return tstamps[0].tolist() if valido[0] else None
+
+    # valores
+    # Retorna la columna i como lista de valores de Python con el formato de exportación (TSTAMP como texto, NaN como 'NaN').
+    def valores(self,i):
+        formato = self.tipos[i][0]
+        datos = self.columna(i)
+        if formato == "TSTAMP":
+            return formatear_epoch(datos)
+        if formato == "ASCII":
+            return [bytes(v).decode('latin1') for v in datos]
+        if datos.dtype.kind == 'f':
+            return ['NaN' if v != v else v for v in datos.tolist()]
+        return datos.tolist()
+
+    # iter_filas
+    # Itera las filas con los mismos valores que RecordDecoder.a_filas (como tuplas), para escribir un lote en CSV. Las filas
+    # se generan a medida que se escriben: zip reutiliza la tupla de la fila cuando el writer ya no la referencia.
+    def iter_filas(self):
+        if self.n == 0:
+            return iter(())
+        return zip(*[self.valores(i) for i in range(len(self.columnas))])
+
+    # a_filas
+    # Lista de las filas de iter_filas.
+    def a_filas(self):
+        return list(self.iter_filas())
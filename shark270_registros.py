@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+from collections import namedtuple
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Catálogo de registros del medidor
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Índice de la tabla "Shark270-Meter-Readings-Register-Table.xlsx" por número de registro, construido una sola vez al cargar la
+# tabla. Las búsquedas por registro son O(1) (diccionario), en lugar de recorrer la tabla completa con pandas en cada consulta.
+# Columnas de la tabla:
+#   - Reg#: número de registro (base 1, como en la guía del protocolo)
+#   - Size: tamaño en registros
+#   - Description: nombre de la medición
+#   - Format: formato de interpretación (TSTAMP, UINT32/16, SINT32/16, FLOAT, ASCII)
+# La tabla es la del fabricante y se conserva sin cambios (se puede reemplazar por una versión nueva). Los registros que son
+# arreglos de valores independientes no se indican en la tabla, se agregan al catálogo desde REGISTROS_ARREGLO.
+# Leer el .xlsx requiere pandas y openpyxl, y es la mayor parte del tiempo de inicio de la aplicación. Por eso el catálogo se
+# guarda compilado en {directorio_cache}/register_table.json y sólo se vuelve a leer el .xlsx (importando pandas en ese
+# momento) cuando el archivo cambia: primero se compara la fecha de modificación y el tamaño, y si difieren, el hash SHA-256.
+# La caché está en la carpeta de caché del usuario (fuera del paquete, que puede ser de sólo lectura); si no se puede escribir,
+# el catálogo se compila en cada inicio.
+
+# RegisterInfo
+# Información de un registro del catálogo.
+# reg - número de registro (base 1)
+# name - descripción de la medición
+# size - tamaño en registros
+# format - formato de interpretación
+# scale - el valor se divide entre 100 (la descripción contiene '%' o 'Phase')
+# is_array - el registro es un arreglo de valores de 1 registro
+RegisterInfo = namedtuple("RegisterInfo",["reg","name","size","format","scale","is_array"])
+
+# Registros que son arreglos de valores independientes (armónicos y samples de la forma de onda), que en los logs se exportan
+# como una columna por elemento "{Description} (n)".
+REGISTROS_ARREGLO = frozenset([18018,18082,18146,18210,18274,18338,18402,18465,18528,18591,18654,18717,18780,18843,18906,
+                               18969,19032,19095])
+
+# RegisterCatalog
+# Catálogo de registros indexado por número de registro.
+# Parámetros:
+# registros - secuencia de RegisterInfo
+class RegisterCatalog:
+    def __init__(self,registros):
+        self.indice = {info.reg:info for info in registros}
+        self.huella = None  # Versión de la tabla .xlsx de origen y de REGISTROS_ARREGLO (cargar_catalogo)
+
+    # desde_tabla
+    # Construye el catálogo a partir de la tabla de registros leída con pandas.
+    # Parámetros:
+    # reg_table - DataFrame con las columnas Reg#, Size, Description y Format
+    # arreglos - números de registro que son arreglos
+    @classmethod
+    def desde_tabla(cls,reg_table,arreglos=REGISTROS_ARREGLO):
+        registros = []
+        for reg,size,name,format in zip(reg_table['Reg#'],reg_table['Size'],reg_table['Description'],reg_table['Format']):
+            name = str(name)
+            registros.append(RegisterInfo(int(reg),name,int(size),str(format),('%' in name) or ('Phase' in name),
+                                          int(reg) in arreglos))
+        return cls(registros)
+
+    # desde_dict
+    # Construye el catálogo a partir de la forma compilada (ver a_dict).
+    # Parámetros:
+    # datos - diccionario con la lista "registros"
+    @classmethod
+    def desde_dict(cls,datos):
+        return cls([RegisterInfo(*fila) for fila in datos["registros"]])
+
+    # a_dict
+    # Forma compacta del catálogo para guardarlo en caché: una lista por registro con los campos de RegisterInfo.
+    def a_dict(self):
+        return {"registros":[list(info) for info in self]}
+
+    # buscar
+    # Retorna la información de un registro, o None si no está documentado.
+    # Parámetros:
+    # reg - número de registro (base 1)
+    def buscar(self,reg):
+        return self.indice.get(reg)
+
+    def __contains__(self,reg):
+        return reg in self.indice
+
+    def __len__(self):
+        return len(self.indice)
+
+    def __iter__(self):
+        return iter(sorted(self.indice.values()))
+
+# directorio_cache
+# Carpeta de las cachés persistentes (catálogo de registros y formatos de log, shark270_layouts.py).
+# Parámetros:
+# carpeta - carpeta elegida (None: variable de entorno SHARK270_CACHE_DIR, o %LOCALAPPDATA%\Shark270 en Windows y
+#           $XDG_CACHE_HOME/shark270 o ~/.cache/shark270 en el resto)
+def directorio_cache(carpeta=None):
+    carpeta = carpeta or os.environ.get("SHARK270_CACHE_DIR")
+    if carpeta:
+        return carpeta
+    if os.name == "nt":
+        return os.path.join(os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"),"AppData","Local"),"Shark270")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"),".cache"),"shark270")
+
+CACHE_NAME = "register_table.json"
+CACHE_PATH = os.path.join(directorio_cache(),CACHE_NAME)
+CACHE_VERSION = 2
+
+def _hash_archivo(ruta):
+    with open(ruta,"rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _guardar_cache(ruta_cache,datos):
+    if ruta_cache is None:
+        return
+    tmp = f"{ruta_cache}.tmp"
+    try:
+        os.makedirs(os.path.dirname(ruta_cache) or ".",exist_ok=True)
+        with open(tmp,"w",encoding="utf-8") as f:
+            json.dump(datos,f,separators=(",",":"))
+        os.replace(tmp,ruta_cache)
+    except OSError:
+        # Sin permisos de escritura (PermissionError) o sin espacio: sin caché, el catálogo se compila de nuevo en el siguiente
+        # inicio
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+# cargar_catalogo
+# Carga el catálogo desde la caché compilada, o lee la tabla .xlsx y actualiza la caché si el archivo cambió.
+# Parámetros:
+# ruta_tabla - archivo Shark270-Meter-Readings-Register-Table.xlsx
+# ruta_cache - archivo de la caché compilada (None: sin caché)
+def cargar_catalogo(ruta_tabla,ruta_cache=CACHE_PATH):
+    stat = os.stat(ruta_tabla)
+    try:
+        with open(ruta_cache,encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") != CACHE_VERSION or cache.get("arreglos") != sorted(REGISTROS_ARREGLO):
+            cache = None
+    except (OSError,TypeError,ValueError):
+        cache = None
+
+    if cache is not None:
+        if cache["mtime_ns"] == stat.st_mtime_ns and cache["size"] == stat.st_size:
+            return _con_huella(RegisterCatalog.desde_dict(cache),cache["sha256"])
+        sha256 = _hash_archivo(ruta_tabla)
+        if cache["sha256"] == sha256:
+            # Mismo contenido con otra fecha (p. ej. copiado de otra computadora)
+            cache["mtime_ns"] = stat.st_mtime_ns
+            cache["size"] = stat.st_size
+            _guardar_cache(ruta_cache,cache)
+            return _con_huella(RegisterCatalog.desde_dict(cache),sha256)
+    else:
+        sha256 = _hash_archivo(ruta_tabla)
+
+    import pandas as pd
+    catalogo = RegisterCatalog.desde_tabla(pd.read_excel(ruta_tabla))
+    cache = {"version":CACHE_VERSION,"mtime_ns":stat.st_mtime_ns,"size":stat.st_size,"sha256":sha256,
+             "arreglos":sorted(REGISTROS_ARREGLO)}
+    cache.update(catalogo.a_dict())
+    _guardar_cache(ruta_cache,cache)
+    return _con_huella(catalogo,sha256)
+
+# _con_huella
+# La huella del catálogo identifica la tabla (SHA-256 del .xlsx) y la lista de arreglos, de las que dependen los formatos de
+# log guardados (shark270_layouts.py).
+def _con_huella(catalogo,sha256):
+    catalogo.huella = hashlib.sha256(f"{sha256}/{sorted(REGISTROS_ARREGLO)}".encode()).hexdigest()
+    return catalogo
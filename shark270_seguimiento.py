@@ -0,0 +1,270 @@
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import argparse
+from shark270_core import Shark270, LOGS, TRANSFER_MODES
+from shark270_export import EXPORT_FORMATS
+from shark270_records import tstamp_a_epoch, TSTAMP_NULO
+from shark270_cli import parse_meter
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Seguimiento de los logs en vivo
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Sigue los Históricos de un medidor a medida que registra records nuevos, sin repetir la recuperación completa:
+#   - Vigilancia: se lee el bloque de estado de los logs seguidos (records utilizados y timestamp del último record) en una sola
+#       solicitud, sin tomar la sesión de recuperación (Shark270.leer_estados_logs).
+#   - Cuando el estado de un log cambia se abre una sesión corta y se recuperan sólo las ventanas de los records nuevos
+#       (recuperación incremental, retrieval_state.json). Los records se agregan al archivo de exportación y se envían a los
+#       suscriptores (tabla de la interfaz, callback o PublicadorTCP). Un log lleno que rota se detecta por el último timestamp.
+#   - Planificación: con los timestamps de los records nuevos se estima el intervalo de registro de cada log y el desfase entre
+#       la hora local y la del medidor (el mínimo observado al detectar un record, una cota superior). El estado se consulta desde
+#       MARGEN segundos antes del siguiente record esperado y cada MARGEN/2 segundos hasta MARGEN segundos después; cada detección
+#       anticipada reduce el desfase, por lo que un record se detecta poco después de registrarse con pocas consultas por record.
+#       Mientras no hay estimación, o si el record esperado se atrasa, las consultas se espacian del intervalo mínimo al máximo.
+# La primera consulta recupera los records pendientes desde la última recuperación (el archivo queda al día antes de seguirlo).
+# Uso:
+#   python shark270_seguimiento.py --meter 192.168.0.90 --logs "Historic 1" "Historic 2" [--publish-port 7020]
+
+MARGEN = 1.0            # Segundos antes y después del siguiente record esperado en que se consulta el estado
+INTERVALO_MAX = 60      # Espera máxima entre consultas del estado en segundos
+PUBLISH_PORT = 7020
+
+# epoch_medidor
+# Convierte un timestamp [año, mes, día, hora, minuto, segundo] del medidor a segundos epoch, o None si no es válido.
+def epoch_medidor(tstamp):
+    if tstamp is None:
+        return None
+    epoch = int(tstamp_a_epoch([tstamp])[0])
+    return None if epoch == TSTAMP_NULO else epoch
+
+# SeguimientoLogs
+# Sigue los Históricos de un medidor conectado en un hilo aparte.
+# Parámetros:
+# meter - medidor conectado (shark270_core.Shark270)
+# logs - Históricos a seguir
+# export_format, carpeta, transfer_mode - ver Shark270.retlog
+# intervalo - espera máxima entre consultas del estado en segundos
+# intervalo_min - espera mínima entre consultas del estado en segundos
+# margen - segundos antes y después del siguiente record esperado en que se consulta el estado
+# on_status - callback(mensaje) para los mensajes de estado
+# on_error - función(excepción) al fallar una consulta o una recuperación; el seguimiento continúa en la siguiente consulta
+class SeguimientoLogs:
+    def __init__(self,meter,logs,export_format="CSV",carpeta="ExportedLogs",transfer_mode="Standard",intervalo=INTERVALO_MAX,
+                 intervalo_min=1,margen=MARGEN,on_status=None,on_error=None):
+        self.meter = meter
+        self.logs = list(logs)
+        self.export_format = export_format
+        self.carpeta = carpeta
+        self.transfer_mode = transfer_mode
+        self.intervalo = intervalo
+        self.intervalo_min = min(intervalo_min,intervalo)
+        self.margen = margen
+        self.on_status = on_status or (lambda msg: None)
+        self.on_error = on_error
+        self.suscriptores = []
+        self.vistos = {}        # log -> (records utilizados, último timestamp) de la última recuperación
+        self.ultimo_epoch = {}  # log -> timestamp epoch (hora del medidor) del último record
+        self.periodo = {}       # log -> intervalo de registro estimado en segundos
+        self.desfase = {}       # log -> hora local - hora del medidor, mínimo observado al detectar un record
+        self.espera = self.intervalo_min    # Espera mientras no hay un record esperado (crece al doble sin records nuevos)
+        self.detener = threading.Event()
+        self.hilo = None
+        self.consultas = 0
+        self.sesiones = 0
+        self.records = 0
+
+    # suscribir
+    # Agrega un suscriptor: función(SN, log, titulos, filas) con las filas de cada lote (valores con el formato de exportación).
+    # Se llama desde el hilo de exportación; un suscriptor que falla no detiene el seguimiento.
+    def suscribir(self,funcion):
+        self.suscriptores.append(funcion)
+
+    def iniciar(self):
+        self.detener.clear()
+        self.hilo = threading.Thread(target=self._ejecutar,daemon=True)
+        self.hilo.start()
+
+    # parar
+    # Detiene el seguimiento; una recuperación en curso termina de exportar los records nuevos.
+    def parar(self):
+        self.detener.set()
+
+    # revisar
+    # Consulta el estado de los logs y recupera los que tienen records nuevos.
+    # Retorna la lista de logs recuperados.
+    def revisar(self):
+        estados = self.meter.leer_estados_logs(self.logs)
+        self.consultas += 1
+        ahora = time.time()
+        nuevos = [log for log in self.logs if estados[log] != self.vistos.get(log)]
+        if not nuevos:
+            return []
+        # Los mensajes de estado de cada sesión corta se omiten, sólo se reportan las advertencias
+        resultados = self.meter.retlogs(nuevos,self.export_format,True,self.carpeta,on_warning=self.on_status,
+                                        transfer_mode=self.transfer_mode,on_records=self._publicar)
+        self.sesiones += 1
+        for log,resultado in resultados.items():
+            if not resultado["cancelled"]:
+                self._actualizar(log,estados[log],resultado["records"],ahora)
+        return list(resultados)
+
+    # _actualizar
+    # Actualiza el estado visto de un log y la estimación de su intervalo de registro.
+    # Parámetros:
+    # log - Histórico recuperado
+    # estado - (records utilizados, último timestamp) leído antes de la recuperación
+    # records - records recuperados
+    # ahora - hora local de la consulta del estado
+    def _actualizar(self,log,estado,records,ahora):
+        usados_antes = self.vistos.get(log,(None,None))[0]
+        self.vistos[log] = estado
+        epoch = epoch_medidor(estado[1])
+        if epoch is None:
+            return
+        anterior = self.ultimo_epoch.get(log)
+        self.ultimo_epoch[log] = epoch
+        self.desfase[log] = min(self.desfase.get(log,ahora-epoch),ahora-epoch)
+        # Records nuevos hasta el timestamp leído; si el log está lleno (rota) se utilizan los records recuperados
+        nuevos = estado[0]-usados_antes if usados_antes is not None and estado[0] > usados_antes else records
+        if anterior is not None and epoch > anterior and nuevos > 0:
+            self.periodo[log] = (epoch-anterior)/nuevos
+
+    # siguiente_consulta
+    # Retorna la hora local (epoch) de la siguiente consulta del estado.
+    def siguiente_consulta(self):
+        ahora = time.time()
+        # Hora local en que el siguiente record de cada log ya debería estar registrado
+        esperados = [self.ultimo_epoch[log]+self.periodo[log]+self.desfase[log] for log in self.logs if log in self.periodo]
+        pendientes = [t for t in esperados if t+self.margen > ahora]
+        if not pendientes:
+            return ahora+self.espera
+        proximo = min(pendientes)
+        if proximo-self.margen > ahora:
+            return min(proximo-self.margen,ahora+self.intervalo)
+        return ahora+self.margen/2
+
+    def _publicar(self,log,store):
+        self.records += len(store)
+        if not self.suscriptores:
+            return
+        filas = store.a_filas()
+        for funcion in self.suscriptores:
+            try:
+                funcion(self.meter.meter_SN.strip(),log,store.titulos,filas)
+            except Exception as e:
+                self.on_status(f"/!\\ Error en un suscriptor del seguimiento. {e}")
+
+    def _ejecutar(self):
+        while not self.detener.is_set():
+            try:
+                if self.revisar():
+                    self.espera = self.intervalo_min
+                else:
+                    self.espera = min(self.espera*2,self.intervalo)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+                self.espera = self.intervalo
+            self.detener.wait(max(self.siguiente_consulta()-time.time(),0))
+
+# PublicadorTCP
+# Envía los records de los suscriptores a los clientes conectados por TCP, una línea JSON por record:
+#   {"SN": ..., "log": ..., "record": {encabezado: valor, ...}}
+# Un cliente que no recibe los datos en timeout segundos se desconecta para no retrasar el seguimiento.
+# Parámetros:
+# host, port - dirección de escucha
+# timeout - tiempo máximo de envío a un cliente en segundos
+class PublicadorTCP:
+    def __init__(self,host="127.0.0.1",port=PUBLISH_PORT,timeout=1):
+        self.timeout = timeout
+        self.servidor = socket.create_server((host,port))
+        self.clientes = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._aceptar,daemon=True).start()
+
+    def _aceptar(self):
+        while True:
+            try:
+                cliente,_ = self.servidor.accept()
+            except OSError:
+                return # Servidor cerrado
+            cliente.settimeout(self.timeout)
+            with self.lock:
+                self.clientes.append(cliente)
+
+    # publicar
+    # Suscriptor de SeguimientoLogs.
+    def publicar(self,SN,log,titulos,filas):
+        datos = "".join(json.dumps({"SN":SN,"log":log,"record":dict(zip(titulos,fila))})+"\n" for fila in filas).encode("utf-8")
+        with self.lock:
+            for cliente in list(self.clientes):
+                try:
+                    cliente.sendall(datos)
+                except OSError:
+                    self.clientes.remove(cliente)
+                    cliente.close()
+
+    def cerrar(self):
+        self.servidor.close()
+        with self.lock:
+            for cliente in self.clientes:
+                cliente.close()
+            self.clientes.clear()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seguimiento en vivo de los logs de medidores Shark270.")
+    parser.add_argument("--meter",action="append",default=[],help="medidor host[:port][/unit], se puede repetir")
+    parser.add_argument("--logs",nargs="+",default=["Historic 1"],choices=list(LOGS),help="logs a seguir")
+    parser.add_argument("--format",default="CSV",choices=EXPORT_FORMATS,help="formato de exportación")
+    parser.add_argument("--transfer",default="Standard",choices=TRANSFER_MODES,help="modo de transferencia de los logs")
+    parser.add_argument("--out",default="ExportedLogs",help="carpeta de exportación")
+    parser.add_argument("--interval",type=float,default=INTERVALO_MAX,help="espera máxima entre consultas del estado (s)")
+    parser.add_argument("--min-interval",type=float,default=1,help="espera mínima entre consultas del estado en segundos")
+    parser.add_argument("--margin",type=float,default=MARGEN,help="ventana de consulta alrededor del record esperado (s)")
+    parser.add_argument("--publish-host",default="127.0.0.1",help="dirección donde se publican los records por TCP")
+    parser.add_argument("--publish-port",type=int,help="puerto TCP donde se publican los records (JSON por línea)")
+    parser.add_argument("--request-timeout",type=float,default=3,help="tiempo máximo de cada solicitud Modbus en segundos")
+    parser.add_argument("--duration",type=float,default=0,help="detener después de estos segundos (0: sin límite)")
+    args = parser.parse_args(argv)
+    if not args.meter:
+        parser.error("indicar al menos un medidor con --meter")
+
+    publicador = PublicadorTCP(args.publish_host,args.publish_port) if args.publish_port else None
+    seguimientos = []
+    detener = threading.Event()
+    try:
+        for texto in args.meter:
+            cfg = parse_meter(texto)
+            meter = Shark270(cfg["host"],cfg["port"],cfg["unit"],timeout=args.request_timeout)
+            meter.conectar()
+            clave = f"{cfg['host']}:{cfg['port']}/{cfg['unit']}"
+            seguimiento = SeguimientoLogs(meter,args.logs,args.format,args.out,args.transfer,args.interval,args.min_interval,
+                                          args.margin,on_status=lambda msg,clave=clave: print(f"[{clave}] {msg}",flush=True),
+                                          on_error=lambda e,clave=clave: print(f"[{clave}] (X) {e}",flush=True))
+            seguimiento.suscribir(lambda SN,log,titulos,filas: print(f"[{SN}] {log}: {len(filas)} records nuevos, último "
+                                                                     f"{filas[-1][0]}",flush=True))
+            if publicador is not None:
+                seguimiento.suscribir(publicador.publicar)
+            seguimientos.append(seguimiento)
+            seguimiento.iniciar()
+
+        # SIGTERM y Ctrl+C detienen el seguimiento
+        signal.signal(signal.SIGTERM,lambda *_: detener.set())
+        signal.signal(signal.SIGINT,lambda *_: detener.set())
+        detener.wait(args.duration or None)
+    finally:
+        for seguimiento in seguimientos:
+            seguimiento.parar()
+        for seguimiento in seguimientos:
+            seguimiento.hilo.join(30)
+            seguimiento.meter.cerrar()
+        if publicador is not None:
+            publicador.cerrar()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
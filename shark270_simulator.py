@@ -0,0 +1,351 @@
+import time
+import struct
+import random
+import asyncio
+import argparse
+import threading
+from datetime import datetime, timedelta
+from pymodbus.datastore import ModbusBaseSlaveContext, ModbusServerContext
+from pymodbus.server import ModbusTcpServer
+from shark270_core import LOGS, catalogo_registros
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Simulador Modbus TCP del Shark270
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Servidor Modbus TCP local (pymodbus) que emula los registros del medidor utilizados por la aplicación, para medir y probar
+# la recuperación de logs y el Polling sin ocupar un medidor real.
+# Registros emulados:
+#   - 0-15 y 26-29: nombre, número de serie y modelo del medidor (ASCII).
+#   - 0xC34B: bloqueo de la sesión de recuperación (escribir 0x000B, se lee 0x0B00).
+#   - 0xC34F: acople del log (número de log << 8 | enable << 7 | scope). Al desacoplar se libera la sesión.
+#   - Bloques de estado de los Históricos (0xC757..0xC7A7): tamaño, records utilizados, tamaño del record, disponibilidad
+#       y timestamps del primer y último record.
+#   - Log setup (0x84CF..0x888F): cantidad de variables del record y registros de cada variable.
+#   - Ventana de recuperación 0xC350-0xC353: records por ventana e índice, estado (0xFF00 mientras el medidor prepara la
+#       ventana) y datos. Al leer el último registro de la ventana avanza al siguiente bloque de records (auto-incremento).
+#   - Registros de lecturas documentados en la tabla de registros, con valores sintéticos que cambian cada segundo.
+# Cada record del log sintético tiene un timestamp a intervalos fijos y valores que dependen del índice del record, por lo que
+# una recuperación puede verificarse contra SyntheticLog.record.
+# Con --live los Históricos siguen registrando un record por intervalo (para probar el seguimiento de los logs).
+# Uso:
+#   python shark270_simulator.py --port 5020 --records 10000 --latency 0.005 --busy 0.002
+
+# Variables de ejemplo de los Históricos (registros base 0): mediciones FLOAT y energías SINT32 en Historic 1, armónicos en
+# Historic 2.
+DEFAULT_VARS = {
+    2: [999,1001,1003,1011,1013,1015,1017,1025,1499,1505],
+    3: [999,18401],
+}
+WINDOW_DATA = 0xC353
+WINDOW_MAX_REGS = 123
+
+def _tstamp_registros(fecha):
+    return [(fecha.year-2000) << 8 | fecha.month,fecha.day << 8 | fecha.hour,fecha.minute << 8 | fecha.second]
+
+def _ascii_registros(texto,size):
+    datos = texto.encode("latin1").ljust(size*2)[:size*2]
+    return list(struct.unpack(f">{size}H",datos))
+
+# valores_variable
+# Registros sintéticos de una variable para un índice (record del log o segundo de las lecturas).
+# Parámetros:
+# info - RegisterInfo de la variable
+# k - índice
+# n - posición de la variable (para que variables del mismo formato tengan valores distintos)
+def valores_variable(info,k,n):
+    if info.format == "FLOAT" and info.size == 2:
+        return list(struct.unpack(">HH",struct.pack(">f",(k%1000)*0.25+n)))
+    if info.format in ("UINT32","SINT32") and info.size == 2:
+        return list(struct.unpack(">HH",struct.pack(">I",(k*(n+1)) & 0x7FFFFFFF)))
+    if info.format == "TSTAMP" and info.size == 3:
+        return _tstamp_registros(datetime(2024,1,1)+timedelta(seconds=k))
+    if info.format == "ASCII":
+        return _ascii_registros(f"SIM {n}",info.size)
+    return [(k+j+n)%1000 for j in range(info.size)]
+
+# SyntheticLog
+# Log histórico sintético.
+# Parámetros:
+# variables - registros (base 0) configurados en el log
+# records - cantidad inicial de records
+# interval - segundos entre records
+# capacidad - máximo de records; al excederlo se descartan los más antiguos (el log rota)
+# inicio - timestamp del primer record
+class SyntheticLog:
+    def __init__(self,variables,records,interval=60,capacidad=None,inicio=datetime(2024,1,1)):
+        catalogo = catalogo_registros()
+        self.variables = list(variables)
+        self.infos = [catalogo.buscar(reg+1) for reg in self.variables]
+        self.rec_regs = 3+sum(info.size for info in self.infos)
+        self.interval = interval
+        self.capacidad = capacidad or max(records,1)
+        self.inicio = inicio
+        self.primero = 0    # Índice absoluto del record más antiguo
+        self.total = 0      # Records generados desde el inicio del log
+        self.agregar(records)
+
+    @property
+    def usados(self):
+        return self.total-self.primero
+
+    # agregar
+    # Agrega n records al final del log (p. ej. para emular un log que sigue registrando).
+    def agregar(self,n):
+        self.total += n
+        self.primero = max(self.primero,self.total-self.capacidad)
+
+    def tstamp(self,k):
+        return _tstamp_registros(self.inicio+timedelta(seconds=k*self.interval))
+
+    # record
+    # Registros del record i (0 = record más antiguo disponible).
+    def record(self,i):
+        k = self.primero+i
+        registros = self.tstamp(k)
+        for n,info in enumerate(self.infos):
+            registros.extend(valores_variable(info,k,n))
+        return registros
+
+# Shark270SimContext
+# Contexto de esclavo de pymodbus con los registros del medidor.
+# Parámetros:
+# logs - {número de log: SyntheticLog}
+# latency - retardo de cada solicitud en segundos
+# busy - tiempo en segundos que el medidor tarda en preparar cada ventana
+# error_rate - probabilidad de responder una lectura de la ventana con una excepción Modbus
+class Shark270SimContext(ModbusBaseSlaveContext):
+    def __init__(self,logs,latency=0.0,busy=0.0,error_rate=0.0):
+        self.logs = logs
+        self.latency = latency
+        self.busy = busy
+        self.error_rate = error_rate
+        self.catalogo = catalogo_registros()
+        # Registros de lecturas (base 0) -> (variable que lo contiene, posición en la variable)
+        self.lecturas = {info.reg-1+j:(info,j) for info in self.catalogo.indice.values() for j in range(info.size)}
+        self.valores_lecturas = (None,{})   # (segundo, {registro de la variable: valores}) de las lecturas del segundo actual
+        self.lock = threading.Lock()
+        self.sesion = 0         # 0xC34B
+        self.log_engage = 0     # 0xC34F
+        self.ventana = (1,1,0)  # (records por ventana, repeticiones, índice)
+        self.listo_en = 0.0     # Momento en que la ventana está preparada
+        self.datos_ventana = None
+        self.solicitudes = 0
+        self.identificacion = {a:v for a,v in enumerate(_ascii_registros("SHARK270 SIM",8)+_ascii_registros("SIM0000001",8))}
+        self.identificacion.update({26+a:v for a,v in enumerate(_ascii_registros("S270",4))})
+        self.estado = {}    # registro -> (tipo, número de log, posición)
+        for status,availability,setup,log_number in LOGS.values():
+            for j in range(16):
+                self.estado[status+j] = ("status",log_number,j)
+            for j in range(2+WINDOW_MAX_REGS):
+                self.estado[setup+j] = ("setup",log_number,j)
+
+    def validate(self,fc_as_hex,address,count=1):
+        if self.error_rate and address <= WINDOW_DATA < address+count and random.random() < self.error_rate:
+            return False
+        return True
+
+    async def async_getValues(self,fc_as_hex,address,count=1):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.getValues(fc_as_hex,address,count)
+
+    async def async_setValues(self,fc_as_hex,address,values):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.setValues(fc_as_hex,address,values)
+
+    def _log_acoplado(self):
+        if not self.log_engage & 0x80:
+            return None
+        return self.logs.get(self.log_engage >> 8)
+
+    def _leer_estado(self,log_number,j):
+        log = self.logs.get(log_number)
+        if log is None:
+            return 0
+        campos = [log.capacidad >> 16,log.capacidad & 0xFFFF,log.usados >> 16,log.usados & 0xFFFF,log.rec_regs*2,
+                  1 if self.log_engage >> 8 == log_number and self.log_engage & 0x80 else 0]
+        if log.usados:
+            campos += log.tstamp(log.primero)+log.tstamp(log.total-1)
+        return (campos+[0]*16)[j]
+
+    def _leer_setup(self,log_number,j):
+        log = self.logs.get(log_number)
+        if log is None:
+            return 0
+        if j == 0:
+            return len(log.variables) << 8
+        if 2 <= j < 2+len(log.variables):
+            return log.variables[j-2]
+        return 0
+
+    def _preparar_ventana(self):
+        rec_per_window,repeticiones,indice = self.ventana
+        log = self._log_acoplado()
+        datos = []
+        for i in range(indice,indice+rec_per_window):
+            if log is not None and i < log.usados:
+                datos.extend(log.record(i))
+            elif log is not None:
+                datos.extend([0xFFFF]*log.rec_regs)
+        self.datos_ventana = (datos+[0]*WINDOW_MAX_REGS)[:WINDOW_MAX_REGS]
+
+    def _leer_ventana(self,address,ocupado):
+        rec_per_window,repeticiones,indice = self.ventana
+        if address == 0xC350:
+            return rec_per_window << 8 | repeticiones
+        if address == 0xC351:
+            return 0xFF00 if ocupado else (indice >> 16) & 0xFF
+        if address == 0xC352:
+            return indice & 0xFFFF
+        if ocupado:
+            return 0xFFFF
+        if self.datos_ventana is None:
+            self._preparar_ventana()
+        return self.datos_ventana[address-WINDOW_DATA]
+
+    def _leer_lectura(self,address):
+        # Registros de lecturas: valor de la variable que contiene el registro (0 si no está documentado)
+        lectura = self.lecturas.get(address)
+        if lectura is None:
+            return 0
+        info,j = lectura
+        segundo = int(time.time())
+        if self.valores_lecturas[0] != segundo:
+            self.valores_lecturas = (segundo,{})
+        valores = self.valores_lecturas[1].get(info.reg)
+        if valores is None:
+            valores = self.valores_lecturas[1][info.reg] = valores_variable(info,segundo,0)
+        return valores[j]
+
+    def getValues(self,fc_as_hex,address,count=1):
+        with self.lock:
+            self.solicitudes += 1
+            # El estado de la ventana se evalúa una sola vez para que la respuesta sea consistente
+            ocupado = time.monotonic() < self.listo_en
+            valores = []
+            for a in range(address,address+count):
+                if a in self.identificacion:
+                    valores.append(self.identificacion[a])
+                elif a == 0xC34B:
+                    valores.append(self.sesion)
+                elif a == 0xC34F:
+                    valores.append(self.log_engage)
+                elif 0xC350 <= a < WINDOW_DATA+WINDOW_MAX_REGS:
+                    valores.append(self._leer_ventana(a,ocupado))
+                elif a in self.estado:
+                    tipo,log_number,j = self.estado[a]
+                    valores.append(self._leer_estado(log_number,j) if tipo == "status" else self._leer_setup(log_number,j))
+                else:
+                    valores.append(self._leer_lectura(a))
+
+            # Auto-incremento: al leer el último registro de la ventana preparada se avanza al siguiente bloque
+            log = self._log_acoplado()
+            if log is not None and not ocupado:
+                rec_per_window,repeticiones,indice = self.ventana
+                fin = WINDOW_DATA+rec_per_window*log.rec_regs
+                if address < fin <= address+count:
+                    self._configurar_ventana(rec_per_window,repeticiones,indice+rec_per_window)
+            return valores
+
+    def _configurar_ventana(self,rec_per_window,repeticiones,indice):
+        self.ventana = (rec_per_window,repeticiones,indice)
+        self.datos_ventana = None
+        self.listo_en = time.monotonic()+self.busy
+
+    def setValues(self,fc_as_hex,address,values):
+        with self.lock:
+            self.solicitudes += 1
+            for a,v in enumerate(values,start=address):
+                if a == 0xC34B:
+                    if v == 0x000B and self.sesion == 0:
+                        self.sesion = 0x0B00
+                elif a == 0xC34F:
+                    self.log_engage = v
+                    if not v & 0x80:
+                        self.sesion = 0 # Al desacoplar el log se libera la sesión
+            if address == 0xC350 and len(values) >= 3:
+                self._configurar_ventana(values[0] >> 8,values[0] & 0xFF,(values[1] & 0xFF) << 16 | values[2])
+
+# Shark270Simulator
+# Ejecuta el servidor Modbus TCP en un hilo aparte.
+# Parámetros:
+# host, port - dirección del servidor
+# context - Shark270SimContext
+class Shark270Simulator:
+    def __init__(self,context,host="127.0.0.1",port=5020):
+        self.context = context
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.listo = threading.Event()
+        self.hilo = None
+
+    def iniciar(self):
+        self.hilo = threading.Thread(target=self._ejecutar,daemon=True)
+        self.hilo.start()
+        if not self.listo.wait(10):
+            raise RuntimeError("El simulador no inició.")
+
+    def _ejecutar(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._servir())
+
+    async def _servir(self):
+        self.server = ModbusTcpServer(ModbusServerContext(slaves=self.context,single=True),address=(self.host,self.port))
+        tarea = asyncio.create_task(self.server.serve_forever())
+        while not self.server.transport and not tarea.done():
+            await asyncio.sleep(0.01)
+        if self.server.transport:
+            self.listo.set()
+        await tarea
+
+    def parar(self):
+        if self.loop is not None and self.server is not None:
+            asyncio.run_coroutine_threadsafe(self.server.shutdown(),self.loop).result(10)
+        if self.hilo is not None:
+            self.hilo.join(10)
+
+# crear_contexto
+# Crea el contexto del simulador con los logs de ejemplo.
+# Parámetros:
+# records - records de cada Histórico de ejemplo
+# latency, busy, error_rate - ver Shark270SimContext
+# interval - segundos entre records
+def crear_contexto(records=1000,latency=0.0,busy=0.0,error_rate=0.0,interval=60):
+    logs = {log_number:SyntheticLog(variables,records,interval) for log_number,variables in DEFAULT_VARS.items()}
+    return Shark270SimContext(logs,latency,busy,error_rate)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador Modbus TCP del medidor Shark270.")
+    parser.add_argument("--host",default="127.0.0.1")
+    parser.add_argument("--port",type=int,default=5020)
+    parser.add_argument("--records",type=int,default=1000,help="records de cada Histórico de ejemplo")
+    parser.add_argument("--interval",type=int,default=60,help="segundos entre records")
+    parser.add_argument("--latency",type=float,default=0.0,help="retardo de cada solicitud en segundos")
+    parser.add_argument("--busy",type=float,default=0.0,help="tiempo para preparar cada ventana en segundos")
+    parser.add_argument("--errors",type=float,default=0.0,help="probabilidad de error en las lecturas de la ventana")
+    parser.add_argument("--live",action="store_true",help="agregar un record a cada Histórico cada --interval segundos")
+    args = parser.parse_args(argv)
+
+    simulador = Shark270Simulator(crear_contexto(args.records,args.latency,args.busy,args.errors,args.interval),args.host,args.port)
+    simulador.iniciar()
+    print(f"\n (!) Simulador Shark270 en {args.host}:{args.port} ({args.records} records por Histórico). Ctrl+C para terminar.")
+    try:
+        siguiente = time.monotonic()+args.interval
+        while True:
+            time.sleep(min(1,max(siguiente-time.monotonic(),0)))
+            if args.live and time.monotonic() >= siguiente:
+                # Emular un medidor que sigue registrando: un record nuevo por intervalo en cada Histórico
+                with simulador.context.lock:
+                    for log in simulador.context.logs.values():
+                        log.agregar(1)
+                siguiente += args.interval
+    except KeyboardInterrupt:
+        simulador.parar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import os
+import csv
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from shark270_core import catalogo_registros, Shark270Error
+from shark270_decoder import BlockLayout, escalar_variable
+from shark270_polling import MAX_REGS_PER_READ
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                                  Snapshot de las lecturas del medidor
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Un snapshot lee todas las mediciones documentadas en la tabla de registros (o una selección) y las interpreta cada una con su
+# formato y escala, en una fila con la hora de la lectura. El plan de lectura se calcula una sola vez:
+#   - Las mediciones se ordenan por registro y se agrupan en bloques de hasta 125 registros (límite de Modbus). Dos mediciones
+#       separadas por MAX_HUECO registros o menos sin documentar se leen en el mismo bloque (los registros intermedios se leen y
+#       se descartan), ya que una solicitud más cuesta mucho más que unos registros adicionales.
+#   - Cada bloque se interpreta con una sola BlockLayout (struct.Struct) desde los bytes de la respuesta (Shark270.leer_bytes),
+#       los huecos se omiten con bytes de relleno.
+#   - Si el medidor rechaza un bloque con huecos (excepción Modbus, p. ej. dirección no válida), el bloque se divide en bloques
+#       sin huecos y el plan se actualiza para las siguientes lecturas.
+# Los registros de 16 bits de varios registros (armónicos, samples, mapa personalizado) se leen como una columna por elemento
+# "{Description} (n)", igual que en los logs. Un plan puede utilizarse por varios medidores a la vez (tomar_snapshots).
+
+MAX_HUECO = 24
+
+# Variable
+# Un valor del snapshot.
+# reg - registro donde inicia (base 1)
+# format - formato de interpretación
+# size - registros que ocupa
+# titulo - encabezado de la columna
+# scale - el valor se divide entre 100
+Variable = namedtuple("Variable",["reg","format","size","titulo","scale"])
+
+# Bloque
+# Una lectura del plan.
+# inicio - registro inicial (base 1)
+# cantidad - registros a leer
+# layout - BlockLayout del bloque
+# variables - variables del bloque, en orden
+# posicion - columna de la primera variable del bloque
+Bloque = namedtuple("Bloque",["inicio","cantidad","layout","variables","posicion"])
+
+# variables_snapshot
+# Variables de las mediciones del catálogo.
+# Parámetros:
+# registros - números de registro (base 1) a incluir, None para todas las mediciones documentadas
+def variables_snapshot(registros=None):
+    catalogo = catalogo_registros()
+    if registros is None:
+        infos = sorted(catalogo.indice.values(),key=lambda info: info.reg)
+    else:
+        infos = []
+        for reg in sorted(set(registros)):
+            info = catalogo.buscar(reg)
+            if info is None:
+                raise Shark270Error(f"Número de registro [{reg}] no encontrado.")
+            infos.append(info)
+    variables = []
+    for info in infos:
+        # Misma escala que en los logs: los arreglos se exportan como variables de 1 registro (construir_layout) y el resto de
+        # registros de 16 bits de varios registros como varias variables en un registro (compilar_decoder)
+        if info.is_array:
+            variables.extend(Variable(info.reg+k,info.format,1,f"{info.name} ({k+1})",
+                                      escalar_variable(f"{info.name} ({k+1})",info.format,1)) for k in range(info.size))
+        elif info.format in ("UINT16","SINT16") and info.size > 1:
+            escalar = escalar_variable(info.name,info.format,info.size)
+            variables.extend(Variable(info.reg+k,info.format,1,f"{info.name} ({k+1})",escalar) for k in range(info.size))
+        else:
+            variables.append(Variable(info.reg,info.format,info.size,info.name,escalar_variable(info.name,info.format,info.size)))
+    return variables
+
+# agrupar_variables
+# Agrupa las variables (ordenadas por registro) en bloques de lectura.
+# Parámetros:
+# variables - variables ordenadas por registro
+# posicion - columna de la primera variable
+# max_regs - máximo de registros por solicitud
+# max_hueco - máximo de registros sin documentar entre dos variables del mismo bloque
+def agrupar_variables(variables,posicion=0,max_regs=MAX_REGS_PER_READ,max_hueco=MAX_HUECO):
+    grupos = []
+    for variable in variables:
+        if variable.size > max_regs:
+            raise Shark270Error(f"El registro [{variable.reg}] ocupa {variable.size} registros, más que una lectura.")
+        if grupos:
+            actual = grupos[-1]
+            fin = actual[-1].reg+actual[-1].size
+            if fin <= variable.reg <= fin+max_hueco and variable.reg+variable.size-actual[0].reg <= max_regs:
+                actual.append(variable)
+                continue
+        grupos.append([variable])
+
+    bloques = []
+    for grupo in grupos:
+        # Cada variable ocupa hasta el inicio de la siguiente, los registros sin documentar se omiten al interpretar
+        fin = grupo[-1].reg+grupo[-1].size
+        layout = [(v.format,siguiente-v.reg) for v,siguiente in zip(grupo,[v.reg for v in grupo[1:]]+[fin])]
+        bloques.append(Bloque(grupo[0].reg,fin-grupo[0].reg,BlockLayout(layout),grupo,posicion))
+        posicion += len(grupo)
+    return bloques
+
+# SnapshotPlan
+# Plan de lectura de un snapshot.
+# Parámetros:
+# variables - variables del snapshot (variables_snapshot)
+# max_regs, max_hueco - ver agrupar_variables
+class SnapshotPlan:
+    def __init__(self,variables,max_regs=MAX_REGS_PER_READ,max_hueco=MAX_HUECO):
+        self.variables = sorted(variables,key=lambda v: v.reg)
+        self.titulos = [v.titulo for v in self.variables]
+        self.max_regs = max_regs
+        self.bloques = agrupar_variables(self.variables,0,max_regs,max_hueco)
+        self.escalar = [i for i,v in enumerate(self.variables) if v.scale]
+        self.lock = threading.Lock()
+
+    # solicitudes
+    # Cantidad de lecturas Modbus por snapshot.
+    @property
+    def solicitudes(self):
+        return len(self.bloques)
+
+    # leer
+    # Toma un snapshot de un medidor conectado.
+    # Parámetros:
+    # meter - medidor conectado (shark270_core.Shark270)
+    # Retorna (timestamp epoch de la lectura, lista de valores en el orden de titulos).
+    def leer(self,meter):
+        valores = [None]*len(self.variables)
+        t = time.time()
+        for bloque in list(self.bloques):
+            for registros,b in self._leer_bloque(meter,bloque):
+                valores[b.posicion:b.posicion+len(b.variables)] = b.layout.decodificar(registros)
+        for i in self.escalar:
+            valores[i] = valores[i]/100
+        return t,valores
+
+    def _leer_bloque(self,meter,bloque):
+        try:
+            return [(meter.leer_bytes(bloque.inicio-1,bloque.cantidad),bloque)]
+        except Shark270Error as e:
+            huecos = sum(v.size for v in bloque.variables) < bloque.cantidad
+            if not huecos or e.__cause__ is not None:
+                raise # Sin huecos que omitir, o conexión perdida (no es un rechazo del bloque)
+        # El medidor rechazó el bloque: leer las variables sin los registros intermedios y actualizar el plan
+        partes = agrupar_variables(bloque.variables,bloque.posicion,self.max_regs,max_hueco=0)
+        with self.lock:
+            if bloque in self.bloques:
+                i = self.bloques.index(bloque)
+                self.bloques[i:i+1] = partes
+        return [(meter.leer_bytes(parte.inicio-1,parte.cantidad),parte) for parte in partes]
+
+# tomar_snapshots
+# Toma un snapshot de varios medidores conectados en paralelo (las lecturas de cada medidor se serializan con su lock).
+# Parámetros:
+# meters - medidores conectados
+# plan - SnapshotPlan
+# workers - medidores leídos a la vez
+# Retorna una lista con (timestamp, valores) o la excepción de cada medidor, en el mismo orden.
+def tomar_snapshots(meters,plan,workers=16):
+    def tomar(meter):
+        try:
+            return plan.leer(meter)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(max_workers=max(min(workers,len(meters)),1)) as pool:
+        return list(pool.map(tomar,meters))
+
+# guardar_snapshots
+# Agrega filas de snapshot a un archivo .csv (con los encabezados si el archivo es nuevo). NaN se escribe como 'NaN', igual
+# que en la exportación de los logs.
+# Parámetros:
+# ruta - archivo de destino
+# plan - SnapshotPlan de las filas
+# filas - lista de (medidor, número de serie, timestamp epoch, valores)
+def guardar_snapshots(ruta,plan,filas):
+    nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) == 0
+    os.makedirs(os.path.dirname(ruta) or ".",exist_ok=True)
+    with open(ruta,"a",newline="",encoding="utf-8") as f:
+        writer = csv.writer(f,lineterminator=os.linesep)
+        if nuevo:
+            writer.writerow(["Meter","SN","Timestamp"]+plan.titulos)
+        for medidor,SN,t,valores in filas:
+            writer.writerow([medidor,SN,time.strftime("%d/%m/%Y %H:%M:%S",time.localtime(t))]+
+                            ['NaN' if v != v else v for v in valores])
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Las pruebas importan los módulos del repositorio (en la raíz) y la referencia original (tests/referencia.py)
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,122 @@
+import struct
+import math
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Referencia: interpretación original (versión base del GUI)
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Copia de la interpretación original de Shark270_MODBUS_GUI.py (cadena de if/elif con pack/unpack por valor), utilizada por las
+# pruebas de paridad (tests/test_codecs.py) y como referencia de velocidad (benchmarks/bench_codecs.py).
+
+# reg2var_original
+# Implementación original de reg2var.
+def reg2var_original(registers,data_type):
+    if(data_type == "TSTAMP"):
+        tstamp_mask = 0x7f0f1f1f3f3f
+        tstamp_bytes = struct.pack('>Q',(registers[0] << 32 | registers[1] << 16 | registers[2]))
+        tstamp = struct.unpack('>Q',tstamp_bytes)[0] & tstamp_mask
+        tstamp_str = f"{tstamp:012X}"
+
+        year = int(tstamp_str[0:2],16)
+        month = int(tstamp_str[2:4],16)
+        day = int(tstamp_str[4:6],16)
+        hour = int(tstamp_str[6:8],16)
+        minute = int(tstamp_str[8:10],16)
+        second = int(tstamp_str[10:12],16)
+
+        return f"{day:02}/{month:02}/20{year:02} {hour:02}:{minute:02}:{second:02}"
+
+    elif(data_type == "UINT32"):
+        packed_bytes = struct.pack('>I', (registers[0] << 16 | registers[1]))
+        return struct.unpack('>I',packed_bytes)[0]
+
+    elif(data_type == "SINT32"):
+        packed_bytes = struct.pack('>I', (registers[0] << 16 | registers[1]))
+        return struct.unpack('>i',packed_bytes)[0]
+
+    elif(data_type == "UINT16"):
+        packed_bytes = struct.pack('>H', registers)
+        return struct.unpack('>H',packed_bytes)[0]
+
+    elif(data_type == "SINT16"):
+        packed_bytes = struct.pack('>H', registers)
+        return struct.unpack('>h',packed_bytes)[0]
+
+    elif(data_type == "FLOAT"):
+        packed_bytes = struct.pack('<I', (registers[0] << 16 | registers[1]))
+        return struct.unpack('<f',packed_bytes)[0]
+
+    elif(data_type == "ASCII"):
+        string = ""
+        for reg in registers:
+            packed_bytes = struct.pack('>H', reg)
+            high,low = struct.unpack('>cc',packed_bytes)
+            string += high.decode('latin1') + low.decode('latin1')
+        return string
+
+
+# interpretar_original
+# Interpretación original del Polling: recorre el bloque llamando reg2var por registro.
+def interpretar_original(start_address,data_request,format):
+    filas = []
+    true_value = ""
+    for i in range(len(data_request)):
+        bytes_value = struct.pack('>H',data_request[i]).hex().upper()
+        if(format == "TSTAMP" and i%3 == 0):
+            if (i+2 < len(data_request)): true_value = reg2var_original(data_request[i:i+3],format)
+            else: true_value = "Incomplete data"
+
+        elif (format == "UINT32" and i%2 == 0):
+            if (i+1 < len(data_request)): true_value = reg2var_original(data_request[i:i+2],format)
+            else: true_value = "Incomplete data"
+
+        elif (format == "SINT32" and i%2 == 0):
+            if (i+1 < len(data_request)): true_value = reg2var_original(data_request[i:i+2],format)
+            else: true_value = "Incomplete data"
+
+        elif (format == "UINT16"):
+                true_value = reg2var_original(data_request[i],format)
+
+        elif (format == "SINT16"):
+                true_value = reg2var_original(data_request[i],format)
+
+        elif (format == "FLOAT" and i%2 == 0):
+            if (i+1 < len(data_request)): true_value = reg2var_original(data_request[i:i+2],format)
+            else: true_value = "Incomplete data"
+
+        elif (format == "ASCII" and i == 0):
+            ascii_str = reg2var_original(data_request,format)
+            true_value = ascii_str
+
+        else:
+            true_value = "   ↑" # Indicador que el registro actual es parte de un registro previo
+        filas.append((start_address+i,bytes_value,true_value))
+    return filas
+
+
+# record_original
+# Interpretación original de un record de la recuperación de logs (campo por campo, con escala /100 y 'NaN').
+# Parámetros:
+# registros - registros de un record
+# rec_titles, rec_var_sizes, rec_var_types - formato del record
+def record_original(registros,rec_titles,rec_var_sizes,rec_var_types):
+    rec_data = []
+    i_data = 0
+    for titulo,step,format in zip(rec_titles,rec_var_sizes,rec_var_types):
+        bytes = registros[i_data:i_data+step] if step != 1 else registros[i_data]
+        try:
+            value = reg2var_original(bytes,format)
+            if isinstance(value,float) and math.isnan(value):
+                value = 'NaN'
+            elif ('%' in titulo) or ('Phase' in titulo):
+                value = value/100
+            rec_data.append(value)
+        except:
+            # El registro contiene varias variables del mismo tipo
+            for byte in bytes:
+                value = reg2var_original(byte,format)
+                if '%' in titulo:
+                    value = value/100
+                rec_data.append(value)
+        i_data += step
+    return rec_data
@@ -0,0 +1,57 @@
+import os
+import builtins
+from shark270_registros import cargar_catalogo, directorio_cache, REGISTROS_ARREGLO
+from shark270_layouts import LayoutCache, Layout
+from shark270_decoder import compilar_decoder
+from shark270_core import TABLE_PATH
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Cachés persistentes: carpeta del usuario y sin permisos de escritura
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+def test_directorio_cache(monkeypatch,tmp_path):
+    monkeypatch.delenv("SHARK270_CACHE_DIR",raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME",str(tmp_path))
+    monkeypatch.setenv("LOCALAPPDATA",str(tmp_path))
+    paquete = os.path.dirname(os.path.abspath(TABLE_PATH))
+    assert os.path.dirname(directorio_cache()) == str(tmp_path)
+    assert not directorio_cache().startswith(paquete)
+    monkeypatch.setenv("SHARK270_CACHE_DIR",str(tmp_path/"env"))
+    assert directorio_cache() == str(tmp_path/"env")
+    assert directorio_cache(str(tmp_path/"arg")) == str(tmp_path/"arg")
+
+def test_catalogo_en_cache(tmp_path):
+    ruta = tmp_path/"cache"/"register_table.json"
+    catalogo = cargar_catalogo(TABLE_PATH,str(ruta))
+    assert ruta.exists()
+    assert cargar_catalogo(TABLE_PATH,str(ruta)).a_dict() == catalogo.a_dict()
+
+def sin_permisos(monkeypatch,carpeta):
+    abrir = builtins.open
+    def open_sin_permisos(ruta,modo="r",*args,**kwargs):
+        if "w" in modo and str(ruta).startswith(str(carpeta)):
+            raise PermissionError(13,"Permission denied",str(ruta))
+        return abrir(ruta,modo,*args,**kwargs)
+    monkeypatch.setattr(builtins,"open",open_sin_permisos)
+
+def test_catalogo_sin_permisos(monkeypatch,tmp_path):
+    sin_permisos(monkeypatch,tmp_path)
+    catalogo = cargar_catalogo(TABLE_PATH,str(tmp_path/"register_table.json"))
+    assert len(catalogo) > 0 and os.listdir(tmp_path) == []
+
+def test_layouts_sin_permisos(monkeypatch,tmp_path):
+    sin_permisos(monkeypatch,tmp_path)
+    cache = LayoutCache(str(tmp_path/"log_layouts.json"))
+    layout = Layout(compilar_decoder(["Timestamp","Volts A-N"],[3,2],["TSTAMP","FLOAT"]),[999],[],"X")
+    cache.guardar("SN1",2,"H",layout)
+    # Sin caché en disco, el formato sigue disponible en memoria
+    assert cache.ruta is None and os.listdir(tmp_path) == []
+    assert cache.buscar("SN1",2,"H",[999]) is layout
+
+def test_tabla_del_fabricante_y_arreglos(tmp_path):
+    # La tabla .xlsx no tiene columna de arreglos: se agregan desde REGISTROS_ARREGLO
+    import pandas as pd
+    assert list(pd.read_excel(TABLE_PATH,nrows=1).columns) == ["Reg#","Size","Description","Format"]
+    catalogo = cargar_catalogo(TABLE_PATH,str(tmp_path/"register_table.json"))
+    assert {info.reg for info in catalogo if info.is_array} == REGISTROS_ARREGLO
+    assert cargar_catalogo(TABLE_PATH,str(tmp_path/"register_table.json")).huella == catalogo.huella
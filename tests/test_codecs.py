@@ -0,0 +1,180 @@
+import math
+import random
+import struct
+import numpy as np
+import pytest
+
+from referencia import reg2var_original, interpretar_original, record_original
+from shark270_decoder import reg2var, decode_many, compilar_decoder, epoch_records, CODECS
+from shark270_records import TSTAMP_NULO, tstamp_a_epoch, formatear_epoch
+from shark270_core import interpretar_registros, DATA_FORMATS
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Paridad de los codecs con la interpretación original
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# Los codecs (reg2var, decode_many, interpretar_registros y el decoder compilado de los logs) deben generar exactamente los
+# mismos valores que la implementación original con if/elif (tests/referencia.py), incluidos NaN, infinito, signos y los
+# timestamps inválidos.
+
+SIZES = {"TSTAMP":3,"UINT32":2,"SINT32":2,"UINT16":1,"SINT16":1,"FLOAT":2}
+LIMITES = [0x0000,0x0001,0x7FFF,0x8000,0x8001,0x7F80,0x7FC0,0xFF80,0xFFFF]
+CASOS = 2000
+
+@pytest.fixture(autouse=True)
+def semilla():
+    random.seed(270)
+
+def iguales(a,b):
+    if isinstance(a,float) and isinstance(b,float) and math.isnan(a) and math.isnan(b):
+        return True
+    return type(a) is type(b) and a == b
+
+def registros_aleatorios(n):
+    return [random.choice(LIMITES) if random.random() < 0.2 else random.randrange(0x10000) for _ in range(n)]
+
+# registros_tstamp
+# Registros de un TSTAMP [año, mes, día, hora, minuto, segundo] con bits altos aleatorios (el medidor los ignora).
+def registros_tstamp(y,m,d,h,mi,s):
+    altos = [random.choice([0,0x80]),random.choice([0,0xF0]),random.choice([0,0xE0]),random.choice([0,0xE0]),
+             random.choice([0,0xC0]),random.choice([0,0xC0])]
+    b = bytes(v | a for v,a in zip((y,m,d,h,mi,s),altos))
+    return list(struct.unpack('>HHH',b))
+
+
+def test_todos_los_formatos_tienen_codec():
+    assert set(DATA_FORMATS) == set(CODECS)
+
+@pytest.mark.parametrize("formato",DATA_FORMATS)
+def test_reg2var_igual_al_original(formato):
+    for _ in range(CASOS):
+        if formato == "ASCII":
+            entrada = registros_aleatorios(random.randrange(1,9))
+        else:
+            registros = registros_aleatorios(SIZES[formato])
+            entrada = registros[0] if SIZES[formato] == 1 else registros
+        esperado,obtenido = reg2var_original(entrada,formato),reg2var(entrada,formato)
+        assert iguales(esperado,obtenido),(formato,entrada,esperado,obtenido)
+
+@pytest.mark.parametrize("formato,codigo,valores",[
+    ("UINT32",">I",[0,1,0xFFFF,0x10000,0x7FFFFFFF,0x80000000,0xFFFFFFFF]),
+    ("SINT32",">i",[0,1,-1,-0x80000000,0x7FFFFFFF,-123456]),
+    ("UINT16",">H",[0,1,0x7FFF,0x8000,0xFFFF]),
+    ("SINT16",">h",[0,1,-1,-0x8000,0x7FFF]),
+    ("FLOAT",">f",[0.0,-0.0,1.0,-1.5,230.25,1e-38,3.4e38,float("inf"),float("-inf")]),
+])
+def test_ida_y_vuelta(formato,codigo,valores):
+    # Un valor codificado como lo envía el medidor (big-endian, palabra alta primero) se interpreta como el mismo valor
+    for valor in valores:
+        datos = struct.pack(codigo,valor)
+        registros = list(struct.unpack(f">{len(datos)//2}H",datos))
+        entrada = registros[0] if len(registros) == 1 else registros
+        obtenido = reg2var(entrada,formato)
+        esperado = struct.unpack(codigo,datos)[0]
+        assert iguales(obtenido,esperado) and iguales(obtenido,reg2var_original(entrada,formato)),(formato,valor,obtenido)
+
+def test_ida_y_vuelta_ascii_y_tstamp():
+    texto = "SIM0000001 Shark"
+    registros = list(struct.unpack(">8H",texto.encode("latin1")))
+    assert reg2var(registros,"ASCII") == reg2var_original(registros,"ASCII") == texto
+    registros = registros_tstamp(24,2,29,23,59,58)
+    assert reg2var(registros,"TSTAMP") == reg2var_original(registros,"TSTAMP") == "29/02/2024 23:59:58"
+
+def test_float_nan():
+    for registros in ([0x7FC0,0x0000],[0xFFC0,0x0001],[0x7F80,0x0001]):
+        assert math.isnan(reg2var(registros,"FLOAT")) and math.isnan(reg2var_original(registros,"FLOAT"))
+
+def test_decode_many_igual_al_original():
+    formatos = list(SIZES)+["ASCII"]
+    for _ in range(CASOS//10):
+        # Bloques con formatos mezclados y variables con registros de relleno
+        layout = []
+        for _ in range(random.randrange(1,12)):
+            formato = random.choice(formatos)
+            usados = random.randrange(1,6) if formato == "ASCII" else SIZES[formato]
+            layout.append((formato,usados+random.choice([0,0,0,1])))
+        registros = registros_aleatorios(sum(size for formato,size in layout))
+        esperado = []
+        i = 0
+        for formato,size in layout:
+            if formato == "ASCII":
+                esperado.append(reg2var_original(registros[i:i+size],formato))
+            elif SIZES[formato] == 1:
+                esperado.append(reg2var_original(registros[i],formato))
+            else:
+                esperado.append(reg2var_original(registros[i:i+SIZES[formato]],formato))
+            i += size
+        for entrada in (registros,struct.pack(f">{len(registros)}H",*registros)):
+            obtenido = decode_many(entrada,layout)
+            assert len(esperado) == len(obtenido) and all(iguales(a,b) for a,b in zip(esperado,obtenido)),(layout,registros)
+
+@pytest.mark.parametrize("formato",DATA_FORMATS)
+def test_polling_igual_al_original(formato):
+    # Bloques de cualquier longitud, incluidos los datos incompletos
+    for _ in range(CASOS//10):
+        registros = registros_aleatorios(random.randrange(0,40))
+        esperado,obtenido = interpretar_original(9,registros,formato),interpretar_registros(9,registros,formato)
+        assert len(esperado) == len(obtenido),(formato,registros)
+        assert all(a[:2] == b[:2] and iguales(a[2],b[2]) for a,b in zip(esperado,obtenido)),(formato,registros)
+
+
+# Formato de record con todos los formatos, variables con relleno, varias variables por registro y títulos con escala
+RECORD = [("Timestamp",3,"TSTAMP"),("Volts A-N",2,"FLOAT"),("Watts, 3-Ph total",3,"FLOAT"),("Power Factor %",2,"FLOAT"),
+          ("Phase angle A",1,"SINT16"),("Energy",2,"UINT32"),("VARh",2,"SINT32"),("THD %",4,"UINT16"),
+          ("Phase A harmonic magnitudes",3,"UINT16"),("Flags",1,"UINT16"),("Name",3,"ASCII")]
+
+def records_aleatorios(n):
+    registros = []
+    for _ in range(n):
+        registros += registros_tstamp(random.randrange(100),random.randrange(1,13),random.randrange(1,29),
+                                      random.randrange(24),random.randrange(60),random.randrange(60))
+        registros += registros_aleatorios(sum(size for titulo,size,formato in RECORD)-3)
+    return registros
+
+def test_decoder_de_logs_igual_al_original():
+    titulos,sizes,tipos = (list(c) for c in zip(*RECORD))
+    decoder = compilar_decoder(titulos,sizes,tipos)
+    rec_size = sum(sizes)
+    registros = records_aleatorios(200)
+    esperado = [record_original(registros[i:i+rec_size],titulos,sizes,tipos) for i in range(0,len(registros),rec_size)]
+    for entrada in (registros,struct.pack(f">{len(registros)}H",*registros)):
+        obtenido = decoder.a_filas(decoder.decodificar(entrada))
+        assert len(obtenido) == len(esperado)
+        for a,b in zip(esperado,obtenido):
+            assert len(a) == len(b) and all(x == y if isinstance(x,str) else iguales(float(x),float(y)) for x,y in zip(a,b)),(a,b)
+
+def test_decoder_nan_en_store():
+    titulos,sizes,tipos = ["Timestamp","Volts A-N","Power Factor %"],[3,2,2],["TSTAMP","FLOAT","FLOAT"]
+    decoder = compilar_decoder(titulos,sizes,tipos)
+    registros = registros_tstamp(24,5,1,0,0,0)+[0x7FC0,0x0000,0xFFC0,0x0000]
+    assert decoder.a_filas(decoder.decodificar(registros)) == [["01/05/2024 00:00:00",'NaN','NaN']]
+    store = decoder.crear_store()
+    decoder.decodificar_en(store,registros)
+    assert np.isnan(store.columna(1)[0]) and np.isnan(store.columna(2)[0])
+
+
+def test_tstamp_epoch_igual_al_original():
+    for _ in range(CASOS):
+        tstamp = (random.randrange(100),random.randrange(1,13),random.randrange(1,29),
+                  random.randrange(24),random.randrange(60),random.randrange(60))
+        registros = registros_tstamp(*tstamp)
+        epoch = tstamp_a_epoch([tstamp])
+        assert epoch[0] != TSTAMP_NULO
+        assert formatear_epoch(epoch) == [reg2var_original(registros,"TSTAMP")]
+
+@pytest.mark.parametrize("tstamp",[(24,0,1,0,0,0),(24,13,1,0,0,0),(24,2,30,0,0,0),(23,2,29,0,0,0),(24,4,31,0,0,0),
+                                   (24,1,0,0,0,0),(24,1,1,24,0,0),(24,1,1,0,60,0),(24,1,1,0,0,60)])
+def test_tstamp_invalido_es_nulo(tstamp):
+    # Las fechas inválidas (mes 0, 30 de febrero, 24 h...) se guardan como TSTAMP_NULO y se exportan como 'NaT'
+    epoch = tstamp_a_epoch([tstamp])
+    assert epoch[0] == TSTAMP_NULO
+    assert formatear_epoch(epoch) == ['NaT']
+
+def test_epoch_records_nulo():
+    # Primer campo (TSTAMP) de tres records de 10 bytes: válido, mes 0 (registros vacíos) y válido con bits altos
+    datos = b"".join(struct.pack(">3H2H",*registros,0xFFFF,0xFFFF) for registros in
+                     (registros_tstamp(24,1,1,0,0,0),[0,0,0],registros_tstamp(24,1,1,0,15,0)))
+    epoch = epoch_records(datos,10)
+    assert epoch[1] == TSTAMP_NULO
+    assert epoch[2]-epoch[0] == 900
+    assert formatear_epoch(epoch) == ["01/01/2024 00:00:00",'NaT',"01/01/2024 00:15:00"]
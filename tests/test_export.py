@@ -0,0 +1,63 @@
+import os
+import struct
+import pytest
+from shark270_decoder import compilar_decoder
+from shark270_export import abrir_export, completar_export, PARCIAL
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Exportación Parquet: archivo utilizable si la recuperación se interrumpe
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+DECODER = compilar_decoder(["Timestamp","Volts A-N","Energy"],[3,2,2],["TSTAMP","FLOAT","UINT32"])
+
+# lote
+# RecordStore con n records (uno por minuto desde el minuto inicio).
+def lote(inicio,n):
+    registros = []
+    for k in range(inicio,inicio+n):
+        registros += list(struct.unpack(">3H",bytes([24,1,1+k//1440,k//60%24,k%60,0])))
+        registros += list(struct.unpack(">2H",struct.pack(">f",230.0+k)))+[k >> 16,k & 0xFFFF]
+    store = DECODER.crear_store()
+    DECODER.decodificar_en(store,registros)
+    return store
+
+def test_parquet_completo_al_cerrar(tmp_path):
+    writer,continua = abrir_export(str(tmp_path),"SN_Historic 1","Parquet",DECODER.titulos)
+    for n in range(3):
+        writer.escribir(lote(100*n,100))
+    writer.cerrar()
+    tabla = pq.read_table(writer.ruta)
+    assert not continua and tabla.num_rows == 300 and pq.ParquetFile(writer.ruta).num_row_groups == 3
+    assert tabla.column("Energy").to_pylist() == list(range(300))
+    assert not os.path.exists(writer.ruta+PARCIAL)
+
+def test_parquet_interrumpido(tmp_path):
+    writer,_ = abrir_export(str(tmp_path),"SN_Historic 1","Parquet",DECODER.titulos)
+    writer.escribir(lote(0,100))
+    writer.escribir(lote(100,50))
+    # Proceso terminado sin cerrar el writer: las partes escritas se pueden leer y la siguiente recuperación las une
+    assert not os.path.exists(writer.ruta)
+    assert pq.read_table(writer.ruta+PARCIAL).num_rows == 150
+    assert completar_export(writer.ruta)
+    assert pq.read_table(writer.ruta).column("Energy").to_pylist() == list(range(150))
+    assert not os.path.exists(writer.ruta+PARCIAL)
+
+def test_parquet_continuacion_interrumpida(tmp_path):
+    writer,_ = abrir_export(str(tmp_path),"SN_Historic 1","Parquet",DECODER.titulos)
+    writer.escribir(lote(0,10))
+    writer.cerrar()
+    continuacion,continua = abrir_export(str(tmp_path),"SN_Historic 1","Parquet",DECODER.titulos,writer.ruta)
+    continuacion.escribir(lote(10,10))
+    # La continuación interrumpida (_0) se completa y la siguiente continúa en _1
+    siguiente,_ = abrir_export(str(tmp_path),"SN_Historic 1","Parquet",DECODER.titulos,writer.ruta)
+    siguiente.escribir(lote(20,10))
+    siguiente.cerrar()
+    assert continua and os.path.basename(siguiente.ruta) == "SN_Historic 1_1.parquet"
+    assert pq.read_table(continuacion.ruta).column("Energy").to_pylist() == list(range(10,20))
+
+def test_parquet_vacio(tmp_path):
+    writer,_ = abrir_export(str(tmp_path),"SN_Historic 1","Parquet",DECODER.titulos)
+    writer.cerrar()
+    assert pq.read_table(writer.ruta).column_names == DECODER.titulos
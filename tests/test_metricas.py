@@ -0,0 +1,54 @@
+import os
+import pstats
+import threading
+from shark270_metricas import Metricas
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Perfil de la decodificación con varios hilos
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+def decodificar(n):
+    return sum(i*i for i in range(n))
+
+def test_perfil_por_hilo(tmp_path):
+    metricas = Metricas(perfilar=True)
+    def trabajar():
+        with metricas.perfilar():
+            decodificar(10000)
+    for _ in range(2):
+        hilo = threading.Thread(target=trabajar)
+        hilo.start()
+        hilo.join()
+    with metricas.perfilar():
+        decodificar(10000)
+    assert len(metricas.perfiles) == 3
+    ruta = str(tmp_path/"metricas.json")
+    metricas.guardar(ruta)
+    llamadas = [ncalls for (archivo,linea,funcion),(cc,ncalls,tt,ct,callers) in pstats.Stats(f"{ruta}.pstats").stats.items()
+                if funcion == "decodificar"]
+    assert llamadas == [3] and metricas.a_dict()["profile_skipped"] == 0
+
+def test_perfil_simultaneo():
+    # Dos medidores perfilando a la vez: el segundo bloque se ejecuta sin perfilar en lugar de fallar o mezclar los perfiles
+    a,b = Metricas(perfilar=True),Metricas(perfilar=True)
+    dentro,salir = threading.Event(),threading.Event()
+    def trabajar():
+        with a.perfilar():
+            dentro.set()
+            salir.wait(5)
+    hilo = threading.Thread(target=trabajar)
+    hilo.start()
+    dentro.wait(5)
+    with b.perfilar():
+        decodificar(100)
+    salir.set()
+    hilo.join()
+    assert b.a_dict()["profile_skipped"] == 1 and a.a_dict()["profile_skipped"] == 0
+
+def test_sin_perfil(tmp_path):
+    metricas = Metricas()
+    with metricas.perfilar():
+        decodificar(100)
+    ruta = str(tmp_path/"metricas.json")
+    metricas.guardar(ruta)
+    assert not os.path.exists(f"{ruta}.pstats") and "profile_skipped" not in metricas.a_dict()
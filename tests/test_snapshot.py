@@ -0,0 +1,31 @@
+from shark270_core import catalogo_registros, construir_layout
+from shark270_decoder import compilar_decoder
+from shark270_snapshot import variables_snapshot
+
+#  ---------------------------------------------------------------------------------------------------------------------------------
+#                                       Snapshot: mismas columnas y escala que la recuperación de logs
+#  ---------------------------------------------------------------------------------------------------------------------------------
+
+# escalas_log
+# Títulos y escala (/100) de las columnas que genera la recuperación de un log con las variables dadas.
+def escalas_log(registros):
+    rec_titles,rec_var_sizes,rec_var_types,no_encontrados = construir_layout([reg-1 for reg in registros])
+    assert not no_encontrados
+    decoder = compilar_decoder(rec_titles,rec_var_sizes,rec_var_types)
+    escalas = {}
+    for formato,tipo,indices,posiciones,escalar in decoder.grupos:
+        for pos in posiciones:
+            escalas[decoder.titulos[pos]] = escalar
+    del escalas["Timestamp"]
+    return escalas
+
+def test_escala_igual_a_los_logs():
+    for info in catalogo_registros():
+        variables = variables_snapshot([info.reg])
+        assert {v.titulo:bool(v.scale) for v in variables} == escalas_log([info.reg]),info
+
+def test_elementos_de_16_bits():
+    # Varias variables de 16 bits en un registro: una columna por elemento, escaladas sólo si la descripción contiene '%'
+    variables = variables_snapshot([4518])
+    assert [v.titulo for v in variables] == ["Meter Status (1)","Meter Status (2)"]
+    assert [v.reg for v in variables] == [4518,4519] and not any(v.scale for v in variables)